@@ -12,6 +12,12 @@ from dotenv import load_dotenv
 
 load_dotenv(override=True)
 
+TEST_QUESTIONS = [
+    "关于 LangChain 你知道什么？",
+    "LangChain 提供哪些核心功能？",
+    "什么是机器学习？",
+]
+
 
 def main():
     print("🦜🔗 04 - RAG QA (LCEL)")
@@ -31,7 +37,16 @@ def main():
         from langchain_core.runnables import RunnablePassthrough
 
         sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-        from clients import create_model_client, create_embedding_client
+        from clients import (
+            create_model_client,
+            create_embedding_client,
+            get_embedding_client_stats,
+            unique_texts,
+            ReducedEmbeddings,
+            format_recall_report,
+            parse_compression,
+            recall_report,
+        )
 
         print("✓ LangChain 组件导入完成")
 
@@ -82,10 +97,30 @@ def main():
         chunks = text_splitter.split_text(body_text)
         print(f"✓ 文档分割完成，共 {len(chunks)} 个片段")
 
+        # 导航、页脚等重复片段只保留一份，减少嵌入请求和索引大小
+        total_chunks = len(chunks)
+        chunks = unique_texts(chunks)
+        if len(chunks) < total_chunks:
+            print(f"✓ 去重后剩余 {len(chunks)} 个片段（去除 {total_chunks - len(chunks)} 个重复）")
+
         print("\n=== 3. 创建向量索引 ===")
 
-        print("使用 Ollama 嵌入模型...")
-        embeddings = create_embedding_client(use_ollama=True)
+        print("使用 Ollama 嵌入模型（带持久化缓存，未变化的片段不会重复嵌入）...")
+        embeddings = create_embedding_client(use_ollama=True, cache=True, batched=True, dedupe=True)
+
+        # 索引压缩（如 RAG_INDEX_COMPRESSION=pca:256），先在测试问题上评估召回率损失
+        compression = os.getenv("RAG_INDEX_COMPRESSION", "none")
+        if compression != "none":
+            document_vectors = embeddings.embed_documents(chunks)
+            query_vectors = [embeddings.embed_query(question) for question in TEST_QUESTIONS]
+            rows = recall_report(document_vectors, query_vectors, k=3, specs=[compression])
+            print(format_recall_report(rows, k=3))
+
+            # Chroma 只保存 float32，这里只接入降维部分
+            reducer, _ = parse_compression(compression)
+            if reducer is not None:
+                embeddings = ReducedEmbeddings(embeddings, reducer.fit(document_vectors))
+                print(f"✓ 索引向量按 {compression} 降维")
 
         print("连接到 Chroma 服务 (Docker)...")
         vector_store = Chroma.from_texts(
@@ -96,10 +131,12 @@ def main():
             persist_directory=None,
         )
         print("✓ 向量索引创建完成")
+        cache_stats = get_embedding_client_stats()["cache"]
+        print(f"  嵌入缓存命中率: {cache_stats['hit_rate']:.0%}（共 {cache_stats['entries']} 条）")
 
         print("\n=== 4. 初始化问答系统 ===")
 
-        llm = create_model_client(temperature=0)
+        llm = create_model_client(temperature=0, cache=True)
 
         prompt = ChatPromptTemplate.from_template("""
 请根据以下上下文信息回答问题。如果上下文中没有相关信息，请说明无法回答。
@@ -129,13 +166,7 @@ def main():
 
         print("\n=== 5. 测试问答 ===")
 
-        test_questions = [
-            "关于 LangChain 你知道什么？",
-            "LangChain 提供哪些核心功能？",
-            "什么是机器学习？",
-        ]
-
-        for question in test_questions:
+        for question in TEST_QUESTIONS:
             print(f"\n问题: {question}")
             print("-" * 50)
 
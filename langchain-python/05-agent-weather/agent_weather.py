@@ -6,7 +6,6 @@
 
 import os
 import sys
-import httpx
 from dotenv import load_dotenv
 
 load_dotenv(override=True)
@@ -29,7 +28,7 @@ def main():
         from langchain.tools import tool
 
         sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-        from clients import create_model_client
+        from clients import create_model_client, get_http_client
 
         print("✓ LangChain 组件导入完成")
 
@@ -61,7 +60,7 @@ def main():
                     "cnt": days * 8,
                 }
 
-                response = httpx.get(url, params=params, timeout=10.0)
+                response = get_http_client().get(url, params=params, timeout=10.0)
                 response.raise_for_status()
                 data = response.json()
 
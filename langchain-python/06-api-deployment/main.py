@@ -7,11 +7,10 @@
 import os
 import sys
 import json
-import httpx
 import uvicorn
 from typing import Dict, Any
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
@@ -29,6 +28,15 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 PORT = int(os.getenv("PORT", "8000"))
 
+from utils import PerformanceMonitor, UsageCallbackHandler
+
+# 所有请求共享一个监控器：每个请求一个 span，智能体调用等作为子 span 嵌套记录；
+# 同时记录流式调用的首 token 时间、token 间隔等指标，通过 /metrics 查看
+monitor = PerformanceMonitor()
+monitor.track_streaming()
+# 读取每次模型调用的实际 token 数并按价格表计费，计入当前请求的 span
+usage_handler = UsageCallbackHandler()
+
 app = FastAPI(
     title="LangChain 天气智能体 API",
     description="基于 LangChain 的天气查询和智能建议 API",
@@ -45,6 +53,19 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def track_request(request: Request, call_next):
+    """为每个请求创建顶层 span，路由内的 span 自动成为其子 span"""
+    async with monitor.span(f"{request.method} unmatched") as span:
+        try:
+            return await call_next(request)
+        finally:
+            # 按路由模板命名，未匹配任何路由的路径（如扫描器的 404）共用一个名称
+            route = request.scope.get("route")
+            if route is not None:
+                span.name = f"{request.method} {route.path}"
+
+
 class ChatRequest(BaseModel):
     message: str
     session_id: str | None = None
@@ -61,7 +82,7 @@ try:
     from langchain.agents import create_agent
     from langchain.tools import tool
     from langchain_core.messages import HumanMessage
-    from clients import create_model_client
+    from clients import create_model_client, get_http_client
 
     LANGCHAIN_AVAILABLE = True
 
@@ -89,7 +110,7 @@ try:
                 "cnt": days * 8,
             }
 
-            response = httpx.get(url, params=params, timeout=10.0)
+            response = get_http_client().get(url, params=params, timeout=10.0)
             response.raise_for_status()
             data = response.json()
 
@@ -123,7 +144,7 @@ try:
         except:
             return "计算错误，请检查表达式"
 
-    llm = create_model_client(temperature=0, streaming=True)
+    llm = create_model_client(temperature=0, streaming=True, coalesce=True)
     system_prompt = "你是一个智能助手，可以使用工具来帮助用户回答问题。请根据用户的问题，决定是否需要调用工具，并给出最终答案。请用中文回答问题。"
 
     agent = create_agent(
@@ -134,14 +155,28 @@ try:
 
     print("✓ 智能体初始化完成")
 
+    # /chat 路由的语义缓存（按路由开启，天气等时效性问题依赖 TTL 过期）
+    # 缓存是可选功能，启动失败时只记录错误，智能体照常提供服务
+    chat_semantic_cache = None
+    if os.getenv("CHAT_SEMANTIC_CACHE", "false").lower() == "true":
+        try:
+            from clients.semantic_cache import create_semantic_cache
+
+            chat_semantic_cache = create_semantic_cache()
+            print("✓ /chat 语义缓存已启用")
+        except Exception as e:
+            print(f"⚠️  /chat 语义缓存启动失败，已禁用：{e}")
+
 except ImportError as e:
     print(f"❌ 导入错误：{e}")
     LANGCHAIN_AVAILABLE = False
     agent = None
+    chat_semantic_cache = None
 except Exception as e:
     print(f"❌ 智能体初始化失败：{e}")
     LANGCHAIN_AVAILABLE = False
     agent = None
+    chat_semantic_cache = None
 
 
 @app.get("/", response_model=Dict[str, Any])
@@ -153,6 +188,7 @@ async def root():
             "/chat": "POST - 与 Agent 对话（支持工具调用）",
             "/chat/stream": "POST - 与 Agent 对话（SSE 流式输出）",
             "/health": "GET - 健康检查",
+            "/metrics": "GET - 请求耗时、token 用量与费用、流式延迟指标（TTFT、token 间隔、输出速度）",
         },
         "tools": ["get_weather", "calculate"],
     }
@@ -169,6 +205,17 @@ async def health_check():
     )
 
 
+@app.get("/metrics", response_model=Dict[str, Any])
+async def metrics():
+    """各类 span 的耗时分布和用量、按模型和会话的 token 与费用、流式延迟指标"""
+    return {
+        "spans": monitor.get_span_summary(),
+        "usage_by_model": usage_handler.get_usage(),
+        "usage_by_session": monitor.get_session_usage(),
+        "streaming": monitor.get_streaming_summary(),
+    }
+
+
 @app.post("/chat")
 async def chat_endpoint(request: ChatRequest):
     """智能体对话 API"""
@@ -181,12 +228,28 @@ async def chat_endpoint(request: ChatRequest):
         print(f"\n[{request.session_id or 'anonymous'}] 用户问题: {request.message}")
         print("-" * 50)
 
-        response = await agent.ainvoke(
-            {"messages": [HumanMessage(content=request.message)]}
-        )
+        if chat_semantic_cache is not None:
+            async with monitor.span("semantic_cache_lookup"):
+                cached_answer = await chat_semantic_cache.alookup(request.message)
+            if cached_answer is not None:
+                print(f"\n语义缓存命中: {cached_answer[:50]}...")
+                return {
+                    "message": cached_answer,
+                    "timestamp": __import__("datetime").datetime.now().isoformat(),
+                    "cached": True,
+                }
+
+        async with monitor.span("agent", session_id=request.session_id):
+            response = await agent.ainvoke(
+                {"messages": [HumanMessage(content=request.message)]},
+                config={"callbacks": [usage_handler]},
+            )
 
         answer = response["messages"][-1].content
 
+        if chat_semantic_cache is not None and answer:
+            await chat_semantic_cache.aupdate(request.message, answer)
+
         print(f"\n最终回答: {answer}")
         print("=" * 50)
 
@@ -205,17 +268,20 @@ async def generate_streaming_response(message: str, session_id: str | None = Non
         print(f"\n[{session_id or 'anonymous'}] 用户问题 (流式): {message}")
         print("-" * 50)
 
-        async for token, metadata in agent.astream(
-            {"messages": [{"role": "user", "content": message}]},
-            stream_mode="messages",
-        ):
-            if hasattr(token, "content_blocks"):
-                for block in token.content_blocks:
-                    if block.get("type") == "text":
-                        text = block.get("text", "")
-                        if text:
-                            yield f"data: {json.dumps({'content': text, 'type': 'message'}, ensure_ascii=False)}\n\n"
-                            print(f"[流式输出] {text[:50]}...")
+        # 响应体在请求 span 结束后才开始发送，流式输出单独记录为一个 span
+        async with monitor.span("agent_stream", session_id=session_id):
+            async for token, metadata in agent.astream(
+                {"messages": [{"role": "user", "content": message}]},
+                stream_mode="messages",
+                config={"callbacks": [usage_handler]},
+            ):
+                if hasattr(token, "content_blocks"):
+                    for block in token.content_blocks:
+                        if block.get("type") == "text":
+                            text = block.get("text", "")
+                            if text:
+                                yield f"data: {json.dumps({'content': text, 'type': 'message'}, ensure_ascii=False)}\n\n"
+                                print(f"[流式输出] {text[:50]}...")
 
         yield f"data: {json.dumps({'type': 'done'}, ensure_ascii=False)}\n\n"
         print("\n流式输出完成")
@@ -10,8 +10,8 @@ import statistics
 from typing import Dict, List, Any
 from dataclasses import dataclass
 from dotenv import load_dotenv
-from pydantic import SecretStr
 import os
+import sys
 
 # 加载环境变量
 load_dotenv(override=True)
@@ -266,8 +266,6 @@ def main():
 
     # 从环境变量读取配置
     openai_api_key = os.getenv("OPENAI_API_KEY", "")
-    openai_base_url = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
-    model_name = os.getenv("MODEL_NAME", "gpt-3.5-turbo")
 
     # 检查环境
     if not openai_api_key:
@@ -276,7 +274,6 @@ def main():
 
     try:
         # 导入LangChain组件
-        from langchain_openai import ChatOpenAI
         from langchain.agents import (
             tool,
             AgentExecutor,
@@ -289,15 +286,13 @@ def main():
             MessagesPlaceholder,
         )
 
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        from clients import create_model_client
+
         print("✓ 组件导入成功")
 
-        # 初始化LLM
-        llm = ChatOpenAI(
-            model=model_name,
-            temperature=0,
-            api_key=SecretStr(openai_api_key),
-            base_url=openai_base_url
-        )
+        # 初始化LLM（走共享连接池，可配合 HTTP_CASSETTE_MODE 录制 / 回放）
+        llm = create_model_client(temperature=0)
 
         # 创建测试工具
         @tool
@@ -27,7 +27,7 @@ def example_1_basic_extraction():
     from langchain_core.output_parsers import PydanticOutputParser
 
     sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    from clients import create_model_client
+    from clients import create_model_client, parses_with
 
     class UserInfo(BaseModel):
         """用户信息模型"""
@@ -43,8 +43,8 @@ def example_1_basic_extraction():
                 raise ValueError('邮箱必须包含 @ 符号')
             return v
 
-    llm = create_model_client(temperature=0)
     parser = PydanticOutputParser(pydantic_object=UserInfo)
+    llm = create_model_client(temperature=0, cache=True, cascade=parses_with(parser), minify=True)
 
     prompt = ChatPromptTemplate.from_messages([
         ("system", "你是一个信息提取专家，擅长从文本中提取结构化数据。"),
@@ -83,7 +83,7 @@ def example_2_nested_models():
     from langchain_core.output_parsers import PydanticOutputParser
 
     sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    from clients import create_model_client
+    from clients import create_model_client, parses_with
 
     class Address(BaseModel):
         """地址模型"""
@@ -97,8 +97,8 @@ def example_2_nested_models():
         industry: str = Field(description="所属行业")
         address: Address = Field(description="公司地址")
 
-    llm = create_model_client(temperature=0)
     parser = PydanticOutputParser(pydantic_object=Company)
+    llm = create_model_client(temperature=0, cache=True, cascade=parses_with(parser), minify=True)
 
     prompt = ChatPromptTemplate.from_messages([
         ("system", "你是一个信息提取专家。"),
@@ -138,7 +138,7 @@ def example_3_event_extraction():
     from langchain_core.output_parsers import PydanticOutputParser
 
     sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    from clients import create_model_client
+    from clients import create_model_client, parses_with
 
     class Event(BaseModel):
         """事件模型"""
@@ -148,8 +148,8 @@ def example_3_event_extraction():
         participants: List[str] = Field(description="参与人员")
         description: str = Field(description="事件描述")
 
-    llm = create_model_client(temperature=0)
     parser = PydanticOutputParser(pydantic_object=Event)
+    llm = create_model_client(temperature=0, cache=True, cascade=parses_with(parser), minify=True)
 
     prompt = ChatPromptTemplate.from_messages([
         ("system", "你是一个事件信息提取专家。"),
@@ -191,7 +191,7 @@ def example_4_product_extraction():
     from langchain_core.output_parsers import PydanticOutputParser
 
     sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    from clients import create_model_client
+    from clients import create_model_client, parses_with
 
     class ProductCategory(str, Enum):
         """产品类别枚举"""
@@ -208,8 +208,8 @@ def example_4_product_extraction():
         description: Optional[str] = Field(default=None, description="产品描述")
         features: List[str] = Field(description="产品特性列表")
 
-    llm = create_model_client(temperature=0)
     parser = PydanticOutputParser(pydantic_object=Product)
+    llm = create_model_client(temperature=0, cache=True, cascade=parses_with(parser), minify=True)
 
     prompt = ChatPromptTemplate.from_messages([
         ("system", "你是一个产品信息提取专家。"),
@@ -249,15 +249,15 @@ def example_5_batch_extraction():
     from langchain_core.output_parsers import PydanticOutputParser
 
     sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    from clients import create_model_client
+    from clients import create_model_client, parses_with
 
     class SimpleInfo(BaseModel):
         """简单信息模型"""
         name: str = Field(description="名称")
         value: str = Field(description="值")
 
-    llm = create_model_client(temperature=0)
     parser = PydanticOutputParser(pydantic_object=SimpleInfo)
+    llm = create_model_client(temperature=0, cache=True, cascade=parses_with(parser), minify=True)
 
     prompt = ChatPromptTemplate.from_messages([
         ("system", "你是一个信息提取专家。"),
@@ -302,7 +302,7 @@ def example_6_comparison():
     import re
 
     sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    from clients import create_model_client
+    from clients import create_model_client, parses_with
 
     class ContactInfo(BaseModel):
         """联系信息模型"""
@@ -333,8 +333,8 @@ def example_6_comparison():
 
     print("\n方法 2: 结构化输出")
     try:
-        llm = create_model_client(temperature=0)
         parser = PydanticOutputParser(pydantic_object=ContactInfo)
+        llm = create_model_client(temperature=0, cache=True, cascade=parses_with(parser), minify=True)
 
         prompt = ChatPromptTemplate.from_messages([
             ("system", "你是一个信息提取专家。"),
@@ -1,14 +1,18 @@
 """多智能体协作系统 Agent 模块"""
 
-from .base_agent import BaseAgent
-from .supervisor_agent import SupervisorAgent
+from .base_agent import BaseAgent, OUTPUT_BUDGETS, OUTPUT_STOPS, REPORT_END
+from .supervisor_agent import SupervisorAgent, SUMMARY_SECTIONS
 from .researcher_agent import ResearcherAgent
 from .coder_agent import CoderAgent
 from .reviewer_agent import ReviewerAgent
 
 __all__ = [
     "BaseAgent",
+    "OUTPUT_BUDGETS",
+    "OUTPUT_STOPS",
+    "REPORT_END",
     "SupervisorAgent",
+    "SUMMARY_SECTIONS",
     "ResearcherAgent",
     "CoderAgent",
     "ReviewerAgent",
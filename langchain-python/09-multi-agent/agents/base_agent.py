@@ -3,6 +3,27 @@
 from typing import Optional, Dict, Any
 from dataclasses import dataclass
 
+# 报告类输出的结束标记：提示词要求写完全部小节后输出它，作为停止序列时不会出现在回答中
+REPORT_END = "[报告结束]"
+
+# 各角色的输出预算（max_tokens），调用点为 "09-multi-agent/<角色>"，
+# 可用环境变量 OUTPUT_BUDGETS 按调用点覆盖
+OUTPUT_BUDGETS = {
+    "researcher": 800,
+    "coder": 1500,
+    "reviewer": 600,
+    "summary": 400,
+    "query_rewrite": 150,
+}
+
+# 输出格式有明确结尾的角色使用停止序列：报告写完结束标记即停；
+# 代码实现没有固定结尾，查询改写可能以"以下是改写："加空行开头，都只限制长度
+OUTPUT_STOPS = {
+    "researcher": (REPORT_END,),
+    "reviewer": (REPORT_END,),
+    "summary": (REPORT_END,),
+}
+
 
 @dataclass
 class AgentMessage:
@@ -1,6 +1,6 @@
 """研究员 Agent - 信息搜集和研究"""
 
-from .base_agent import BaseAgent, AgentMessage
+from .base_agent import BaseAgent, AgentMessage, REPORT_END
 
 
 class ResearcherAgent(BaseAgent):
@@ -15,7 +15,11 @@ class ResearcherAgent(BaseAgent):
         
         print(f"\n[{self.name}] 接到任务：{task}")
         
-        search_result = await self.tools[0].ainvoke({"query": f"{task} 技术细节"})
+        search_input = {"query": f"{task} 技术细节"}
+        if "variants" in self.tools[0].args:
+            # 多查询搜索工具：任务原文作为额外的查询变体一起并发搜索
+            search_input["variants"] = [task]
+        search_result = await self.tools[0].ainvoke(search_input)
         
         research_prompt = f"""你是一个专业的研究助手，擅长：
 1. 搜集和分析信息
@@ -30,7 +34,9 @@ class ResearcherAgent(BaseAgent):
 1. 核心概念
 2. 关键技术点
 3. 最佳实践
-4. 注意事项"""
+4. 注意事项
+
+全部写完后另起一行输出 {REPORT_END}"""
         
         response = await self.llm.ainvoke(research_prompt)
         research_report = response.content
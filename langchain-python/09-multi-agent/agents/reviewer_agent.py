@@ -1,6 +1,6 @@
 """审查 Agent - 代码审查"""
 
-from .base_agent import BaseAgent, AgentMessage
+from .base_agent import BaseAgent, AgentMessage, REPORT_END
 
 
 class ReviewerAgent(BaseAgent):
@@ -28,7 +28,9 @@ class ReviewerAgent(BaseAgent):
 1. 代码质量评估
 2. 发现的问题
 3. 改进建议
-4. 性能优化建议"""
+4. 性能优化建议
+
+全部写完后另起一行输出 {REPORT_END}"""
         
         response = await self.llm.ainvoke(review_prompt)
         review_report = response.content
@@ -1,15 +1,19 @@
 """监督 Agent - 任务协调和分配"""
 
 from typing import Optional
-from .base_agent import BaseAgent, AgentMessage
+from .base_agent import BaseAgent, AgentMessage, REPORT_END
+
+# 汇总回答必须包含的小节，可用作级联模型的校验条件
+SUMMARY_SECTIONS = ["任务完成情况", "关键成果", "建议", "下一步行动"]
 
 
 class SupervisorAgent:
     """监督 Agent，负责协调多个专业 Agent"""
     
-    def __init__(self, llm):
+    def __init__(self, llm, summary_llm=None):
         self.name = "Supervisor"
         self.llm = llm
+        self.summary_llm = summary_llm or llm
         self.agents: dict[str, BaseAgent] = {}
     
     def register_agent(self, agent: BaseAgent) -> None:
@@ -124,7 +128,9 @@ class SupervisorAgent:
 1. 任务完成情况
 2. 关键成果
 3. 建议
-4. 下一步行动"""
+4. 下一步行动
+
+全部写完后另起一行输出 {REPORT_END}"""
         
-        response = await self.llm.ainvoke(summary_prompt)
+        response = await self.summary_llm.ainvoke(summary_prompt)
         return response.content
@@ -1,52 +1,66 @@
 """客户端模块"""
 
-import os
+import importlib.util
+import sys
+from pathlib import Path
 from dotenv import load_dotenv
-from pydantic import SecretStr
 
 load_dotenv(override=True)
 
+_SHARED_CLIENTS_NAME = "shared_clients"
 
-def create_model_client(temperature=0):
-    """创建模型客户端"""
-    from langchain_openai import ChatOpenAI
-    
-    openai_api_key = os.getenv("OPENAI_API_KEY", "")
-    openai_base_url = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
-    model_name = os.getenv("MODEL_NAME", "gpt-3.5-turbo")
-    
-    return ChatOpenAI(
-        model=model_name,
-        temperature=temperature,
-        api_key=SecretStr(openai_api_key),
-        base_url=openai_base_url,
+
+def _load_shared_clients():
+    """加载 langchain-python/clients 公共模块
+
+    本目录的 clients 包与公共模块同名，这里以独立的包名加载公共模块，
+    使多智能体系统共享同一个模型客户端注册表和连接池。
+    """
+    if _SHARED_CLIENTS_NAME in sys.modules:
+        return sys.modules[_SHARED_CLIENTS_NAME]
+
+    package_dir = Path(__file__).resolve().parents[2] / "clients"
+    spec = importlib.util.spec_from_file_location(
+        _SHARED_CLIENTS_NAME,
+        package_dir / "__init__.py",
+        submodule_search_locations=[str(package_dir)],
     )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[_SHARED_CLIENTS_NAME] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def output_budget(max_tokens, stop=()):
+    """创建输出预算（max_tokens 和停止序列）"""
+    return _load_shared_clients().OutputBudget(max_tokens, tuple(stop))
+
 
+def create_model_client(temperature=0, **kwargs):
+    """创建模型客户端（复用公共注册表中的共享实例）"""
+    return _load_shared_clients().create_model_client(temperature=temperature, **kwargs)
 
-def create_search_tool():
-    """创建搜索工具"""
+
+def contains_sections(sections):
+    """级联校验函数：回答包含全部指定段落时通过"""
+    return _load_shared_clients().contains_sections(sections)
+
+
+def create_search_tool(llm=None):
+    """创建搜索工具
+
+    配置了 TAVILY_API_KEY 时使用共享 Tavily 客户端的多查询搜索（llm 用于生成查询改写），
+    否则使用模拟搜索。
+    """
     from langchain.tools import tool
+
+    shared = _load_shared_clients()
+    if shared.tavily_client.get_tavily_api_key():
+        return shared.tavily_client.create_multi_query_search_tool(llm=llm)
     
     @tool
     def search_tool(query: str) -> str:
         """搜索工具（模拟）"""
-        knowledge_base = {
-            "快速排序": "快速排序是一种分治算法，平均时间复杂度 O(n log n)，通过选择基准元素分区实现。",
-            "Python": "Python 是一种高级编程语言，语法简洁，适合快速开发。",
-            "算法": "算法是解决特定问题的一系列明确步骤。",
-            "代码优化": "代码优化包括时间复杂度优化、空间复杂度优化、代码可读性提升等。",
-            "React": "React 是一个用于构建用户界面的 JavaScript 库。",
-            "Vue": "Vue 是一个渐进式 JavaScript 框架。",
-            "JavaScript": "JavaScript 是一种动态编程语言，主要用于 Web 开发。",
-            "TypeScript": "TypeScript 是 JavaScript 的超集，添加了静态类型。",
-            "机器学习": "机器学习是人工智能的一个分支，让计算机能够从数据中学习。",
-            "深度学习": "深度学习是机器学习的一个子集，使用神经网络。",
-        }
-        
-        for key, value in knowledge_base.items():
-            if key in query:
-                return f"找到：{value}"
-        
-        return f"关于 '{query}' 的搜索结果：建议查阅官方文档和技术博客。"
-    
+        return shared.knowledge_base.get_knowledge_base().format_results(query)
+
     return search_tool
@@ -1,22 +1,26 @@
 """LangGraph 工作流定义"""
 
-import os
 import sys
 from pathlib import Path
 from typing_extensions import TypedDict
 from typing import Annotated, Sequence, Literal
 from dotenv import load_dotenv
-from pydantic import SecretStr
 from langgraph.graph import StateGraph, END
 import operator
 
 sys.path.insert(0, str(Path(__file__).parent))
 
-from clients import create_model_client, create_search_tool
-from agents import SupervisorAgent, ResearcherAgent, CoderAgent, ReviewerAgent
+from clients import create_model_client, create_search_tool, contains_sections, output_budget
+from agents import (
+    SupervisorAgent, ResearcherAgent, CoderAgent, ReviewerAgent, SUMMARY_SECTIONS, OUTPUT_BUDGETS,
+    OUTPUT_STOPS,
+)
 
 load_dotenv(override=True)
 
+# 汇总回答缺少要求的小节时，从便宜模型升级到主模型（需配置 CASCADE_MODEL_NAME）
+summary_validator = contains_sections(SUMMARY_SECTIONS)
+
 
 class AgentState(TypedDict):
     """智能体状态"""
@@ -29,31 +33,43 @@ class AgentState(TypedDict):
     next_node: str
 
 
-def get_llm():
-    """获取 LLM 实例"""
-    openai_api_key = os.getenv("OPENAI_API_KEY", "")
-    openai_base_url = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
-    model_name = os.getenv("MODEL_NAME", "gpt-3.5-turbo")
-    
-    from langchain_openai import ChatOpenAI
-    
-    return ChatOpenAI(
-        model=model_name,
+def get_output_budget(role: str):
+    """角色的输出预算（max_tokens 和停止序列），未设置时为 None"""
+    if role not in OUTPUT_BUDGETS:
+        return None
+    return output_budget(OUTPUT_BUDGETS[role], OUTPUT_STOPS.get(role, ()))
+
+
+def get_llm(role: str = "agent"):
+    """获取角色对应的 LLM 实例（同配置复用同一个共享客户端，按角色限制输出长度）"""
+    return create_model_client(
+        temperature=0,
+        minify=True,
+        call_site=f"09-multi-agent/{role}",
+        output_budget=get_output_budget(role),
+    )
+
+
+def get_summary_llm():
+    """获取汇总用的 LLM 实例（便宜模型优先的级联客户端）"""
+    return create_model_client(
         temperature=0,
-        api_key=SecretStr(openai_api_key),
-        base_url=openai_base_url,
+        cascade=summary_validator,
+        minify=True,
+        call_site="09-multi-agent/summary",
+        output_budget=get_output_budget("summary"),
     )
 
 
 def get_supervisor():
     """获取 Supervisor 实例"""
-    llm = get_llm()
-    search_tool = create_search_tool()
+    # Researcher 的搜索由原始查询和 LLM 改写并发执行，结果按 URL 合并
+    search_tool = create_search_tool(llm=get_llm("query_rewrite"))
     
-    supervisor = SupervisorAgent(llm)
-    supervisor.register_agent(ResearcherAgent(llm, search_tool))
-    supervisor.register_agent(CoderAgent(llm))
-    supervisor.register_agent(ReviewerAgent(llm))
+    supervisor = SupervisorAgent(get_llm(), summary_llm=get_summary_llm())
+    supervisor.register_agent(ResearcherAgent(get_llm("researcher"), search_tool))
+    supervisor.register_agent(CoderAgent(get_llm("coder")))
+    supervisor.register_agent(ReviewerAgent(get_llm("reviewer")))
     
     return supervisor
 
@@ -196,7 +212,7 @@ async def summary_node(state: AgentState) -> dict:
 3. 建议
 4. 下一步行动"""
     
-    llm = get_llm()
+    llm = get_summary_llm()
     response = await llm.ainvoke(summary_prompt)
     
     return {
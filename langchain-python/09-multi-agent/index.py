@@ -1,8 +1,11 @@
 """09 - 多智能体协作系统 CLI 入口"""
 
 import asyncio
-from clients import create_model_client, create_search_tool
-from agents import SupervisorAgent, ResearcherAgent, CoderAgent, ReviewerAgent
+from clients import create_model_client, create_search_tool, contains_sections, output_budget
+from agents import (
+    SupervisorAgent, ResearcherAgent, CoderAgent, ReviewerAgent, SUMMARY_SECTIONS, OUTPUT_BUDGETS,
+    OUTPUT_STOPS,
+)
 
 
 async def main():
@@ -10,13 +13,22 @@ async def main():
     print("09 - 多智能体协作系统")
     print("="*60)
 
-    llm = create_model_client()
-    search_tool = create_search_tool()
+    def llm_for(role: str, **kwargs):
+        # 每个角色一个调用点，按角色限制输出长度
+        budget = (
+            output_budget(OUTPUT_BUDGETS[role], OUTPUT_STOPS.get(role, ()))
+            if role in OUTPUT_BUDGETS else None
+        )
+        return create_model_client(call_site=f"09-multi-agent/{role}", output_budget=budget, **kwargs)
 
-    supervisor = SupervisorAgent(llm)
-    supervisor.register_agent(ResearcherAgent(llm, search_tool))
-    supervisor.register_agent(CoderAgent(llm))
-    supervisor.register_agent(ReviewerAgent(llm))
+    search_tool = create_search_tool(llm=llm_for("query_rewrite"))
+
+    summary_llm = llm_for("summary", cascade=contains_sections(SUMMARY_SECTIONS))
+
+    supervisor = SupervisorAgent(llm_for("supervisor"), summary_llm=summary_llm)
+    supervisor.register_agent(ResearcherAgent(llm_for("researcher"), search_tool))
+    supervisor.register_agent(CoderAgent(llm_for("coder")))
+    supervisor.register_agent(ReviewerAgent(llm_for("reviewer")))
 
     print("\n✓ 多智能体系统初始化完成\n")
 
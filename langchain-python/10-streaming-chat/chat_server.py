@@ -89,7 +89,7 @@ async def websocket_chat(websocket: WebSocket):
 
         from clients import create_model_client
 
-        llm = create_model_client(temperature=0.7)
+        llm = create_model_client(temperature=0.7, streaming=True, coalesce=True)
         session = ChatSession(llm)
         chat_sessions[client_id] = session
 
@@ -137,10 +137,13 @@ async def websocket_chat(websocket: WebSocket):
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """健康检查"""
+    from clients import get_model_client_stats
+
     return HealthResponse(
         status="ok",
         active_sessions=len(chat_sessions),
-        timestamp=datetime.now().isoformat()
+        timestamp=datetime.now().isoformat(),
+        client_stats=get_model_client_stats(),
     )
 
 
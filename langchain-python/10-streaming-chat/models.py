@@ -4,7 +4,7 @@
 """
 
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 
 class Message(BaseModel):
@@ -39,3 +39,4 @@ class HealthResponse(BaseModel):
     status: str = Field(default="ok", description="服务状态")
     active_sessions: int = Field(default=0, description="活跃会话数")
     timestamp: Optional[str] = Field(default=None, description="时间戳")
+    client_stats: Optional[Dict[str, Any]] = Field(default=None, description="模型客户端与连接池统计")
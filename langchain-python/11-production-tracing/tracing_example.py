@@ -37,6 +37,7 @@ def example_simple_chain_with_tracing(monitor, logger):
         response = chain.invoke(
             {"question": "什么是 LangChain？"},
             config={
+                "callbacks": [logger],
                 "tags": ["production", "simple"],
                 "metadata": {"version": "1.0", "user_id": "demo"}
             }
@@ -80,6 +81,7 @@ def example_agent_with_tracing(monitor, logger):
         response = agent.invoke(
             {"messages": [HumanMessage(content="计算 25 * 4 + 18 等于多少？")]},
             config={
+                "callbacks": [logger],
                 "tags": ["production", "agent"],
                 "metadata": {"version": "1.0", "agent_type": "calculator"}
             }
@@ -98,12 +100,12 @@ def example_rag_with_tracing(monitor, logger):
     with with_tracking("rag_chain", monitor, logger):
         from langchain_core.prompts import ChatPromptTemplate
         from langchain_core.output_parsers import StrOutputParser
-        from langchain_community.embeddings import FakeEmbeddings
         from langchain_community.vectorstores import Chroma
 
-        from clients import create_model_client
+        from clients import create_model_client, create_embedding_client
 
-        llm = create_model_client(temperature=0)
+        # RAG 提示词由模板和检索片段拼接而成，开启压缩去掉多余空白
+        llm = create_model_client(temperature=0, minify=True)
 
         documents = [
             "LangChain 是一个用于构建 LLM 应用的框架。",
@@ -111,8 +113,8 @@ def example_rag_with_tracing(monitor, logger):
             "LangChain 支持多种 LLM 提供商和工具。",
         ]
 
-        print("⚠️  使用 FakeEmbeddings（仅用于演示）")
-        embeddings = FakeEmbeddings(size=1536)
+        # 本地哈希嵌入：离线、结果确定，检索结果在多次运行之间可复现
+        embeddings = create_embedding_client(use_fake=True)
         vectorstore = Chroma.from_texts(documents, embeddings)
         retriever = vectorstore.as_retriever()
 
@@ -137,6 +139,7 @@ def example_rag_with_tracing(monitor, logger):
         response = chain.invoke(
             {"question": "LangChain 有什么功能？"},
             config={
+                "callbacks": [logger],
                 "tags": ["production", "rag"],
                 "metadata": {"version": "1.0", "retriever_type": "chroma"}
             }
@@ -161,7 +164,7 @@ def example_performance_comparison(monitor, logger):
 
         llm = create_model_client(temperature=0)
 
-        response = llm.invoke(test_question)
+        response = llm.invoke(test_question, config={"callbacks": [logger]})
 
         print(f"响应长度: {len(response.content)} 字符")
 
@@ -193,6 +196,9 @@ def main():
         summary = monitor.get_summary()
         print(json.dumps(summary, indent=2, ensure_ascii=False))
 
+        print("\n按模型统计的 token 用量和费用（美元）：")
+        print(json.dumps(logger.get_usage(), indent=2, ensure_ascii=False))
+
         monitor.save_metrics()
         logger.save_logs()
 
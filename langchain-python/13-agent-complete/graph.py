@@ -12,8 +12,8 @@ sys.path.insert(0, str(Path(__file__).parent))
 from tools.index import tools
 from clients.model_client import create_model_client
 
-llm_stream = create_model_client(temperature=0, streaming=True)
-llm_fallback = create_model_client(temperature=0, streaming=False)
+llm_stream = create_model_client(temperature=0, streaming=True, cache=True)
+llm_fallback = create_model_client(temperature=0, streaming=False, cache=True)
 _STREAMING_ERROR = "No generations found in stream."
 
 
@@ -1,7 +1,10 @@
 import os
-import httpx
 from langchain_core.tools import tool
 
+from clients.http_pool import get_http_client
+from clients.result_packer import get_result_packer
+from clients.tavily_client import get_tavily_api_key, get_tavily_client
+
 
 @tool
 def get_weather(location: str, days: int = 1) -> str:
@@ -30,10 +33,9 @@ def get_weather(location: str, days: int = 1) -> str:
             "cnt": days * 8,
         }
 
-        with httpx.Client() as client:
-            response = client.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
+        response = get_http_client().get(url, params=params)
+        response.raise_for_status()
+        data = response.json()
 
         forecasts = data["list"][: days * 8]
         result = f"{location} 天气预报：\n"
@@ -64,25 +66,14 @@ def search_web(query: str, max_results: int = 5) -> str:
         搜索结果
     """
     try:
-        tavily_api_key = os.getenv("TAVILY_API_KEY")
-
-        if not tavily_api_key:
+        if not get_tavily_api_key():
             return "网络搜索功能需要配置 TAVILY_API_KEY 环境变量"
 
-        url = "https://api.tavily.com/search"
-        payload = {
-            "api_key": tavily_api_key,
-            "query": query,
-            "max_results": max_results,
-            "search_depth": "basic",
-        }
-
-        with httpx.Client() as client:
-            response = client.post(url, json=payload)
-            response.raise_for_status()
-            data = response.json()
+        # 共享连接池 + 结果缓存，相同查询直接返回缓存结果
+        data = get_tavily_client().search(query, max_results=max_results, include_answer=False)
 
-        results = data["results"]
+        # 正文按 token 预算打包：高分结果分到更多预算，跨结果重复的句子只保留一次
+        results = get_result_packer().pack(data["results"])
         result = "🔍 搜索结果：\n"
 
         for index, item in enumerate(results, 1):
@@ -1,10 +1,48 @@
 """LangChain Python 公共客户端模块"""
-from .model_client import create_model_client
-from .embedding_client import create_embedding_client
-from .tavily_client import create_search_tool
+from .model_client import create_model_client, get_model_client_stats, clear_model_clients
+from .embedding_client import create_embedding_client, get_embedding_client_stats
+from .tavily_client import create_search_tool, get_search_stats
+from .http_pool import get_http_client, get_async_http_client, get_pool_stats
+from .cascade import non_empty_answer, parses_with, contains_sections
+from .output_governor import OutputBudget
+from .embedding_dedup import dedupe_texts, normalize_text, unique_texts
+from .hashing_embeddings import HashingEmbeddings
+from .knowledge_base import KnowledgeBase, get_knowledge_base
+from .result_packer import ResultPacker, get_result_packer
+from .vector_quantization import (
+    CompressedVectorIndex,
+    ReducedEmbeddings,
+    format_recall_report,
+    parse_compression,
+    recall_report,
+)
 
 __all__ = [
     "create_model_client",
+    "get_model_client_stats",
+    "clear_model_clients",
     "create_embedding_client",
+    "get_embedding_client_stats",
     "create_search_tool",
+    "get_search_stats",
+    "get_http_client",
+    "get_async_http_client",
+    "get_pool_stats",
+    "non_empty_answer",
+    "parses_with",
+    "contains_sections",
+    "OutputBudget",
+    "dedupe_texts",
+    "normalize_text",
+    "unique_texts",
+    "HashingEmbeddings",
+    "KnowledgeBase",
+    "get_knowledge_base",
+    "ResultPacker",
+    "get_result_packer",
+    "CompressedVectorIndex",
+    "ReducedEmbeddings",
+    "format_recall_report",
+    "parse_compression",
+    "recall_report",
 ]
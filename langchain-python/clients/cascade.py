@@ -0,0 +1,233 @@
+"""模型级联模块
+
+先用便宜、快速的模型回答，只有当校验函数拒绝该回答时才升级到更强的模型。
+校验函数应当足够廉价：输出解析是否成功、回答是否为空、是否包含低置信度表述等。
+"""
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    BaseRunManager,
+    CallbackManager,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import PrivateAttr
+
+Validator = Callable[[BaseMessage], bool]
+
+# 常见的低置信度表述，出现时视为便宜模型没有把握
+LOW_CONFIDENCE_MARKERS = (
+    "我不确定",
+    "无法确定",
+    "无法回答",
+    "我不知道",
+    "I'm not sure",
+    "I am not sure",
+    "I don't know",
+    "I cannot answer",
+)
+
+
+def non_empty_answer(message: BaseMessage) -> bool:
+    """默认校验：回答非空、未因长度截断、且不包含低置信度表述"""
+    text = message.text.strip()
+    if not text and not getattr(message, "tool_calls", None):
+        return False
+    if message.response_metadata.get("finish_reason") == "length":
+        return False
+    return not any(marker in text for marker in LOW_CONFIDENCE_MARKERS)
+
+
+class _ParsesWith:
+    """parses_with 返回的校验函数，按解析器的值比较相等
+
+    调用方每次都新建同配置的解析器时，级联客户端仍能从注册表复用。
+    """
+
+    def __init__(self, parser: Any):
+        self.parser = parser
+
+    def __call__(self, message: BaseMessage) -> bool:
+        try:
+            self.parser.invoke(message)
+        except Exception:
+            return False
+        return True
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, _ParsesWith) and (
+            self.parser is other.parser or self.parser == other.parser
+        )
+
+    def __hash__(self) -> int:
+        return hash((type(self.parser), getattr(self.parser, "pydantic_object", None)))
+
+
+def parses_with(parser: Any) -> Validator:
+    """输出解析器能成功解析回答时通过"""
+    return _ParsesWith(parser)
+
+
+@dataclass(frozen=True)
+class _ContainsSections:
+    """contains_sections 返回的校验函数，相同小节列表的校验函数相等"""
+    sections: Tuple[str, ...]
+
+    def __call__(self, message: BaseMessage) -> bool:
+        if not non_empty_answer(message):
+            return False
+        return all(section in message.text for section in self.sections)
+
+
+def contains_sections(sections: Sequence[str]) -> Validator:
+    """回答非空且包含全部指定段落（如汇总模板中要求的各个小节）时通过"""
+    return _ContainsSections(tuple(sections))
+
+
+def _child_callbacks(run_manager: Optional[BaseRunManager], index: int) -> Optional[CallbackManager]:
+    """为某一级模型调用创建子回调，使各级调用在追踪中挂在级联调用之下"""
+    if run_manager is None:
+        return None
+    manager = CallbackManager(handlers=[], parent_run_id=run_manager.run_id)
+    manager.set_handlers(run_manager.inheritable_handlers)
+    manager.add_tags(run_manager.inheritable_tags)
+    manager.add_tags([f"cascade_tier:{index}"], inherit=False)
+    manager.add_metadata(run_manager.inheritable_metadata)
+    return manager
+
+
+class CascadeChatModel(BaseChatModel):
+    """按顺序尝试多个模型，前一级回答未通过校验时升级到下一级"""
+
+    tiers: List[BaseChatModel]
+    """从便宜到昂贵排列的模型列表，最后一级的回答总是被接受"""
+
+    validator: Callable[[BaseMessage], bool] = non_empty_answer
+    """回答校验函数，返回 False 时升级"""
+
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _stats: Dict[str, Any] = PrivateAttr(default_factory=dict)
+
+    @property
+    def _llm_type(self) -> str:
+        return "cascade"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"tiers": [tier._identifying_params for tier in self.tiers]}
+
+    def model_post_init(self, __context: Any) -> None:
+        super().model_post_init(__context)
+        self._stats.update({
+            "calls": 0,
+            "escalations": 0,
+            "tiers": [
+                {"calls": 0, "accepted": 0, "rejected": 0, "errors": 0, "total_latency": 0.0}
+                for _ in self.tiers
+            ],
+        })
+
+    def _record(self, index: int, started: float, outcome: str) -> None:
+        with self._lock:
+            stats = self._stats["tiers"][index]
+            stats["calls"] += 1
+            stats[outcome] += 1
+            stats["total_latency"] += time.perf_counter() - started
+            if index == 0:
+                self._stats["calls"] += 1
+            if outcome != "accepted" and index < len(self.tiers) - 1:
+                self._stats["escalations"] += 1
+
+    def _accept(self, index: int, message: BaseMessage) -> bool:
+        if index == len(self.tiers) - 1:
+            return True
+        try:
+            return bool(self.validator(message))
+        except Exception:
+            return False
+
+    @staticmethod
+    def _to_result(index: int, message: BaseMessage) -> ChatResult:
+        return ChatResult(
+            generations=[ChatGeneration(message=message)],
+            llm_output={"cascade_tier": index},
+        )
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        for index, tier in enumerate(self.tiers):
+            started = time.perf_counter()
+            callbacks = _child_callbacks(run_manager, index)
+            try:
+                message = tier.invoke(messages, stop=stop, config={"callbacks": callbacks}, **kwargs)
+            except Exception:
+                self._record(index, started, "errors")
+                if index == len(self.tiers) - 1:
+                    raise
+                continue
+
+            accepted = self._accept(index, message)
+            self._record(index, started, "accepted" if accepted else "rejected")
+            if accepted:
+                return self._to_result(index, message)
+
+        raise RuntimeError("级联模型没有可用的模型")
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        for index, tier in enumerate(self.tiers):
+            started = time.perf_counter()
+            callbacks = _child_callbacks(run_manager, index)
+            try:
+                message = await tier.ainvoke(
+                    messages, stop=stop, config={"callbacks": callbacks}, **kwargs
+                )
+            except Exception:
+                self._record(index, started, "errors")
+                if index == len(self.tiers) - 1:
+                    raise
+                continue
+
+            accepted = self._accept(index, message)
+            self._record(index, started, "accepted" if accepted else "rejected")
+            if accepted:
+                return self._to_result(index, message)
+
+        raise RuntimeError("级联模型没有可用的模型")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取级联统计：升级率和每一级的平均延迟"""
+        with self._lock:
+            calls = self._stats["calls"]
+            escalations = self._stats["escalations"]
+            tiers = []
+            for tier, stats in zip(self.tiers, self._stats["tiers"]):
+                stats = dict(stats)
+                total_latency = stats.pop("total_latency")
+                tiers.append({
+                    "model": getattr(tier, "model_name", None) or tier._llm_type,
+                    **stats,
+                    "avg_latency": total_latency / stats["calls"] if stats["calls"] else None,
+                })
+            return {
+                "calls": calls,
+                "escalations": escalations,
+                "escalation_rate": escalations / calls if calls else 0,
+                "tiers": tiers,
+            }
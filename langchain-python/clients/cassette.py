@@ -0,0 +1,342 @@
+"""HTTP 录制 / 回放模块（cassette）
+
+挂在共享连接池 transport 链的最外层，把模型、嵌入、Tavily、OpenWeather 等请求
+录制到 JSONL 文件，之后无网络回放，使示例运行和编排开销的基准测试结果可复现。
+
+- record：正常请求上游，同时把响应（含流式 chunk 的时间偏移）追加到 cassette
+- replay：只从 cassette 返回响应，没有匹配的记录时抛出 CassetteMissError
+- 回放时可按录制时的时间节奏（original）或零延迟（none）返回
+
+匹配键由请求方法、路径、查询参数和请求体决定，不包含域名和 API Key，
+同一个键录制了多次时按顺序依次回放。cassette 中不保存请求头和请求体。
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+# 不参与匹配、且在 cassette 中脱敏的参数
+SENSITIVE_FIELDS = {"api_key", "apikey", "appid", "key", "token", "access_token"}
+
+# 回放时保留的响应头
+KEPT_HEADERS = ("content-type", "retry-after")
+
+
+class CassetteMissError(httpx.TransportError):
+    """回放模式下没有找到匹配的录制记录"""
+
+
+def _strip_sensitive(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _strip_sensitive(v) for k, v in value.items() if k.lower() not in SENSITIVE_FIELDS}
+    if isinstance(value, list):
+        return [_strip_sensitive(item) for item in value]
+    return value
+
+
+def request_key(request: httpx.Request) -> str:
+    """计算请求的匹配键"""
+    params = sorted(
+        (k, v) for k, v in request.url.params.multi_items() if k.lower() not in SENSITIVE_FIELDS
+    )
+    try:
+        body = request.content or b""
+    except httpx.RequestNotRead:
+        body = b""
+    try:
+        body = json.dumps(_strip_sensitive(json.loads(body)), sort_keys=True).encode("utf-8")
+    except ValueError:
+        pass
+
+    digest = hashlib.sha256()
+    digest.update(json.dumps([request.method, request.url.path, params]).encode("utf-8"))
+    digest.update(body)
+    return digest.hexdigest()[:32]
+
+
+def _redacted_url(url: httpx.URL) -> str:
+    params = [
+        (k, "***" if k.lower() in SENSITIVE_FIELDS else v) for k, v in url.params.multi_items()
+    ]
+    return str(url.copy_with(params=params))
+
+
+def _encode_chunk(data: bytes) -> Any:
+    """文本 chunk 直接保存，二进制 chunk 用 base64 保存"""
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        return {"b64": base64.b64encode(data).decode("ascii")}
+
+
+def _decode_chunk(data: Any) -> bytes:
+    if isinstance(data, dict):
+        return base64.b64decode(data["b64"])
+    return data.encode("utf-8")
+
+
+class Cassette:
+    """cassette 文件的读写和匹配"""
+
+    def __init__(self, path: str, mode: str = "replay", timing: str = "none"):
+        """
+        Args:
+            path: cassette 文件路径（JSONL）
+            mode: record 或 replay
+            timing: 回放节奏，original 按录制时的耗时，none 为零延迟
+        """
+        if mode not in ("record", "replay"):
+            raise ValueError(f"不支持的 cassette 模式: {mode}")
+        if timing not in ("original", "none"):
+            raise ValueError(f"不支持的回放节奏: {timing}")
+
+        self.path = path
+        self.mode = mode
+        self.timing = timing
+        self._lock = threading.Lock()
+        self._interactions: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._cursors: Dict[str, int] = defaultdict(int)
+        self._stats = {"recorded": 0, "replayed": 0, "misses": 0}
+
+        if mode == "replay":
+            self._load()
+        else:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            # 重新录制时覆盖旧文件
+            open(path, "w", encoding="utf-8").close()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"cassette 文件不存在: {self.path}")
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    self._interactions[record["key"]].append(record)
+
+    def find(self, request: httpx.Request) -> Dict[str, Any]:
+        """按顺序取出匹配的录制记录，用完后重复最后一条"""
+        key = request_key(request)
+        with self._lock:
+            records = self._interactions.get(key)
+            if not records:
+                self._stats["misses"] += 1
+                raise CassetteMissError(
+                    f"cassette 中没有匹配的记录: {request.method} {request.url.path}",
+                    request=request,
+                )
+            index = min(self._cursors[key], len(records) - 1)
+            self._cursors[key] += 1
+            self._stats["replayed"] += 1
+            return records[index]
+
+    def save(
+        self,
+        request: httpx.Request,
+        response: httpx.Response,
+        elapsed: float,
+        chunks: List[Tuple[float, bytes]],
+    ) -> None:
+        """追加一条录制记录"""
+        # 相邻且几乎同时到达的 chunk 合并保存，减小文件体积
+        merged: List[List[Any]] = []
+        for offset, data in chunks:
+            if merged and offset - merged[-1][0] < 0.005:
+                merged[-1][1] += data
+            else:
+                merged.append([round(offset, 3), data])
+
+        record = {
+            "key": request_key(request),
+            "method": request.method,
+            "url": _redacted_url(request.url),
+            "status": response.status_code,
+            "headers": {k: response.headers[k] for k in KEPT_HEADERS if k in response.headers},
+            "elapsed": round(elapsed, 3),
+            "chunks": [[offset, _encode_chunk(data)] for offset, data in merged],
+        }
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+            self._stats["recorded"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取录制 / 回放统计"""
+        with self._lock:
+            return {"mode": self.mode, "path": self.path, **self._stats}
+
+
+class _RecordingStream(httpx.SyncByteStream):
+    """边读取边记录 chunk 及其相对响应开始的时间偏移，关闭时写入 cassette"""
+
+    def __init__(self, stream: Any, on_close):
+        self._stream = stream
+        self._on_close = on_close
+        self._started = time.monotonic()
+        self._chunks: List[Tuple[float, bytes]] = []
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self._stream:
+            self._chunks.append((time.monotonic() - self._started, chunk))
+            yield chunk
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            if self._on_close is not None:
+                self._on_close(self._chunks)
+                self._on_close = None
+
+
+class _AsyncRecordingStream(httpx.AsyncByteStream):
+    """异步版本的录制流"""
+
+    def __init__(self, stream: Any, on_close):
+        self._stream = stream
+        self._on_close = on_close
+        self._started = time.monotonic()
+        self._chunks: List[Tuple[float, bytes]] = []
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            self._chunks.append((time.monotonic() - self._started, chunk))
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._on_close is not None:
+                self._on_close(self._chunks)
+                self._on_close = None
+
+
+class _ReplayStream(httpx.SyncByteStream):
+    def __init__(self, chunks: List[List[Any]], timed: bool):
+        self._chunks = chunks
+        self._timed = timed
+
+    def __iter__(self) -> Iterator[bytes]:
+        started = time.monotonic()
+        for offset, data in self._chunks:
+            if self._timed:
+                time.sleep(max(0.0, offset - (time.monotonic() - started)))
+            yield _decode_chunk(data)
+
+
+class _AsyncReplayStream(httpx.AsyncByteStream):
+    def __init__(self, chunks: List[List[Any]], timed: bool):
+        self._chunks = chunks
+        self._timed = timed
+
+    async def __aiter__(self):
+        started = time.monotonic()
+        for offset, data in self._chunks:
+            if self._timed:
+                await asyncio.sleep(max(0.0, offset - (time.monotonic() - started)))
+            yield _decode_chunk(data)
+
+
+def _prepare_for_recording(request: httpx.Request) -> None:
+    # 录制明文响应体，避免 cassette 中保存压缩后的二进制数据
+    request.headers["accept-encoding"] = "identity"
+
+
+def _replay_response(record: Dict[str, Any], request: httpx.Request, stream: Any) -> httpx.Response:
+    return httpx.Response(
+        record["status"], headers=record["headers"], stream=stream, request=request
+    )
+
+
+class CassetteTransport(httpx.BaseTransport):
+    """同步录制 / 回放 transport"""
+
+    def __init__(self, transport: httpx.BaseTransport, cassette: Cassette):
+        self._transport = transport
+        self.cassette = cassette
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if self.cassette.mode == "replay":
+            record = self.cassette.find(request)
+            timed = self.cassette.timing == "original"
+            if timed:
+                time.sleep(record["elapsed"])
+            return _replay_response(record, request, _ReplayStream(record["chunks"], timed))
+
+        _prepare_for_recording(request)
+        started = time.monotonic()
+        response = self._transport.handle_request(request)
+        elapsed = time.monotonic() - started
+
+        save = lambda chunks: self.cassette.save(request, response, elapsed, chunks)
+        if response.is_closed:
+            save([(0.0, response.content)])
+        else:
+            response.stream = _RecordingStream(response.stream, save)
+        return response
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+class AsyncCassetteTransport(httpx.AsyncBaseTransport):
+    """异步录制 / 回放 transport"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, cassette: Cassette):
+        self._transport = transport
+        self.cassette = cassette
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if self.cassette.mode == "replay":
+            record = self.cassette.find(request)
+            timed = self.cassette.timing == "original"
+            if timed:
+                await asyncio.sleep(record["elapsed"])
+            return _replay_response(record, request, _AsyncReplayStream(record["chunks"], timed))
+
+        _prepare_for_recording(request)
+        started = time.monotonic()
+        response = await self._transport.handle_async_request(request)
+        elapsed = time.monotonic() - started
+
+        save = lambda chunks: self.cassette.save(request, response, elapsed, chunks)
+        if response.is_closed:
+            save([(0.0, response.content)])
+        else:
+            response.stream = _AsyncRecordingStream(response.stream, save)
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+_cassette: Optional[Cassette] = None
+_cassette_lock = threading.Lock()
+
+
+def get_cassette() -> Optional[Cassette]:
+    """获取进程内共享的 cassette，HTTP_CASSETTE_MODE 未设置或为 off 时返回 None"""
+    global _cassette
+    with _cassette_lock:
+        if _cassette is None:
+            mode = os.getenv("HTTP_CASSETTE_MODE", "off").lower()
+            if mode in ("", "off"):
+                return None
+            _cassette = Cassette(
+                os.getenv("HTTP_CASSETTE_PATH", ".cache/cassettes/default.jsonl"),
+                mode=mode,
+                timing=os.getenv("HTTP_CASSETTE_TIMING", "none").lower(),
+            )
+        return _cassette
@@ -0,0 +1,165 @@
+"""可扩展的 ChatOpenAI 子类
+
+在 ChatOpenAI 的 _agenerate / _astream 之上叠加请求合并、对冲请求等能力，
+在请求体构建阶段压缩提示词，
+对外仍然是标准的 ChatOpenAI，bind_tools、create_agent 等用法保持不变。
+"""
+from typing import Any, AsyncIterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun
+from langchain_core.load import dumps
+from langchain_core.language_models import LanguageModelInput
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_openai import ChatOpenAI
+from pydantic import Field
+
+
+class ManagedChatOpenAI(ChatOpenAI):
+    """带请求合并、对冲请求、提示词压缩能力的 ChatOpenAI"""
+
+    coalescer: Optional[Any] = Field(default=None, exclude=True)
+    """请求合并器（RequestCoalescer），为 None 时不合并"""
+
+    hedger: Optional[Any] = Field(default=None, exclude=True)
+    """对冲请求执行器（RequestHedger），为 None 时不对冲，仅作用于异步调用"""
+
+    minifier: Optional[Any] = Field(default=None, exclude=True)
+    """提示词压缩器（PromptMinifier），为 None 时不压缩"""
+
+    call_site: Optional[str] = Field(default=None, exclude=True)
+    """调用点标识，用于按调用点统计压缩效果等指标"""
+
+    def _get_request_payload(
+        self,
+        input_: LanguageModelInput,
+        *,
+        stop: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> dict:
+        payload = super()._get_request_payload(input_, stop=stop, **kwargs)
+        # 缓存和请求合并的键基于原始消息计算，压缩只影响实际发出的请求体
+        if self.minifier is not None and "messages" in payload:
+            self.minifier.minify_messages(
+                payload["messages"], self.model_name, self.call_site or "default"
+            )
+        return payload
+
+    def _request_key(
+        self, messages: List[BaseMessage], stop: Optional[List[str]], **kwargs: Any
+    ) -> str:
+        """由规范化后的消息和调用参数生成请求标识"""
+        normalized = [
+            msg.model_copy(update={"id": None}) if getattr(msg, "id", None) else msg
+            for msg in messages
+        ]
+        return dumps(normalized) + "\x00" + self._get_llm_string(stop=stop, **kwargs)
+
+    def _upstream_agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]],
+        run_manager: Optional[AsyncCallbackManagerForLLMRun],
+        **kwargs: Any,
+    ):
+        """创建一次上游调用（按需对冲）"""
+        call = lambda: super(ManagedChatOpenAI, self)._agenerate(
+            messages, stop, run_manager, **kwargs
+        )
+        if self.hedger is not None:
+            return self.hedger.run(call)
+        return call()
+
+    def _upstream_astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]],
+        run_manager: Optional[AsyncCallbackManagerForLLMRun],
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        """创建一个上游流（按需对冲）"""
+        call = lambda: super(ManagedChatOpenAI, self)._astream(
+            messages, stop, run_manager, **kwargs
+        )
+        if self.hedger is not None:
+            return self.hedger.stream(call)
+        return call()
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if self.coalescer is None:
+            return await self._upstream_agenerate(messages, stop, run_manager, **kwargs)
+
+        key = self._request_key(messages, stop, **kwargs)
+        leader = []
+
+        def upstream():
+            leader.append(True)
+            # 合并后的上游调用不绑定某一个请求的回调，避免 token 事件只发给其中一个调用方
+            return self._upstream_agenerate(messages, stop, None, **kwargs)
+
+        result = await self.coalescer.run(key, upstream)
+        return result if leader else _shared_result(result)
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        if self.coalescer is None and self.hedger is None:
+            async for chunk in super()._astream(messages, stop, run_manager, **kwargs):
+                yield chunk
+            return
+
+        # 上游流可能被多个调用方共享或被对冲取消，由这里统一为当前调用方触发 token 回调
+        leader = []
+
+        def upstream():
+            leader.append(True)
+            return self._upstream_astream(messages, stop, None, **kwargs)
+
+        if self.coalescer is not None:
+            key = self._request_key(messages, stop, **kwargs)
+            chunks = self.coalescer.stream(key, upstream)
+        else:
+            chunks = upstream()
+
+        async for chunk in chunks:
+            if not leader:
+                chunk = chunk.model_copy(update={"message": _shared_message(chunk.message)})
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+def _shared_message(message: BaseMessage) -> BaseMessage:
+    """复制消息并把 usage_metadata 的 total_cost 置 0
+
+    合并请求的跟随者拿到的是领头请求那次上游调用的结果，
+    与 LangChain 标记缓存命中的方式相同，用量统计只按领头请求计费一次。
+    """
+    usage = getattr(message, "usage_metadata", None)
+    if not usage:
+        return message
+    return message.model_copy(update={"usage_metadata": {**usage, "total_cost": 0}})
+
+
+def _shared_result(result: ChatResult) -> ChatResult:
+    """为合并请求的跟随者生成结果副本，用量标记为共享"""
+    llm_output = {
+        key: value for key, value in (result.llm_output or {}).items() if key != "token_usage"
+    }
+    return ChatResult(
+        generations=[
+            generation.model_copy(update={"message": _shared_message(generation.message)})
+            for generation in result.generations
+        ],
+        llm_output=llm_output,
+    )
@@ -0,0 +1,159 @@
+"""请求合并模块（singleflight）
+
+并发的相同请求只向上游发起一次调用：后到的请求挂到正在进行的调用上等待结果，
+流式调用则把同一份 token 流分发给所有等待者。
+"""
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List
+
+
+class _StreamBroadcast:
+    """把一个上游流分发给多个订阅者，晚到的订阅者会先回放已收到的 chunk"""
+
+    def __init__(self):
+        self.chunks: List[Any] = []
+        self.done = False
+        self.error: BaseException | None = None
+        self.subscribers = 0
+        self.task: asyncio.Task | None = None
+        self._changed = asyncio.Condition()
+
+    async def publish(self, chunk: Any) -> None:
+        async with self._changed:
+            self.chunks.append(chunk)
+            self._changed.notify_all()
+
+    async def finish(self, error: BaseException | None = None) -> None:
+        async with self._changed:
+            self.done = True
+            self.error = error
+            self._changed.notify_all()
+
+    async def subscribe(self) -> AsyncIterator[Any]:
+        index = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: index < len(self.chunks) or self.done)
+                pending = self.chunks[index:]
+                finished, error = self.done, self.error
+
+            for chunk in pending:
+                yield chunk
+            index += len(pending)
+
+            if finished and index >= len(self.chunks):
+                if error is not None:
+                    raise error
+                return
+
+
+class RequestCoalescer:
+    """进程内请求合并器"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self._streams: Dict[Hashable, _StreamBroadcast] = {}
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "coalesced_calls": 0, "streams": 0, "coalesced_streams": 0}
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """执行异步调用，相同 key 的并发调用共享同一个结果
+
+        Args:
+            key: 请求标识，相同 key 视为相同请求
+            factory: 创建上游调用的函数，只有第一个请求会执行
+
+        Returns:
+            上游调用的结果
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self._stats["coalesced_calls"] += 1
+            else:
+                self._stats["calls"] += 1
+                future = asyncio.ensure_future(factory())
+                self._calls[key] = future
+                future.add_done_callback(lambda _: self._forget_call(key, future))
+
+        # shield：某个等待者被取消时不影响其他等待者
+        return await asyncio.shield(future)
+
+    def _forget_call(self, key: Hashable, future: asyncio.Future) -> None:
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+    async def stream(
+        self, key: Hashable, factory: Callable[[], AsyncIterator[Any]]
+    ) -> AsyncIterator[Any]:
+        """执行流式调用，相同 key 的并发调用共享同一个上游流
+
+        Args:
+            key: 请求标识，相同 key 视为相同请求
+            factory: 创建上游流的函数，只有第一个请求会执行
+
+        Yields:
+            上游流的每个 chunk
+        """
+        with self._lock:
+            broadcast = self._streams.get(key)
+            if broadcast is not None:
+                self._stats["coalesced_streams"] += 1
+            else:
+                self._stats["streams"] += 1
+                broadcast = _StreamBroadcast()
+                self._streams[key] = broadcast
+                broadcast.task = asyncio.ensure_future(self._pump(key, broadcast, factory))
+            broadcast.subscribers += 1
+
+        try:
+            async for chunk in broadcast.subscribe():
+                yield chunk
+        finally:
+            with self._lock:
+                broadcast.subscribers -= 1
+                abandoned = broadcast.subscribers == 0 and not broadcast.done
+            # 所有订阅者都离开后取消上游流，避免白白消耗 token
+            if abandoned and broadcast.task is not None:
+                broadcast.task.cancel()
+
+    async def _pump(
+        self,
+        key: Hashable,
+        broadcast: _StreamBroadcast,
+        factory: Callable[[], AsyncIterator[Any]],
+    ) -> None:
+        """读取上游流并分发给订阅者"""
+        error: BaseException | None = None
+        try:
+            async for chunk in factory():
+                await broadcast.publish(chunk)
+        except asyncio.CancelledError:
+            error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            error = e
+        finally:
+            with self._lock:
+                if self._streams.get(key) is broadcast:
+                    del self._streams[key]
+            await broadcast.finish(error)
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取合并统计"""
+        with self._lock:
+            return {
+                **self._stats,
+                "in_flight_calls": len(self._calls),
+                "in_flight_streams": len(self._streams),
+            }
+
+
+_request_coalescer = RequestCoalescer()
+
+
+def get_request_coalescer() -> RequestCoalescer:
+    """获取进程内共享的请求合并器"""
+    return _request_coalescer
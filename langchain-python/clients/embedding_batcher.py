@@ -0,0 +1,218 @@
+"""嵌入批处理驱动模块
+
+把大批量 embed_documents 拆成按 token 预算划分的请求批次，多个批次并发执行，
+结果按原始顺序返回。批次大小根据观测到的延迟和错误自适应调整（AIMD）：
+延迟低于目标时逐步放大批次，超过目标或出错时减半，出错的批次拆分后重试。
+对 OpenAI 和 Ollama 嵌入客户端同样适用。
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+
+from .tokenizer import count_tokens
+
+load_dotenv(override=True)
+
+
+class AdaptiveBatchSizer:
+    """按延迟和错误调整每批的 token 预算"""
+
+    def __init__(
+        self,
+        batch_tokens: int = 8192,
+        min_batch_tokens: int = 512,
+        max_batch_tokens: int = 65536,
+        target_latency: float = 2.0,
+    ):
+        self.batch_tokens = batch_tokens
+        self.min_batch_tokens = min_batch_tokens
+        self.max_batch_tokens = max_batch_tokens
+        self.target_latency = target_latency
+        self._lock = threading.Lock()
+
+    def on_success(self, latency: float) -> None:
+        with self._lock:
+            if latency > self.target_latency:
+                self.batch_tokens = max(self.min_batch_tokens, self.batch_tokens // 2)
+            else:
+                self.batch_tokens = min(self.max_batch_tokens, int(self.batch_tokens * 1.25))
+
+    def on_error(self) -> None:
+        with self._lock:
+            self.batch_tokens = max(self.min_batch_tokens, self.batch_tokens // 2)
+
+
+class BatchedEmbeddings(Embeddings):
+    """并发、自适应批大小的嵌入客户端"""
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        max_concurrency: int = 4,
+        max_batch_size: int = 256,
+        max_retries: int = 3,
+        sizer: Optional[AdaptiveBatchSizer] = None,
+    ):
+        """
+        Args:
+            embeddings: 上游嵌入客户端
+            max_concurrency: 同时进行的批次数上限
+            max_batch_size: 每批最多的文本条数（部分提供方限制单次请求条数）
+            max_retries: 单条文本失败后的最大重试次数
+            sizer: 批次 token 预算调整器
+        """
+        self.embeddings = embeddings
+        self.max_concurrency = max_concurrency
+        self.max_batch_size = max_batch_size
+        self.max_retries = max_retries
+        self.sizer = sizer or AdaptiveBatchSizer()
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "texts": 0, "errors": 0, "retries": 0, "busy_seconds": 0.0}
+
+    def _take(self, texts: List[str], cursor: List[int]) -> Optional[Tuple[int, int]]:
+        """按当前 token 预算从游标处切出下一批 [start, end)（调用方负责互斥）"""
+        start = end = cursor[0]
+        budget = self.sizer.batch_tokens
+        tokens = 0
+        while end < len(texts) and end - start < self.max_batch_size:
+            size = count_tokens(texts[end])
+            if end > start and tokens + size > budget:
+                break
+            tokens += size
+            end += 1
+        cursor[0] = end
+        return (start, end) if end > start else None
+
+    def _record(self, texts: int, latency: float, error: bool) -> None:
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["busy_seconds"] += latency
+            if error:
+                self._stats["errors"] += 1
+            else:
+                self._stats["texts"] += texts
+
+    def _split_on_error(self, start: int, end: int, attempt: int, error: Exception):
+        """失败批次拆成两半重试，单条文本超过重试次数后抛出原始异常"""
+        self.sizer.on_error()
+        if end - start == 1 and attempt >= self.max_retries:
+            raise error
+        with self._lock:
+            self._stats["retries"] += 1
+        if end - start == 1:
+            return [(start, end, attempt + 1)]
+        middle = (start + end) // 2
+        return [(start, middle, attempt + 1), (middle, end, attempt + 1)]
+
+    def _embed_range(
+        self, texts: List[str], results: list, start: int, end: int, attempt: int = 0
+    ) -> None:
+        started = time.monotonic()
+        try:
+            vectors = self.embeddings.embed_documents(texts[start:end])
+        except Exception as e:
+            self._record(end - start, time.monotonic() - started, True)
+            for retry in self._split_on_error(start, end, attempt, e):
+                self._embed_range(texts, results, *retry)
+            return
+        latency = time.monotonic() - started
+        self._record(end - start, latency, False)
+        self.sizer.on_success(latency)
+        results[start:end] = vectors
+
+    async def _aembed_range(
+        self, texts: List[str], results: list, start: int, end: int, attempt: int = 0
+    ) -> None:
+        started = time.monotonic()
+        try:
+            vectors = await self.embeddings.aembed_documents(texts[start:end])
+        except Exception as e:
+            self._record(end - start, time.monotonic() - started, True)
+            for retry in self._split_on_error(start, end, attempt, e):
+                await self._aembed_range(texts, results, *retry)
+            return
+        latency = time.monotonic() - started
+        self._record(end - start, latency, False)
+        self.sizer.on_success(latency)
+        results[start:end] = vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        results: list = [None] * len(texts)
+        # 每个工作线程取批时读取最新的 token 预算，批次大小在一次调用内就能随延迟调整
+        cursor, lock = [0], threading.Lock()
+
+        def worker() -> None:
+            while True:
+                with lock:
+                    batch = self._take(texts, cursor)
+                if batch is None:
+                    return
+                try:
+                    self._embed_range(texts, results, *batch)
+                except Exception:
+                    with lock:
+                        cursor[0] = len(texts)
+                    raise
+
+        workers = min(self.max_concurrency, len(texts))
+        if workers <= 1:
+            worker()
+            return results
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for future in [executor.submit(worker) for _ in range(workers)]:
+                future.result()
+        return results
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        results: list = [None] * len(texts)
+        cursor = [0]
+
+        async def worker() -> None:
+            while True:
+                batch = self._take(texts, cursor)
+                if batch is None:
+                    return
+                try:
+                    await self._aembed_range(texts, results, *batch)
+                except Exception:
+                    cursor[0] = len(texts)
+                    raise
+
+        await asyncio.gather(*(worker() for _ in range(min(self.max_concurrency, len(texts)))))
+        return results
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.embeddings.aembed_query(text)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取请求数、错误数、平均请求延迟和当前批次 token 预算"""
+        with self._lock:
+            requests = self._stats["requests"]
+            return {
+                **self._stats,
+                "avg_latency": self._stats["busy_seconds"] / requests if requests else 0,
+                "batch_tokens": self.sizer.batch_tokens,
+                "max_concurrency": self.max_concurrency,
+            }
+
+
+def create_batched_embeddings(embeddings: Embeddings) -> BatchedEmbeddings:
+    """按环境变量配置创建批处理驱动"""
+    return BatchedEmbeddings(
+        embeddings,
+        max_concurrency=int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4")),
+        max_batch_size=int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", "256")),
+        sizer=AdaptiveBatchSizer(
+            batch_tokens=int(os.getenv("EMBEDDING_BATCH_TOKENS", "8192")),
+            target_latency=float(os.getenv("EMBEDDING_TARGET_LATENCY", "2.0")),
+        ),
+    )
@@ -0,0 +1,270 @@
+"""嵌入向量缓存模块
+
+按内容寻址的持久化嵌入缓存：键为 (模型, sha256(文本))，向量以 float32 或 float16
+二进制存入 SQLite。CachedEmbeddings 包装任意 LangChain 嵌入客户端，
+只把未命中的文本分批发给上游，语料没有变化时重建索引几乎不产生嵌入请求。
+磁盘占用超过上限时按最近访问时间淘汰（LRU）。
+"""
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+
+load_dotenv(override=True)
+
+SUPPORTED_DTYPES = ("float32", "float16")
+
+# SQLite 单条语句的参数个数有上限，批量查询按此分段
+_SQL_BATCH = 500
+
+
+def text_hash(text: str) -> str:
+    """文本内容的 sha256"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """SQLite 嵌入向量存储"""
+
+    def __init__(
+        self,
+        db_path: str = ".cache/embedding_cache.sqlite",
+        dtype: str = "float32",
+        max_bytes: int = 512 * 1024 * 1024,
+    ):
+        """
+        Args:
+            db_path: SQLite 文件路径，":memory:" 为纯内存存储
+            dtype: 向量存储精度，float32 或 float16（体积减半，精度损失可忽略）
+            max_bytes: 向量总字节数上限，超出时淘汰最久未访问的条目
+        """
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"不支持的向量精度: {dtype}")
+
+        self.db_path = db_path
+        self.dtype = np.dtype(dtype)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                dtype TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_accessed ON embeddings (accessed_at)"
+        )
+        self._conn.commit()
+        (self._bytes,) = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM embeddings"
+        ).fetchone()
+
+    def get_many(self, model: str, hashes: Sequence[str]) -> Dict[str, List[float]]:
+        """批量查询，返回命中的 {text_hash: 向量}"""
+        found: Dict[str, List[float]] = {}
+        unique = list(dict.fromkeys(hashes))
+        now = time.time()
+        with self._lock:
+            for start in range(0, len(unique), _SQL_BATCH):
+                batch = unique[start:start + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, dtype, vector FROM embeddings "
+                    f"WHERE model = ? AND text_hash IN ({placeholders})",
+                    (model, *batch),
+                ).fetchall()
+                for key, dtype, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=dtype).astype(np.float32).tolist()
+                self._conn.executemany(
+                    "UPDATE embeddings SET accessed_at = ? WHERE model = ? AND text_hash = ?",
+                    [(now, model, key) for key, _, _ in rows],
+                )
+            self._conn.commit()
+            hits = sum(1 for key in hashes if key in found)
+            self._stats["hits"] += hits
+            self._stats["misses"] += len(hashes) - hits
+        return found
+
+    def put_many(self, model: str, items: Dict[str, Sequence[float]]) -> Dict[str, List[float]]:
+        """批量写入，返回按存储精度往返后的向量（保证首次结果与之后的命中结果一致）"""
+        stored: Dict[str, List[float]] = {}
+        rows = []
+        now = time.time()
+        for key, vector in items.items():
+            array = np.asarray(vector, dtype=self.dtype)
+            blob = array.tobytes()
+            rows.append((model, key, self.dtype.name, blob, len(blob), now))
+            stored[key] = array.astype(np.float32).tolist()
+
+        with self._lock:
+            for row in rows:
+                previous = self._conn.execute(
+                    "SELECT size FROM embeddings WHERE model = ? AND text_hash = ?", row[:2]
+                ).fetchone()
+                self._bytes += row[4] - (previous[0] if previous else 0)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+            self._stats["writes"] += len(rows)
+            self._evict()
+            self._conn.commit()
+        return stored
+
+    def _evict(self) -> None:
+        """按最近访问时间淘汰，直到总字节数回到上限以内（调用方需持有锁）"""
+        while self._bytes > self.max_bytes:
+            victims = self._conn.execute(
+                "SELECT model, text_hash, size FROM embeddings ORDER BY accessed_at ASC LIMIT 256"
+            ).fetchall()
+            if not victims:
+                self._bytes = 0
+                return
+            for model, key, size in victims:
+                if self._bytes <= self.max_bytes:
+                    break
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE model = ? AND text_hash = ?", (model, key)
+                )
+                self._bytes -= size
+                self._stats["evictions"] += 1
+
+    def clear(self) -> None:
+        """清空存储"""
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+            self._bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取命中率、条目数和占用字节数"""
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            total = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": self._stats["hits"] / total if total else 0,
+                "entries": entries,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "dtype": self.dtype.name,
+            }
+
+
+class CachedEmbeddings(Embeddings):
+    """带持久化缓存的嵌入客户端，只对未命中的文本分批请求上游"""
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        store: EmbeddingStore,
+        namespace: str,
+        batch_size: int = 256,
+    ):
+        """
+        Args:
+            embeddings: 上游嵌入客户端
+            store: 向量存储
+            namespace: 缓存命名空间（提供方和模型名），不同模型的向量互不混用
+            batch_size: 未命中文本每批发送的条数，每批完成后立即落盘
+        """
+        self.embeddings = embeddings
+        self.store = store
+        self.namespace = namespace
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._stats = {"embedded": 0, "batches": 0}
+
+    def _count(self, texts: int) -> None:
+        with self._lock:
+            self._stats["embedded"] += texts
+            self._stats["batches"] += 1
+
+    def _missing(self, texts: List[str], hashes: List[str], found: Dict[str, List[float]]):
+        return [(key, text) for key, text in zip(hashes, texts) if key not in found]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [text_hash(text) for text in texts]
+        found = self.store.get_many(self.namespace, hashes)
+        missing = self._missing(texts, hashes, found)
+
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            vectors = self.embeddings.embed_documents([text for _, text in batch])
+            self._count(len(batch))
+            found.update(
+                self.store.put_many(self.namespace, dict(zip([key for key, _ in batch], vectors)))
+            )
+        return [found[key] for key in hashes]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [text_hash(text) for text in texts]
+        found = await asyncio.to_thread(self.store.get_many, self.namespace, hashes)
+        missing = self._missing(texts, hashes, found)
+
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            vectors = await self.embeddings.aembed_documents([text for _, text in batch])
+            self._count(len(batch))
+            found.update(await asyncio.to_thread(
+                self.store.put_many, self.namespace, dict(zip([key for key, _ in batch], vectors))
+            ))
+        return [found[key] for key in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        # 部分模型对查询和文档使用不同的指令前缀，查询向量单独缓存
+        namespace, key = f"{self.namespace}#query", text_hash(text)
+        found = self.store.get_many(namespace, [key])
+        if key not in found:
+            vector = self.embeddings.embed_query(text)
+            self._count(1)
+            found = self.store.put_many(namespace, {key: vector})
+        return found[key]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        namespace, key = f"{self.namespace}#query", text_hash(text)
+        found = await asyncio.to_thread(self.store.get_many, namespace, [key])
+        if key not in found:
+            vector = await self.embeddings.aembed_query(text)
+            self._count(1)
+            found = await asyncio.to_thread(self.store.put_many, namespace, {key: vector})
+        return found[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取上游嵌入调用次数"""
+        with self._lock:
+            return {"namespace": self.namespace, **self._stats}
+
+
+_store: Optional[EmbeddingStore] = None
+_store_lock = threading.Lock()
+
+
+def get_embedding_store() -> EmbeddingStore:
+    """获取进程内共享的嵌入向量存储（配置从环境变量读取）"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = EmbeddingStore(
+                db_path=os.getenv("EMBEDDING_CACHE_PATH", ".cache/embedding_cache.sqlite"),
+                dtype=os.getenv("EMBEDDING_CACHE_DTYPE", "float32"),
+                max_bytes=int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(512 * 1024 * 1024))),
+            )
+        return _store
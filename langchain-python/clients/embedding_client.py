@@ -1,42 +1,68 @@
 """嵌入客户端模块"""
 import os
-from typing import Optional
+import weakref
+from typing import Any, Dict, Optional
 from dotenv import load_dotenv
 from pydantic import SecretStr
 from langchain_openai import OpenAIEmbeddings
-from langchain_community.embeddings import FakeEmbeddings
 from langchain_ollama import OllamaEmbeddings
 
+from .embedding_batcher import BatchedEmbeddings, create_batched_embeddings
+from .embedding_cache import CachedEmbeddings, get_embedding_store
+from .embedding_dedup import DedupEmbeddings
+from .hashing_embeddings import HashingEmbeddings
+from .http_pool import (
+    get_async_http_client,
+    get_async_http_transport,
+    get_http_client,
+    get_http_transport,
+)
+
 load_dotenv(override=True)
 
+# 已创建的缓存 / 批处理 / 去重嵌入客户端，用于汇总统计
+_cached_clients: "weakref.WeakSet[CachedEmbeddings]" = weakref.WeakSet()
+_batched_clients: "weakref.WeakSet[BatchedEmbeddings]" = weakref.WeakSet()
+_dedup_clients: "weakref.WeakSet[DedupEmbeddings]" = weakref.WeakSet()
+
 
 def create_embedding_client(
     model_name: Optional[str] = None,
     use_fake: bool = False,
     use_ollama: bool = False,
+    cache: bool = False,
+    batched: bool = False,
+    dedupe: bool = False,
 ):
     """创建嵌入客户端
 
     Args:
         model_name: 嵌入模型名称，默认从环境变量读取
-        use_fake: 是否使用 FakeEmbeddings（用于不支持 embeddings 的 API）
+        use_fake: 是否使用本地哈希嵌入（用于不支持 embeddings 的 API，离线且结果确定）
         use_ollama: 是否使用 Ollama 嵌入
+        cache: 是否启用持久化嵌入缓存（按模型和文本内容寻址），只嵌入未命中的文本
+        batched: 是否启用高吞吐模式，大批量文本按 token 预算分批并发请求，批大小随延迟自适应
+        dedupe: 是否在每批嵌入前规范化文本（NFKC、合并空白）并去重，相同文本只嵌入一次
 
     Returns:
         嵌入客户端实例
     """
     if use_fake:
-        print("⚠️  使用 FakeEmbeddings（仅用于演示，不支持实际向量检索）")
-        return FakeEmbeddings(size=1536)
+        print("⚠️  使用本地哈希嵌入（字符 n-gram，检索效果弱于模型嵌入）")
+        return HashingEmbeddings(size=1536)
 
     if use_ollama:
         print("✓ 使用 Ollama 嵌入")
         ollama_model = model_name or "nomic-embed-text"
         ollama_url = os.getenv("OLLAMA_BASE_URL")
-        return OllamaEmbeddings(
+        embeddings = OllamaEmbeddings(
             model=ollama_model,
             base_url=ollama_url if ollama_url else "http://localhost:11434",
+            # 复用共享 transport，与模型请求共用连接池和限流预算
+            sync_client_kwargs={"transport": get_http_transport()},
+            async_client_kwargs={"transport": get_async_http_transport()},
         )
+        return _wrap(embeddings, f"ollama:{ollama_model}", cache, batched, dedupe)
 
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
@@ -50,12 +76,45 @@ def create_embedding_client(
     final_base_url = base_url if base_url else "https://api.openai.com/v1"
 
     try:
-        return OpenAIEmbeddings(
+        embeddings = OpenAIEmbeddings(
             model=final_model,
             api_key=SecretStr(api_key),
             base_url=final_base_url,
+            http_client=get_http_client(),
+            http_async_client=get_async_http_client(),
         )
     except Exception as e:
         print(f"⚠️  创建 OpenAIEmbeddings 失败: {e}")
-        print("⚠️  使用 FakeEmbeddings 作为替代")
-        return FakeEmbeddings(size=1536)
+        print("⚠️  使用本地哈希嵌入作为替代")
+        return HashingEmbeddings(size=1536)
+    return _wrap(embeddings, f"openai:{final_model}", cache, batched, dedupe)
+
+
+def _wrap(embeddings, namespace: str, cache: bool, batched: bool, dedupe: bool):
+    """按需叠加批处理驱动、持久化缓存和去重
+
+    由外到内依次为去重、缓存、批处理：缓存按规范化后的文本寻址，只有未命中的文本进入批处理。
+    """
+    if batched:
+        embeddings = create_batched_embeddings(embeddings)
+        _batched_clients.add(embeddings)
+    if cache:
+        # 批处理模式下缓存每次交给下游更多文本，让并发批次有足够的工作量
+        embeddings = CachedEmbeddings(
+            embeddings, get_embedding_store(), namespace, batch_size=4096 if batched else 256
+        )
+        _cached_clients.add(embeddings)
+    if dedupe:
+        embeddings = DedupEmbeddings(embeddings)
+        _dedup_clients.add(embeddings)
+    return embeddings
+
+
+def get_embedding_client_stats() -> Dict[str, Any]:
+    """获取嵌入缓存的命中率、占用，各客户端的上游嵌入次数、批处理和去重统计"""
+    return {
+        "cache": get_embedding_store().get_stats(),
+        "clients": [client.get_stats() for client in list(_cached_clients)],
+        "batchers": [client.get_stats() for client in list(_batched_clients)],
+        "dedup": [client.get_stats() for client in list(_dedup_clients)],
+    }
@@ -0,0 +1,90 @@
+"""嵌入前的文本规范化与去重模块
+
+网页抓取后切分出的片段常有重复的导航、页脚和重叠样板文字。
+DedupEmbeddings 在每次 embed_documents 调用内先规范化文本（NFKC、合并空白），
+相同的文本只嵌入一次，再把结果按原始位置分发回去，并统计去重比例。
+unique_texts 用于在写入向量库前去掉重复片段，缩小索引，写入的仍是原文。
+"""
+import threading
+import unicodedata
+from typing import Any, Dict, List, Sequence, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+
+def normalize_text(text: str) -> str:
+    """统一 Unicode 兼容字符（全角 / 半角等），合并连续空白"""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def dedupe_texts(texts: Sequence[str]) -> Tuple[List[str], List[int]]:
+    """按规范化后的内容去重
+
+    Returns:
+        (去重后的规范化文本, 每条原始文本在去重结果中的下标)
+    """
+    positions: Dict[str, int] = {}
+    unique: List[str] = []
+    inverse: List[int] = []
+    for text in texts:
+        normalized = normalize_text(text)
+        index = positions.get(normalized)
+        if index is None:
+            index = positions[normalized] = len(unique)
+            unique.append(normalized)
+        inverse.append(index)
+    return unique, inverse
+
+
+def unique_texts(texts: Sequence[str]) -> List[str]:
+    """按规范化后的内容去重，保留每组重复中第一次出现的原文"""
+    seen = set()
+    unique: List[str] = []
+    for text in texts:
+        normalized = normalize_text(text)
+        if normalized not in seen:
+            seen.add(normalized)
+            unique.append(text)
+    return unique
+
+
+class DedupEmbeddings(Embeddings):
+    """规范化并去重后再嵌入的客户端"""
+
+    def __init__(self, embeddings: Embeddings):
+        self.embeddings = embeddings
+        self._lock = threading.Lock()
+        self._stats = {"texts": 0, "unique": 0}
+
+    def _record(self, texts: int, unique: int) -> None:
+        with self._lock:
+            self._stats["texts"] += texts
+            self._stats["unique"] += unique
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        unique, inverse = dedupe_texts(texts)
+        self._record(len(texts), len(unique))
+        vectors = self.embeddings.embed_documents(unique) if unique else []
+        return [vectors[index] for index in inverse]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        unique, inverse = dedupe_texts(texts)
+        self._record(len(texts), len(unique))
+        vectors = await self.embeddings.aembed_documents(unique) if unique else []
+        return [vectors[index] for index in inverse]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(normalize_text(text))
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.embeddings.aembed_query(normalize_text(text))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取输入文本数、去重后文本数和去重比例"""
+        with self._lock:
+            texts = self._stats["texts"]
+            return {
+                **self._stats,
+                "duplicates": texts - self._stats["unique"],
+                "dedup_ratio": 1 - self._stats["unique"] / texts if texts else 0,
+            }
@@ -0,0 +1,88 @@
+"""本地哈希嵌入模块
+
+没有可用的嵌入服务时，用字符 n-gram 特征哈希生成确定性的向量，替代随机的 FakeEmbeddings：
+- 文本按 Unicode 码点切分字符 n-gram（默认 1-3），中文无需分词
+- n-gram 用 NumPy 向量化的 64 位多项式哈希映射到固定维度，哈希符号位决定正负，减小冲突偏差
+- 词频取对数（次线性 TF），可选用语料拟合 IDF 权重，最后做 L2 归一化
+
+同一文本在任何机器、任何进程中得到相同向量，完全离线，单核每秒可嵌入数千个片段，
+适合在没有模型服务时对检索流程做可复现的基准测试。
+"""
+import threading
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+_MULTIPLIER = np.uint64(0x100000001B3)
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _codepoints(text: str) -> np.ndarray:
+    normalized = " ".join(text.lower().split())
+    return np.frombuffer(normalized.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+
+
+def _ngram_hashes(codepoints: np.ndarray, ngram_range: Tuple[int, int]) -> np.ndarray:
+    """计算全部字符 n-gram 的 64 位哈希（uint64 溢出回绕，结果与平台无关）"""
+    hashes = []
+    with np.errstate(over="ignore"):
+        for n in range(ngram_range[0], ngram_range[1] + 1):
+            if len(codepoints) < n:
+                break
+            count = len(codepoints) - n + 1
+            value = np.full(count, n, dtype=np.uint64)
+            for offset in range(n):
+                value = value * _MULTIPLIER + codepoints[offset:offset + count]
+            # 混合高低位，使取模后的桶分布均匀
+            value = value * _MIX
+            value ^= value >> np.uint64(29)
+            hashes.append(value)
+    return np.concatenate(hashes) if hashes else np.empty(0, dtype=np.uint64)
+
+
+class HashingEmbeddings(Embeddings):
+    """字符 n-gram 特征哈希嵌入（确定性、离线）"""
+
+    def __init__(self, size: int = 1536, ngram_range: Tuple[int, int] = (1, 3)):
+        """
+        Args:
+            size: 向量维度
+            ngram_range: 字符 n-gram 的最小和最大长度
+        """
+        self.size = size
+        self.ngram_range = ngram_range
+        self._idf: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    def _term_frequencies(self, text: str) -> np.ndarray:
+        hashes = _ngram_hashes(_codepoints(text), self.ngram_range)
+        buckets = (hashes % np.uint64(self.size)).astype(np.int64)
+        signs = np.where(hashes & np.uint64(1 << 63), -1.0, 1.0)
+        return np.bincount(buckets, weights=signs, minlength=self.size)
+
+    def fit(self, texts: Sequence[str]) -> "HashingEmbeddings":
+        """用语料的文档频率拟合 IDF 权重（可选，拟合后常见 n-gram 的权重降低）"""
+        document_frequency = np.zeros(self.size)
+        for text in texts:
+            document_frequency += self._term_frequencies(text) != 0
+        idf = np.log((1 + len(texts)) / (1 + document_frequency)) + 1
+        with self._lock:
+            self._idf = idf
+        return self
+
+    def _embed(self, text: str) -> List[float]:
+        counts = self._term_frequencies(text)
+        vector = np.sign(counts) * np.log1p(np.abs(counts))
+        if self._idf is not None:
+            vector *= self._idf
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector.astype(np.float32).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
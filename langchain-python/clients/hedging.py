@@ -0,0 +1,201 @@
+"""对冲请求模块（hedged requests）
+
+请求耗时超过动态统计的延迟分位数时，再发起一个相同的副本请求，
+取先完成的结果并取消另一个，用少量额外请求换取更低的尾延迟。
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Optional
+
+import numpy as np
+
+
+class LatencyTracker:
+    """滑动窗口延迟统计"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """返回第 q 分位数（0-100），样本不足时返回 None"""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            return float(np.percentile(self._samples, q))
+
+
+class RequestHedger:
+    """对冲请求执行器"""
+
+    def __init__(
+        self,
+        percentile: float = 95,
+        max_hedge_ratio: float = 0.1,
+        min_delay: float = 0.05,
+        window: int = 200,
+        min_samples: int = 20,
+    ):
+        """
+        Args:
+            percentile: 触发对冲的延迟分位数
+            max_hedge_ratio: 最近窗口内对冲请求占比上限，防止上游变慢时流量翻倍
+            min_delay: 最小对冲等待时间（秒）
+            window: 延迟统计和对冲比例的滑动窗口大小
+            min_samples: 开始对冲前需要的最少延迟样本数
+        """
+        self.percentile = percentile
+        self.max_hedge_ratio = max_hedge_ratio
+        self.min_delay = min_delay
+        self.latency = LatencyTracker(window=window, min_samples=min_samples)
+
+        # 最近的请求（0）和对冲（1）事件，用于计算对冲比例
+        self._recent: Deque[int] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "hedges_fired": 0, "hedges_won": 0, "hedges_skipped": 0}
+
+    def _hedge_delay(self) -> Optional[float]:
+        delay = self.latency.percentile(self.percentile)
+        return None if delay is None else max(delay, self.min_delay)
+
+    def _try_reserve_hedge(self) -> bool:
+        """检查对冲比例上限，允许时记录一次对冲"""
+        with self._lock:
+            hedges = sum(self._recent)
+            requests = len(self._recent) - hedges
+            if requests == 0 or hedges / requests >= self.max_hedge_ratio:
+                self._stats["hedges_skipped"] += 1
+                return False
+            self._recent.append(1)
+            self._stats["hedges_fired"] += 1
+            return True
+
+    def _begin(self) -> float:
+        with self._lock:
+            self._stats["requests"] += 1
+            self._recent.append(0)
+        return time.monotonic()
+
+    def _record_win(self, hedged_won: bool) -> None:
+        if hedged_won:
+            with self._lock:
+                self._stats["hedges_won"] += 1
+
+    async def run(self, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """执行请求，超过延迟分位数时发起对冲
+
+        Args:
+            factory: 创建一次上游调用的函数，对冲时会被调用两次
+
+        Returns:
+            先成功完成的调用结果
+        """
+        started = self._begin()
+        delay = self._hedge_delay()
+        primary = asyncio.ensure_future(factory())
+
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait({primary}, timeout=delay)
+                if not done and self._try_reserve_hedge():
+                    hedge = asyncio.ensure_future(factory())
+                    result, winner = await self._race({primary: False, hedge: True})
+                    self._record_win(winner)
+                    self.latency.record(time.monotonic() - started)
+                    return result
+
+            result = await primary
+            self.latency.record(time.monotonic() - started)
+            return result
+        finally:
+            if not primary.done():
+                primary.cancel()
+
+    @staticmethod
+    async def _race(tasks: Dict[asyncio.Future, Any]) -> tuple:
+        """等待第一个成功完成的任务，取消其余任务；全部失败时抛出最后一个异常"""
+        pending = set(tasks)
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result(), tasks[task]
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def stream(self, factory: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """执行流式请求，按首个 chunk 的等待时间（TTFT）决定是否对冲
+
+        Args:
+            factory: 创建一个上游流的函数，对冲时会被调用两次
+
+        Yields:
+            胜出的流的全部 chunk
+        """
+        started = self._begin()
+        delay = self._hedge_delay()
+
+        primary = factory()
+        candidates = {asyncio.ensure_future(primary.__anext__()): (primary, False)}
+        winner = None
+
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait(set(candidates), timeout=delay)
+                if not done and self._try_reserve_hedge():
+                    hedge = factory()
+                    candidates[asyncio.ensure_future(hedge.__anext__())] = (hedge, True)
+
+            first_chunk, (winner, hedged_won) = await self._race(candidates)
+        except StopAsyncIteration:
+            return
+        finally:
+            # 关闭落败（或失败）的流，释放上游连接
+            for task, (stream, _) in candidates.items():
+                if stream is winner:
+                    continue
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                await stream.aclose()
+
+        self.latency.record(time.monotonic() - started)
+        self._record_win(hedged_won)
+
+        try:
+            yield first_chunk
+            async for chunk in winner:
+                yield chunk
+        finally:
+            await winner.aclose()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取对冲统计"""
+        with self._lock:
+            fired = self._stats["hedges_fired"]
+            return {
+                **self._stats,
+                "hedge_rate": fired / self._stats["requests"] if self._stats["requests"] else 0,
+                "hedge_win_rate": self._stats["hedges_won"] / fired if fired else 0,
+                "hedge_delay": self._hedge_delay(),
+            }
+
+
+def create_request_hedger() -> RequestHedger:
+    """创建对冲执行器（配置从环境变量读取）"""
+    return RequestHedger(
+        percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "95")),
+        max_hedge_ratio=float(os.getenv("LLM_HEDGE_MAX_RATIO", "0.1")),
+    )
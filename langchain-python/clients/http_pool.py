@@ -0,0 +1,151 @@
+"""共享 HTTP 连接池模块
+
+进程内所有模型、嵌入和工具请求复用同一组 keep-alive 连接，
+避免每次请求都重新进行 TCP/TLS 握手。模型推理请求在 transport 层统一限流，
+配置了多个端点时再按负载均衡分发，开启 cassette 时在最外层录制 / 回放。
+"""
+import os
+import threading
+from typing import Any, Dict, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+from .cassette import AsyncCassetteTransport, CassetteTransport, get_cassette
+from .load_balancer import (
+    AsyncLoadBalancedTransport,
+    LoadBalancedTransport,
+    get_endpoint_balancer,
+)
+from .rate_limiter import AsyncRateLimitedTransport, RateLimitedTransport, get_rate_limiter
+
+load_dotenv(override=True)
+
+_lock = threading.Lock()
+_sync_client: Optional[httpx.Client] = None
+_async_client: Optional[httpx.AsyncClient] = None
+_sync_transport: Optional[httpx.BaseTransport] = None
+_async_transport: Optional[httpx.AsyncBaseTransport] = None
+
+
+def _build_limits() -> httpx.Limits:
+    """根据环境变量构建连接池限制"""
+    return httpx.Limits(
+        max_connections=int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv("HTTP_POOL_MAX_KEEPALIVE", "20")),
+        keepalive_expiry=float(os.getenv("HTTP_POOL_KEEPALIVE_EXPIRY", "60")),
+    )
+
+
+def _build_timeout() -> httpx.Timeout:
+    """默认超时：连接 10 秒，读取 120 秒（兼容长文本生成）"""
+    return httpx.Timeout(
+        float(os.getenv("HTTP_POOL_READ_TIMEOUT", "120")),
+        connect=float(os.getenv("HTTP_POOL_CONNECT_TIMEOUT", "10")),
+    )
+
+
+def _get_sync_transport() -> httpx.BaseTransport:
+    """构建同步 transport 链（调用方需持有锁）"""
+    global _sync_transport
+    if _sync_transport is None:
+        transport: httpx.BaseTransport = httpx.HTTPTransport(limits=_build_limits())
+        balancer = get_endpoint_balancer()
+        if balancer is not None:
+            transport = LoadBalancedTransport(transport, balancer)
+        transport = RateLimitedTransport(transport, get_rate_limiter())
+        cassette = get_cassette()
+        if cassette is not None:
+            transport = CassetteTransport(transport, cassette)
+        _sync_transport = transport
+    return _sync_transport
+
+
+def _get_async_transport() -> httpx.AsyncBaseTransport:
+    """构建异步 transport 链（调用方需持有锁）"""
+    global _async_transport
+    if _async_transport is None:
+        transport: httpx.AsyncBaseTransport = httpx.AsyncHTTPTransport(limits=_build_limits())
+        balancer = get_endpoint_balancer()
+        if balancer is not None:
+            transport = AsyncLoadBalancedTransport(transport, balancer)
+        transport = AsyncRateLimitedTransport(transport, get_rate_limiter())
+        cassette = get_cassette()
+        if cassette is not None:
+            transport = AsyncCassetteTransport(transport, cassette)
+        _async_transport = transport
+    return _async_transport
+
+
+def get_http_transport() -> httpx.BaseTransport:
+    """获取共享的同步 transport（供自行创建 httpx.Client 的 SDK 使用，如 Ollama）"""
+    with _lock:
+        return _get_sync_transport()
+
+
+def get_async_http_transport() -> httpx.AsyncBaseTransport:
+    """获取共享的异步 transport"""
+    with _lock:
+        return _get_async_transport()
+
+
+def get_http_client() -> httpx.Client:
+    """获取进程内共享的同步 HTTP 客户端"""
+    global _sync_client
+    with _lock:
+        if _sync_client is None or _sync_client.is_closed:
+            _sync_client = httpx.Client(transport=_get_sync_transport(), timeout=_build_timeout())
+        return _sync_client
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """获取进程内共享的异步 HTTP 客户端"""
+    global _async_client
+    with _lock:
+        if _async_client is None or _async_client.is_closed:
+            _async_client = httpx.AsyncClient(
+                transport=_get_async_transport(), timeout=_build_timeout()
+            )
+        return _async_client
+
+
+def _pool_stats(transport: Optional[Any]) -> Dict[str, int]:
+    """读取 httpcore 连接池中的连接状态"""
+    # 逐层解开包装的 transport，找到最内层的 httpx.HTTPTransport
+    while transport is not None and not hasattr(transport, "_pool"):
+        transport = getattr(transport, "_transport", None)
+
+    pool = getattr(transport, "_pool", None)
+    connections = list(getattr(pool, "connections", []))
+    idle = sum(1 for conn in connections if conn.is_idle())
+
+    return {
+        "connections": len(connections),
+        "idle": idle,
+        "active": len(connections) - idle,
+        "queued_requests": len(getattr(pool, "_requests", [])),
+    }
+
+
+def get_pool_stats() -> Dict[str, Dict[str, int]]:
+    """获取同步和异步连接池的统计信息"""
+    return {
+        "sync": _pool_stats(_sync_transport),
+        "async": _pool_stats(_async_transport),
+    }
+
+
+async def aclose_http_clients() -> None:
+    """关闭共享的 HTTP 客户端（用于服务关闭时释放连接）"""
+    global _sync_client, _async_client, _sync_transport, _async_transport
+    with _lock:
+        sync_client, async_client = _sync_client, _async_client
+        _sync_client = None
+        _async_client = None
+        _sync_transport = None
+        _async_transport = None
+
+    if sync_client is not None:
+        sync_client.close()
+    if async_client is not None:
+        await async_client.aclose()
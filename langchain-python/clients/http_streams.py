@@ -0,0 +1,58 @@
+"""响应体包装工具
+
+transport 层的限流、负载均衡等组件需要在响应体读取完毕（关闭）时做收尾，
+例如释放并发配额、减少端点的在途请求数。
+"""
+from typing import Any, Callable
+
+import httpx
+
+
+class ReleasingStream(httpx.SyncByteStream):
+    """响应体关闭时执行一次回调"""
+
+    def __init__(self, stream: Any, on_close: Callable[[], None]):
+        self._stream = stream
+        self._on_close = on_close
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            if self._on_close is not None:
+                self._on_close()
+                self._on_close = None
+
+
+class AsyncReleasingStream(httpx.AsyncByteStream):
+    """异步版本：响应体关闭时执行一次回调"""
+
+    def __init__(self, stream: Any, on_close: Callable[[], None]):
+        self._stream = stream
+        self._on_close = on_close
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._on_close is not None:
+                self._on_close()
+                self._on_close = None
+
+
+def release_on_close(response: httpx.Response, on_close: Callable[[], None]) -> httpx.Response:
+    """在响应体关闭时执行回调；响应体已在内存中（如回放的响应）时立即执行"""
+    if response.is_closed:
+        on_close()
+    elif isinstance(response.stream, httpx.AsyncByteStream):
+        response.stream = AsyncReleasingStream(response.stream, on_close)
+    else:
+        response.stream = ReleasingStream(response.stream, on_close)
+    return response
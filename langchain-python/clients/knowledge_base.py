@@ -0,0 +1,173 @@
+"""本地知识库关键词匹配模块
+
+模拟搜索工具用知识库代替真实搜索：查询中出现的关键词对应的条目即为结果。
+逐个关键词做子串判断的耗时随条目数线性增长，知识库有数万条时每次查询都很慢。
+这里把全部关键词一次性构建成 Aho-Corasick 自动机，查询时只扫描一遍文本，
+耗时只与查询长度和命中数有关，与关键词数量无关。
+
+知识库可以从文件加载（MOCK_SEARCH_KB_PATH）：
+- .json：{"关键词": "内容", ...} 或 [{"key": "关键词", "value": "内容"}, ...]
+- .jsonl：每行一个 {"key": "关键词", "value": "内容"}
+"""
+import json
+import os
+import threading
+from typing import Dict, Iterator, List, Mapping, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+DEFAULT_KNOWLEDGE_BASE = {
+    "快速排序": "快速排序是一种分治算法，平均时间复杂度 O(n log n)，通过选择基准元素分区实现。",
+    "Python": "Python 是一种高级编程语言，语法简洁，适合快速开发。",
+    "算法": "算法是解决特定问题的一系列明确步骤。",
+    "代码优化": "代码优化包括时间复杂度优化、空间复杂度优化、代码可读性提升等。",
+    "JavaScript": "JavaScript 是一种动态编程语言，主要用于 Web 开发，支持事件驱动和函数式编程。",
+    "React": "React 是一个用于构建用户界面的 JavaScript 库，由 Facebook 开发，采用组件化架构。",
+    "Vue": "Vue.js 是一个渐进式 JavaScript 框架，易于上手，支持双向数据绑定和组件化开发。",
+    "Node.js": "Node.js 是一个基于 Chrome V8 引擎的 JavaScript 运行时，用于构建服务器端应用。",
+    "TypeScript": "TypeScript 是 JavaScript 的超集，添加了静态类型检查，提高代码可维护性。",
+    "机器学习": "机器学习是人工智能的一个分支，让计算机能够从数据中学习。",
+    "深度学习": "深度学习是机器学习的一个子集，使用神经网络。",
+}
+
+
+class KeywordMatcher:
+    """Aho-Corasick 多模式匹配器（不区分大小写）"""
+
+    def __init__(self, keywords: List[str]):
+        """
+        Args:
+            keywords: 关键词列表，匹配结果用下标指向其中的关键词
+        """
+        self.keywords = keywords
+        # 状态 0 为根；每个状态记录转移表、失败指针、以该状态结尾的关键词
+        # （只差大小写的关键词落在同一个状态上，因此可能有多个），
+        # 以及沿失败链最近的、有关键词结尾的状态（输出链接），避免复制输出列表
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._terminal: List[Tuple[int, ...]] = [()]
+        self._output_link: List[int] = [0]
+
+        for index, keyword in enumerate(keywords):
+            if keyword:
+                self._insert(keyword.lower(), index)
+        self._build_links()
+
+    def _insert(self, keyword: str, index: int) -> None:
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._terminal.append(())
+                self._output_link.append(0)
+            state = next_state
+        self._terminal[state] += (index,)
+
+    def _build_links(self) -> None:
+        """按广度优先顺序计算失败指针和输出链接"""
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, child in self._goto[state].items():
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[child] = target
+                self._output_link[child] = (
+                    target if self._terminal[target] else self._output_link[target]
+                )
+                queue.append(child)
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int]]:
+        """逐个产出 (关键词下标, 匹配结束位置)"""
+        goto, fail = self._goto, self._fail
+        terminal, output_link = self._terminal, self._output_link
+        state = 0
+        for position, char in enumerate(text.lower()):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            match = state if terminal[state] else output_link[state]
+            while match:
+                for index in terminal[match]:
+                    yield index, position + 1
+                match = output_link[match]
+
+    def find(self, text: str) -> List[int]:
+        """返回命中的关键词下标，按关键词长度降序、首次出现位置升序排列"""
+        first_seen: Dict[int, int] = {}
+        for index, end in self.iter_matches(text):
+            start = end - len(self.keywords[index])
+            if index not in first_seen or start < first_seen[index]:
+                first_seen[index] = start
+        return sorted(first_seen, key=lambda index: (-len(self.keywords[index]), first_seen[index]))
+
+    @property
+    def states(self) -> int:
+        return len(self._goto)
+
+
+class KnowledgeBase:
+    """按关键词检索的本地知识库"""
+
+    def __init__(self, entries: Mapping[str, str]):
+        self.entries = dict(entries)
+        self._values = list(self.entries.values())
+        self.matcher = KeywordMatcher(list(self.entries))
+
+    def search(self, query: str, max_results: int = 3) -> List[Tuple[str, str]]:
+        """返回查询中出现的关键词及其内容，较长（更具体）的关键词排在前面"""
+        return [
+            (self.matcher.keywords[index], self._values[index])
+            for index in self.matcher.find(query)[:max_results]
+        ]
+
+    def format_results(self, query: str, max_results: int = 3) -> str:
+        """格式化为模拟搜索工具的返回文本"""
+        results = self.search(query, max_results)
+        if not results:
+            return f"关于 '{query}' 的搜索结果：建议查阅官方文档和技术博客。"
+        if len(results) == 1:
+            return f"找到：{results[0][1]}"
+        return "找到：\n" + "\n".join(f"- {value}" for _, value in results)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+def load_knowledge_base(path: str) -> Dict[str, str]:
+    """从 JSON / JSONL 文件读取知识库条目"""
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            records = [json.loads(line) for line in f if line.strip()]
+        else:
+            data = json.load(f)
+            if isinstance(data, dict):
+                return {str(key): str(value) for key, value in data.items()}
+            records = data
+    return {str(record["key"]): str(record["value"]) for record in records}
+
+
+_knowledge_base: Optional[KnowledgeBase] = None
+_knowledge_base_lock = threading.Lock()
+
+
+def get_knowledge_base() -> KnowledgeBase:
+    """获取进程内共享的知识库（首次调用时构建自动机）
+
+    配置了 MOCK_SEARCH_KB_PATH 时从文件加载，否则使用内置的示例条目。
+    """
+    global _knowledge_base
+    with _knowledge_base_lock:
+        if _knowledge_base is None:
+            path = os.getenv("MOCK_SEARCH_KB_PATH")
+            _knowledge_base = KnowledgeBase(
+                load_knowledge_base(path) if path else DEFAULT_KNOWLEDGE_BASE
+            )
+        return _knowledge_base
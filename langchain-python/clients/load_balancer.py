@@ -0,0 +1,278 @@
+"""多端点负载均衡模块
+
+把发往主 base_url 的请求分散到多个 OpenAI 兼容网关：
+- 选择策略：最少在途请求（least_outstanding）或 EWMA 延迟（ewma）
+- 被动健康检查：连续失败（连接异常 / 429 / 5xx）达到阈值后摘除端点
+- 摘除到期后慢启动：权重从低到高逐步恢复，避免刚恢复的端点被瞬间打满
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+from .http_streams import release_on_close
+
+load_dotenv(override=True)
+
+
+class Endpoint:
+    """单个上游端点的状态"""
+
+    def __init__(self, base_url: str):
+        self.base_url = httpx.URL(base_url.rstrip("/") + "/")
+        self.outstanding = 0
+        self.ewma_latency: Optional[float] = None
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.readmitted_at = 0.0
+        self.requests = 0
+        self.failures = 0
+
+
+class EndpointBalancer:
+    """端点选择与健康状态管理"""
+
+    def __init__(
+        self,
+        base_urls: List[str],
+        strategy: str = "least_outstanding",
+        failure_threshold: int = 3,
+        ejection_seconds: float = 30,
+        max_ejection_seconds: float = 300,
+        ramp_seconds: float = 60,
+        ewma_alpha: float = 0.3,
+    ):
+        """
+        Args:
+            base_urls: 端点列表，第一个为主端点（客户端配置的 base_url）
+            strategy: 选择策略，least_outstanding 或 ewma
+            failure_threshold: 连续失败多少次后摘除
+            ejection_seconds: 首次摘除时长，连续摘除时翻倍
+            max_ejection_seconds: 最长摘除时长
+            ramp_seconds: 重新加入后的慢启动时长
+            ewma_alpha: EWMA 延迟的平滑系数
+        """
+        if strategy not in ("least_outstanding", "ewma"):
+            raise ValueError(f"不支持的负载均衡策略: {strategy}")
+
+        self.endpoints = [Endpoint(url) for url in base_urls]
+        self.strategy = strategy
+        self.failure_threshold = failure_threshold
+        self.ejection_seconds = ejection_seconds
+        self.max_ejection_seconds = max_ejection_seconds
+        self.ramp_seconds = ramp_seconds
+        self.ewma_alpha = ewma_alpha
+        self._lock = threading.Lock()
+
+    @property
+    def primary(self) -> httpx.URL:
+        return self.endpoints[0].base_url
+
+    def _weight(self, endpoint: Endpoint, now: float) -> float:
+        """慢启动权重：重新加入后在 ramp_seconds 内从 0.1 线性升到 1"""
+        if not endpoint.readmitted_at or self.ramp_seconds <= 0:
+            return 1.0
+        progress = (now - endpoint.readmitted_at) / self.ramp_seconds
+        return min(1.0, max(0.1, progress))
+
+    def _score(self, endpoint: Endpoint) -> float:
+        load = endpoint.outstanding + 1
+        if self.strategy == "ewma":
+            # 没有延迟样本的端点按已知最快端点估计，让它有机会被探测到
+            known = [e.ewma_latency for e in self.endpoints if e.ewma_latency is not None]
+            latency = endpoint.ewma_latency or (min(known) if known else 1.0)
+            load *= latency
+        return load
+
+    def acquire(self) -> Endpoint:
+        """选择一个端点并增加其在途请求数"""
+        with self._lock:
+            now = time.monotonic()
+            healthy = []
+            for endpoint in self.endpoints:
+                if endpoint.ejected_until and now >= endpoint.ejected_until:
+                    endpoint.ejected_until = 0.0
+                    endpoint.readmitted_at = now
+                if not endpoint.ejected_until:
+                    healthy.append(endpoint)
+
+            if healthy:
+                # 按得分从优到劣依次尝试，慢启动中的端点只以其权重为概率被选中
+                random.shuffle(healthy)
+                healthy.sort(key=self._score)
+                chosen = next(
+                    (e for e in healthy if random.random() < self._weight(e, now)),
+                    healthy[0],
+                )
+            else:
+                # 全部被摘除时选择最早恢复的端点，而不是直接失败
+                chosen = min(self.endpoints, key=lambda e: e.ejected_until)
+
+            chosen.outstanding += 1
+            chosen.requests += 1
+            return chosen
+
+    def release(self, endpoint: Endpoint, latency: Optional[float], success: bool) -> None:
+        """请求完成后更新端点的在途数、延迟和健康状态"""
+        with self._lock:
+            endpoint.outstanding = max(0, endpoint.outstanding - 1)
+
+            if success:
+                endpoint.consecutive_failures = 0
+                endpoint.ejections = 0
+                if latency is not None:
+                    if endpoint.ewma_latency is None:
+                        endpoint.ewma_latency = latency
+                    else:
+                        endpoint.ewma_latency += self.ewma_alpha * (
+                            latency - endpoint.ewma_latency
+                        )
+                return
+
+            endpoint.failures += 1
+            endpoint.consecutive_failures += 1
+            if endpoint.consecutive_failures >= self.failure_threshold:
+                duration = min(
+                    self.max_ejection_seconds, self.ejection_seconds * (2 ** endpoint.ejections)
+                )
+                endpoint.ejected_until = time.monotonic() + duration
+                endpoint.ejections += 1
+                endpoint.consecutive_failures = 0
+
+    def rewrite(self, request: httpx.Request, endpoint: Endpoint) -> None:
+        """把请求 URL 中的主端点前缀替换为选中的端点"""
+        path = request.url.raw_path.decode("ascii")
+        suffix = path[len(self.primary.raw_path.decode("ascii")):]
+        request.url = endpoint.base_url.join(suffix)
+        request.headers["host"] = request.url.netloc.decode("ascii")
+
+    def matches(self, request: httpx.Request) -> bool:
+        """请求是否发往主端点"""
+        url = request.url
+        return (
+            url.scheme == self.primary.scheme
+            and url.netloc == self.primary.netloc
+            and url.raw_path.startswith(self.primary.raw_path)
+        )
+
+    def get_stats(self) -> List[Dict[str, Any]]:
+        """获取各端点的状态"""
+        with self._lock:
+            now = time.monotonic()
+            return [
+                {
+                    "base_url": str(endpoint.base_url),
+                    "outstanding": endpoint.outstanding,
+                    "ewma_latency": endpoint.ewma_latency,
+                    "requests": endpoint.requests,
+                    "failures": endpoint.failures,
+                    "ejected": bool(endpoint.ejected_until and now < endpoint.ejected_until),
+                    "weight": round(self._weight(endpoint, now), 2),
+                }
+                for endpoint in self.endpoints
+            ]
+
+
+def _is_failure(status_code: int) -> bool:
+    return status_code == 429 or status_code >= 500
+
+
+class LoadBalancedTransport(httpx.BaseTransport):
+    """同步负载均衡 transport"""
+
+    def __init__(self, transport: httpx.BaseTransport, balancer: EndpointBalancer):
+        self._transport = transport
+        self.balancer = balancer
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if not self.balancer.matches(request):
+            return self._transport.handle_request(request)
+
+        endpoint = self.balancer.acquire()
+        self.balancer.rewrite(request, endpoint)
+        started = time.monotonic()
+        try:
+            response = self._transport.handle_request(request)
+        except Exception:
+            self.balancer.release(endpoint, None, success=False)
+            raise
+
+        latency = time.monotonic() - started
+        success = not _is_failure(response.status_code)
+        return release_on_close(
+            response, lambda: self.balancer.release(endpoint, latency, success)
+        )
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+class AsyncLoadBalancedTransport(httpx.AsyncBaseTransport):
+    """异步负载均衡 transport"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, balancer: EndpointBalancer):
+        self._transport = transport
+        self.balancer = balancer
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if not self.balancer.matches(request):
+            return await self._transport.handle_async_request(request)
+
+        endpoint = self.balancer.acquire()
+        self.balancer.rewrite(request, endpoint)
+        started = time.monotonic()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except asyncio.CancelledError:
+            # 请求被取消（如对冲落败），不计入端点失败
+            self.balancer.release(endpoint, None, success=True)
+            raise
+        except Exception:
+            self.balancer.release(endpoint, None, success=False)
+            raise
+
+        latency = time.monotonic() - started
+        success = not _is_failure(response.status_code)
+        return release_on_close(
+            response, lambda: self.balancer.release(endpoint, latency, success)
+        )
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def get_base_urls() -> List[str]:
+    """读取端点列表：OPENAI_BASE_URLS（逗号分隔）优先，否则使用 OPENAI_BASE_URL"""
+    urls = [url.strip() for url in os.getenv("OPENAI_BASE_URLS", "").split(",") if url.strip()]
+    if urls:
+        return urls
+
+    base_url = os.getenv("OPENAI_BASE_URL")
+    return [base_url if base_url else "https://api.openai.com/v1"]
+
+
+_balancer: Optional[EndpointBalancer] = None
+_balancer_lock = threading.Lock()
+
+
+def get_endpoint_balancer() -> Optional[EndpointBalancer]:
+    """获取进程内共享的端点负载均衡器，只配置了一个端点时返回 None"""
+    global _balancer
+    with _balancer_lock:
+        if _balancer is None:
+            urls = get_base_urls()
+            if len(urls) < 2:
+                return None
+            _balancer = EndpointBalancer(
+                urls,
+                strategy=os.getenv("OPENAI_LB_STRATEGY", "least_outstanding"),
+                failure_threshold=int(os.getenv("OPENAI_LB_FAILURE_THRESHOLD", "3")),
+                ejection_seconds=float(os.getenv("OPENAI_LB_EJECTION_SECONDS", "30")),
+            )
+        return _balancer
@@ -1,43 +1,241 @@
 """模型客户端模块"""
 import os
-from typing import Optional
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple, Union
 from dotenv import load_dotenv
 from pydantic import SecretStr
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
 from langchain_openai import ChatOpenAI
 
+from .cascade import CascadeChatModel, non_empty_answer
+from .cassette import get_cassette
+from .chat_model import ManagedChatOpenAI
+from .coalescing import get_request_coalescer
+from .hedging import create_request_hedger
+from .http_pool import get_async_http_client, get_http_client, get_pool_stats
+from .load_balancer import get_base_urls, get_endpoint_balancer
+from .output_governor import OutputBudget, get_output_governor
+from .prompt_minifier import get_prompt_minifier
+from .rate_limiter import get_rate_limiter
+from .response_cache import get_response_cache
+from .stream_metrics import get_streaming_metrics_handler
+
 load_dotenv(override=True)
 
+# 进程内共享的模型客户端注册表，键为 (model, temperature, streaming, base_url, ...)
+_registry: Dict[Tuple[Any, ...], BaseChatModel] = {}
+_registry_lock = threading.Lock()
+_registry_stats = {"hits": 0, "misses": 0}
+
 
 def create_model_client(
     model_name: Optional[str] = None,
     temperature: float = 0.7,
     streaming: bool = False,
-) -> ChatOpenAI:
+    shared: bool = True,
+    cache: bool = False,
+    coalesce: bool = False,
+    hedge: bool = False,
+    cascade: Union[bool, Callable[[BaseMessage], bool]] = False,
+    minify: bool = False,
+    call_site: Optional[str] = None,
+    output_budget: Optional[Union[int, OutputBudget]] = None,
+) -> BaseChatModel:
     """创建 OpenAI 模型客户端
 
+    相同配置的调用会复用同一个实例，所有实例共享一个 keep-alive 连接池。
+    设置 OPENAI_BASE_URLS（逗号分隔）时，请求在多个端点之间负载均衡。
+
     Args:
         model_name: 模型名称，默认从环境变量读取
         temperature: 温度参数，默认 0.7
-        streaming: 是否启用流式输出，默认 False
+        streaming: 是否启用流式输出，默认 False；流式客户端自动记录首 token 时间和 token 间隔
+        shared: 是否从注册表复用实例，默认 True
+        cache: 是否启用两级响应缓存（内存 LRU + SQLite），适合 temperature=0 的调用
+        coalesce: 是否合并并发的相同请求（ainvoke / astream 共享同一个上游调用）
+        hedge: 是否开启对冲请求，超过延迟分位数时发起副本请求，取先完成的结果
+        cascade: 是否先用 CASCADE_MODEL_NAME 指定的便宜模型回答，校验不通过再升级到当前模型；
+            传入校验函数时用它判断回答是否可接受，未配置 CASCADE_MODEL_NAME 时不生效；
+            主模型的输出预算按 CASCADE_BUDGET_RATIO 放大
+        minify: 是否在发送前压缩提示词中的缩进和空行，并统计节省的 token 数
+        call_site: 调用点标识，用于按调用点统计；默认取调用 create_model_client 的模块和函数名
+        output_budget: 输出预算（max_tokens，或带停止序列的 OutputBudget），
+            环境变量 OUTPUT_BUDGETS 中匹配该调用点的规则优先
 
     Returns:
-        ChatOpenAI 实例
+        ChatOpenAI 实例（开启级联时为 CascadeChatModel）
     """
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         raise ValueError("请设置 OPENAI_API_KEY 环境变量")
 
-    base_url = os.getenv("OPENAI_BASE_URL")
     model = model_name or os.getenv("MODEL_NAME", "gpt-3.5-turbo")
 
-    # 确保 model 和 base_url 不是 None
+    # 确保 model 不是 None；多端点时客户端指向第一个端点，由 transport 层改写到选中的端点
     final_model = model if model else "gpt-3.5-turbo"
-    final_base_url = base_url if base_url else "https://api.openai.com/v1"
-
-    return ChatOpenAI(
-        model=final_model,
-        api_key=SecretStr(api_key),
-        base_url=final_base_url,
-        temperature=temperature,
-        streaming=streaming,
+    final_base_url = get_base_urls()[0]
+    governor = get_output_governor()
+    if call_site is None and (minify or output_budget is not None or governor.has_policies):
+        call_site = _caller_site()
+    budget = governor.resolve(call_site, output_budget) if call_site else None
+    if budget is None and not minify:
+        # 调用点只用于按调用点生效的功能，未生效时不拆分注册表中的共享实例
+        call_site = None
+
+    cheap_model = os.getenv("CASCADE_MODEL_NAME")
+    if cascade and cheap_model and cheap_model != final_model:
+        return _create_cascade_client(
+            [cheap_model, final_model],
+            cascade if callable(cascade) else non_empty_answer,
+            temperature=temperature,
+            streaming=streaming,
+            shared=shared,
+            cache=cache,
+            coalesce=coalesce,
+            hedge=hedge,
+            minify=minify,
+            call_site=call_site,
+            output_budget=budget,
+        )
+
+    def build() -> ChatOpenAI:
+        callbacks = []
+        if streaming:
+            callbacks.append(get_streaming_metrics_handler())
+        if budget is not None:
+            callbacks.append(governor.tracker(call_site, budget))
+        return ManagedChatOpenAI(
+            model=final_model,
+            api_key=SecretStr(api_key),
+            base_url=final_base_url,
+            temperature=temperature,
+            streaming=streaming,
+            # 流式响应末尾附带 usage，流式调用也能拿到实际 token 数
+            stream_usage=True,
+            http_client=get_http_client(),
+            http_async_client=get_async_http_client(),
+            cache=get_response_cache() if cache else None,
+            coalescer=get_request_coalescer() if coalesce else None,
+            hedger=create_request_hedger() if hedge else None,
+            callbacks=callbacks or None,
+            max_tokens=budget.max_tokens if budget is not None else None,
+            stop=list(budget.stop) if budget is not None and budget.stop else None,
+            minifier=get_prompt_minifier() if minify else None,
+            call_site=call_site,
+        )
+
+    if not shared:
+        return build()
+
+    key = (
+        final_model, temperature, streaming, final_base_url, cache, coalesce, hedge, minify,
+        call_site, budget,
     )
+    with _registry_lock:
+        client = _registry.get(key)
+        if client is not None:
+            _registry_stats["hits"] += 1
+            return client
+
+        _registry_stats["misses"] += 1
+        client = build()
+        _registry[key] = client
+        return client
+
+
+def _caller_site() -> str:
+    """定位 clients 包之外最近的调用方，返回 "目录/模块.函数" 形式的调用点"""
+    frame = sys._getframe(1)
+    while frame is not None and Path(frame.f_code.co_filename).parent.name == "clients":
+        frame = frame.f_back
+    if frame is None:
+        return "default"
+    path = Path(frame.f_code.co_filename)
+    return f"{path.parent.name}/{path.stem}.{frame.f_code.co_name}"
+
+
+def _escalation_kwargs(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """级联最后一级的参数：输出预算按 CASCADE_BUDGET_RATIO 放大
+
+    便宜模型因长度截断被拒绝后，如果主模型的上限相同，升级后的回答通常同样会被截断。
+    放大后的预算记在单独的调用点 "<调用点>/escalated" 上，也可以用 OUTPUT_BUDGETS 单独配置。
+    """
+    budget = kwargs.get("output_budget")
+    if budget is None:
+        return kwargs
+    ratio = float(os.getenv("CASCADE_BUDGET_RATIO", "2"))
+    return {
+        **kwargs,
+        "call_site": f"{kwargs['call_site']}/escalated",
+        "output_budget": OutputBudget(int(budget.max_tokens * ratio), budget.stop),
+    }
+
+
+def _create_cascade_client(
+    models: list,
+    validator: Callable[[BaseMessage], bool],
+    shared: bool,
+    **kwargs: Any,
+) -> BaseChatModel:
+    """按模型列表创建级联客户端，各级模型复用注册表中的共享实例"""
+
+    def build() -> BaseChatModel:
+        *cheap_models, final_model = models
+        tiers = [create_model_client(model, shared=shared, **kwargs) for model in cheap_models]
+        tiers.append(create_model_client(final_model, shared=shared, **_escalation_kwargs(kwargs)))
+        return CascadeChatModel(tiers=tiers, validator=validator)
+
+    if not shared:
+        return build()
+
+    key = ("cascade", tuple(models), validator, *sorted(kwargs.items()))
+    with _registry_lock:
+        client = _registry.get(key)
+        if client is not None:
+            _registry_stats["hits"] += 1
+            return client
+
+    # 各级模型的创建会再次获取注册表锁，因此在锁外构建
+    client = build()
+    with _registry_lock:
+        _registry_stats["misses"] += 1
+        return _registry.setdefault(key, client)
+
+
+def get_model_client_stats() -> Dict[str, Any]:
+    """获取模型客户端注册表、连接池、限流器、端点、cassette、提示词压缩、输出预算和级联的统计信息"""
+    balancer = get_endpoint_balancer()
+    cassette = get_cassette()
+    with _registry_lock:
+        return {
+            "registered_clients": len(_registry),
+            "registry_hits": _registry_stats["hits"],
+            "registry_misses": _registry_stats["misses"],
+            "pool": get_pool_stats(),
+            "rate_limiter": get_rate_limiter().get_stats(),
+            "endpoints": balancer.get_stats() if balancer is not None else None,
+            "cassette": cassette.get_stats() if cassette is not None else None,
+            "hedging": {
+                f"{key[0]}@{key[1]}{'/stream' if key[2] else ''}": client.hedger.get_stats()
+                for key, client in _registry.items()
+                if getattr(client, "hedger", None) is not None
+            },
+            "minifier": get_prompt_minifier().get_stats(),
+            "output_budgets": get_output_governor().get_stats(),
+            "cascade": {
+                "->".join(key[1]): client.get_stats()
+                for key, client in _registry.items()
+                if isinstance(client, CascadeChatModel)
+            },
+        }
+
+
+def clear_model_clients() -> None:
+    """清空模型客户端注册表（环境变量变化后需要重建客户端时使用）"""
+    with _registry_lock:
+        _registry.clear()
+        _registry_stats["hits"] = 0
+        _registry_stats["misses"] = 0
@@ -0,0 +1,142 @@
+"""输出长度治理模块
+
+按调用点限制模型输出长度：为每个调用点设置 max_tokens 和停止序列，
+并统计实际输出 token 数和被截断（finish_reason == "length"）的比例，
+用来约束多智能体流程中汇总、研究报告、代码生成等长输出带来的尾延迟和成本。
+
+预算来源（优先级从高到低）：
+1. 环境变量 OUTPUT_BUDGETS，格式为逗号分隔的 "调用点模式=max_tokens|停止序列|..."，
+   模式支持通配符，停止序列可省略（省略时沿用代码中给出的停止序列），其中的 \n 表示换行，
+   如 "09-multi-agent/summary=400,09-multi-agent/coder=1200,*/tracing_example.*=300|\n\n"
+2. create_model_client(output_budget=...) 在代码中给出的默认预算
+"""
+import os
+import threading
+from dataclasses import dataclass
+from fnmatch import fnmatchcase
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from dotenv import load_dotenv
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+load_dotenv(override=True)
+
+
+@dataclass(frozen=True)
+class OutputBudget:
+    """单个调用点的输出预算"""
+    max_tokens: int
+    stop: Tuple[str, ...] = ()
+
+
+def _parse_budgets(spec: str) -> List[Tuple[str, OutputBudget]]:
+    budgets = []
+    for item in spec.split(","):
+        pattern, sep, value = item.strip().partition("=")
+        if not sep or not pattern:
+            continue
+        max_tokens, *stop = value.split("|")
+        try:
+            budgets.append((
+                pattern.strip(),
+                OutputBudget(int(max_tokens), tuple(text.replace("\\n", "\n") for text in stop if text)),
+            ))
+        except ValueError:
+            raise ValueError(f"OUTPUT_BUDGETS 格式错误: {item!r}") from None
+    return budgets
+
+
+class OutputBudgetTracker(BaseCallbackHandler):
+    """挂在模型客户端上的回调，记录一个调用点的输出长度和截断情况"""
+
+    def __init__(self, call_site: str, budget: OutputBudget):
+        self.call_site = call_site
+        self.budget = budget
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "truncated": 0, "output_tokens": 0}
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        truncated = False
+        output_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                metadata = {
+                    **(getattr(message, "response_metadata", None) or {}),
+                    **(generation.generation_info or {}),
+                }
+                truncated = truncated or metadata.get("finish_reason") == "length"
+                usage = getattr(message, "usage_metadata", None) or {}
+                output_tokens += usage.get("output_tokens", 0)
+
+        with self._lock:
+            self._stats["calls"] += 1
+            self._stats["truncated"] += int(truncated)
+            self._stats["output_tokens"] += output_tokens
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            calls = self._stats["calls"]
+            return {
+                "max_tokens": self.budget.max_tokens,
+                "stop": list(self.budget.stop),
+                **self._stats,
+                "avg_output_tokens": self._stats["output_tokens"] / calls if calls else 0,
+                "truncation_rate": self._stats["truncated"] / calls if calls else 0,
+            }
+
+
+class OutputGovernor:
+    """按调用点解析输出预算，并汇总各调用点的截断统计"""
+
+    def __init__(self, budgets: Optional[List[Tuple[str, OutputBudget]]] = None):
+        self._budgets = list(budgets or [])
+        self._trackers: Dict[Tuple[str, OutputBudget], OutputBudgetTracker] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def has_policies(self) -> bool:
+        """是否配置了按调用点生效的预算（需要解析调用点）"""
+        return bool(self._budgets)
+
+    def resolve(
+        self, call_site: str, default: Optional[Union[int, OutputBudget]] = None
+    ) -> Optional[OutputBudget]:
+        """返回调用点生效的预算：配置的规则优先，其次是代码中给出的默认预算"""
+        for pattern, budget in self._budgets:
+            if fnmatchcase(call_site, pattern):
+                # 规则没有给出停止序列时，保留代码中给出的停止序列
+                if not budget.stop and isinstance(default, OutputBudget):
+                    return OutputBudget(budget.max_tokens, default.stop)
+                return budget
+        if isinstance(default, int):
+            return OutputBudget(default)
+        return default
+
+    def tracker(self, call_site: str, budget: OutputBudget) -> OutputBudgetTracker:
+        """获取调用点的统计回调（同一调用点和预算共用一个）"""
+        with self._lock:
+            key = (call_site, budget)
+            if key not in self._trackers:
+                self._trackers[key] = OutputBudgetTracker(call_site, budget)
+            return self._trackers[key]
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """获取各调用点的预算、平均输出长度和截断率"""
+        with self._lock:
+            trackers = list(self._trackers.values())
+        return {tracker.call_site: tracker.get_stats() for tracker in trackers}
+
+
+_governor: Optional[OutputGovernor] = None
+_governor_lock = threading.Lock()
+
+
+def get_output_governor() -> OutputGovernor:
+    """获取进程内共享的输出长度治理器"""
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            _governor = OutputGovernor(_parse_budgets(os.getenv("OUTPUT_BUDGETS", "")))
+        return _governor
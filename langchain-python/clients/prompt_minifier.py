@@ -0,0 +1,111 @@
+"""提示词压缩模块
+
+三引号 f-string 写成的提示词常带有大段缩进和空行，这些空白同样按输入 token 计费。
+压缩只规范化空白，不改变内容：
+- 去掉代码块之外文本的公共缩进（整段共用一个缩进量，保留相对缩进，
+  列表、JSON 层级和未加代码块标记的代码都不受影响）
+- 去掉行尾空白，连续多个空行合并为一个
+- ``` 代码块内的内容原样保留，被截断、没有闭合的结尾代码块同样视为代码
+
+在请求发出前作用于 system / user 消息，按调用点统计压缩前后的 token 数。
+"""
+import re
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List
+
+from .tokenizer import count_tokens
+
+# 没有闭合的代码块一直延续到文本末尾
+_CODE_FENCE = re.compile(r"(```.*?(?:```|\Z))", re.S)
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+# 只压缩这些角色的消息，助手回复和工具结果保持原样
+MINIFIED_ROLES = ("system", "developer", "user")
+
+
+def _minify_prose(text: str, after_fence: bool = False) -> str:
+    """去掉一段非代码文本的公共缩进
+
+    与 textwrap.dedent 相同，所有非空行共用一个缩进量，代码的相对缩进不会被改变；
+    after_fence 时第一行接在代码块结束标记之后，不参与计算。
+    """
+    lines = [line.rstrip() for line in text.split("\n")]
+    first = 1 if after_fence else 0
+    body = [line for line in lines[first:] if line]
+    if body:
+        margin = min(len(line) - len(line.lstrip(" \t")) for line in body)
+        lines = lines[:first] + [line[margin:] for line in lines[first:]]
+    return _BLANK_LINES.sub("\n\n", "\n".join(lines))
+
+
+def minify_text(text: str) -> str:
+    """规范化文本中的空白（代码块除外）"""
+    parts = _CODE_FENCE.split(text)
+    return "".join(
+        part if index % 2 else _minify_prose(part, after_fence=index > 0)
+        for index, part in enumerate(parts)
+    ).strip()
+
+
+class PromptMinifier:
+    """请求消息压缩器，按调用点记录节省的 token 数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: {"calls": 0, "tokens_before": 0, "tokens_after": 0}
+        )
+
+    def minify_messages(
+        self, messages: List[Dict[str, Any]], model: str, call_site: str = "default"
+    ) -> List[Dict[str, Any]]:
+        """压缩 OpenAI 格式的消息列表（原地修改并返回）"""
+        before = after = 0
+        for message in messages:
+            if message.get("role") not in MINIFIED_ROLES:
+                continue
+
+            content = message.get("content")
+            if isinstance(content, str):
+                minified = minify_text(content)
+                before += count_tokens(content, model)
+                after += count_tokens(minified, model)
+                message["content"] = minified
+            elif isinstance(content, list):
+                for part in content:
+                    if isinstance(part, dict) and part.get("type") == "text":
+                        minified = minify_text(part["text"])
+                        before += count_tokens(part["text"], model)
+                        after += count_tokens(minified, model)
+                        part["text"] = minified
+
+        with self._lock:
+            stats = self._stats[call_site]
+            stats["calls"] += 1
+            stats["tokens_before"] += before
+            stats["tokens_after"] += after
+        return messages
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """获取各调用点的压缩统计"""
+        with self._lock:
+            return {
+                call_site: {
+                    **stats,
+                    "tokens_saved": stats["tokens_before"] - stats["tokens_after"],
+                    "saved_ratio": (
+                        (stats["tokens_before"] - stats["tokens_after"]) / stats["tokens_before"]
+                        if stats["tokens_before"] else 0
+                    ),
+                }
+                for call_site, stats in self._stats.items()
+            }
+
+
+_minifier = PromptMinifier()
+
+
+def get_prompt_minifier() -> PromptMinifier:
+    """获取进程内共享的提示词压缩器"""
+    return _minifier
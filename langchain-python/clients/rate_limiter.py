@@ -0,0 +1,294 @@
+"""共享自适应限流模块
+
+令牌桶同时限制每分钟请求数（RPM）和每分钟 token 数（TPM），并限制并发请求数。
+遇到 429 / 5xx 时按 AIMD 策略（乘性减、加性增）自动降速，成功后逐步恢复。
+
+限流器挂在共享连接池的 transport 上，进程内所有模型和嵌入请求
+（包括 SDK 自身的重试）都从同一份预算中扣减。
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+from .http_streams import release_on_close
+
+load_dotenv(override=True)
+
+# 只对模型推理类接口限流，搜索、天气等其他请求不受影响
+RATE_LIMITED_PATHS = (
+    "/chat/completions",
+    "/completions",
+    "/embeddings",
+    "/api/chat",
+    "/api/embed",
+    "/api/embeddings",
+)
+
+
+class AdaptiveRateLimiter:
+    """RPM + TPM 令牌桶限流器，带 AIMD 自适应降速和并发控制"""
+
+    def __init__(
+        self,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        max_concurrency: int = 0,
+        min_scale: float = 0.05,
+        increase_step: float = 0.05,
+        decrease_factor: float = 0.5,
+    ):
+        """
+        Args:
+            requests_per_minute: 每分钟请求数上限，0 表示不限制
+            tokens_per_minute: 每分钟 token 数上限，0 表示不限制
+            max_concurrency: 最大并发请求数，0 表示不限制
+            min_scale: 降速后的最低速率比例
+            increase_step: 每次成功后速率比例的加性增量
+            decrease_factor: 遇到 429 / 5xx 时速率比例的乘性因子
+        """
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_concurrency = max_concurrency
+        self.min_scale = min_scale
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+
+        self._lock = threading.Lock()
+        self._request_tokens = float(requests_per_minute)
+        self._token_tokens = float(tokens_per_minute)
+        self._last_refill = time.monotonic()
+        self._scale = 1.0
+        self._paused_until = 0.0
+        self._in_flight = 0
+        self._waiting = 0
+        self._stats = {"requests": 0, "throttled": 0, "backoffs": 0, "wait_seconds": 0.0}
+
+    def _refill(self, now: float) -> None:
+        """按当前速率比例补充令牌（调用方需持有锁）"""
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        if self.requests_per_minute:
+            rate = self.requests_per_minute * self._scale / 60
+            self._request_tokens = min(
+                self.requests_per_minute, self._request_tokens + elapsed * rate
+            )
+        if self.tokens_per_minute:
+            rate = self.tokens_per_minute * self._scale / 60
+            self._token_tokens = min(self.tokens_per_minute, self._token_tokens + elapsed * rate)
+
+    def _concurrency_limit(self) -> int:
+        return max(1, int(self.max_concurrency * self._scale))
+
+    def _try_acquire(self, tokens: int) -> float:
+        """尝试获取配额，成功返回 0，否则返回建议等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+
+            if now < self._paused_until:
+                return self._paused_until - now
+
+            if self.max_concurrency and self._in_flight >= self._concurrency_limit():
+                return 0.05
+
+            # 单个请求的 token 估算超过桶容量时按桶容量计算，避免永远拿不到配额
+            tokens = min(tokens, self.tokens_per_minute) if self.tokens_per_minute else 0
+            wait = 0.0
+            if self.requests_per_minute and self._request_tokens < 1:
+                rate = self.requests_per_minute * self._scale / 60
+                wait = max(wait, (1 - self._request_tokens) / rate)
+            if self.tokens_per_minute and self._token_tokens < tokens:
+                rate = self.tokens_per_minute * self._scale / 60
+                wait = max(wait, (tokens - self._token_tokens) / rate)
+            if wait > 0:
+                return wait
+
+            if self.requests_per_minute:
+                self._request_tokens -= 1
+            if self.tokens_per_minute:
+                self._token_tokens -= tokens
+            self._in_flight += 1
+            self._stats["requests"] += 1
+            return 0.0
+
+    def _begin_wait(self) -> float:
+        with self._lock:
+            self._waiting += 1
+            self._stats["throttled"] += 1
+        return time.monotonic()
+
+    def _end_wait(self, started: float) -> None:
+        with self._lock:
+            self._waiting -= 1
+            self._stats["wait_seconds"] += time.monotonic() - started
+
+    def acquire(self, tokens: int = 1) -> None:
+        """同步获取配额，必要时阻塞等待"""
+        wait = self._try_acquire(tokens)
+        if wait == 0:
+            return
+
+        started = self._begin_wait()
+        try:
+            while wait > 0:
+                time.sleep(min(wait, 1.0))
+                wait = self._try_acquire(tokens)
+        finally:
+            self._end_wait(started)
+
+    async def aacquire(self, tokens: int = 1) -> None:
+        """异步获取配额，必要时等待（不阻塞事件循环）"""
+        wait = self._try_acquire(tokens)
+        if wait == 0:
+            return
+
+        started = self._begin_wait()
+        try:
+            while wait > 0:
+                await asyncio.sleep(min(wait, 1.0))
+                wait = self._try_acquire(tokens)
+        finally:
+            self._end_wait(started)
+
+    def release(
+        self, status_code: Optional[int] = None, retry_after: Optional[float] = None
+    ) -> None:
+        """释放并发配额，并根据响应状态调整速率
+
+        Args:
+            status_code: 响应状态码，为 None 表示请求异常（如超时、连接失败）
+            retry_after: 服务端返回的 Retry-After 秒数
+        """
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+
+            if status_code is None or status_code == 429 or status_code >= 500:
+                self._scale = max(self.min_scale, self._scale * self.decrease_factor)
+                self._stats["backoffs"] += 1
+                if retry_after:
+                    self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            elif status_code < 400:
+                self._scale = min(1.0, self._scale + self.increase_step)
+
+    def cancel(self) -> None:
+        """请求被取消时只释放并发配额，不调整速率"""
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.requests_per_minute or self.tokens_per_minute or self.max_concurrency)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取限流统计，queue_depth 为当前排队等待的请求数"""
+        with self._lock:
+            return {
+                **self._stats,
+                "queue_depth": self._waiting,
+                "in_flight": self._in_flight,
+                "rate_scale": round(self._scale, 3),
+                "concurrency_limit": self._concurrency_limit() if self.max_concurrency else None,
+            }
+
+
+def estimate_request_tokens(request: httpx.Request) -> int:
+    """粗略估算一次请求消耗的 token 数：输入按字节数 / 4，输出按 max_tokens 或 256"""
+    body = request.content or b""
+    estimate = len(body) // 4
+
+    try:
+        payload = json.loads(body) if body else {}
+    except ValueError:
+        payload = {}
+    if isinstance(payload, dict) and "input" not in payload:
+        estimate += int(payload.get("max_completion_tokens") or payload.get("max_tokens") or 256)
+
+    return max(1, estimate)
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("retry-after")
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def _is_rate_limited(request: httpx.Request) -> bool:
+    return request.url.path.endswith(RATE_LIMITED_PATHS)
+
+
+class RateLimitedTransport(httpx.BaseTransport):
+    """在同步 transport 外层加限流"""
+
+    def __init__(self, transport: httpx.BaseTransport, limiter: AdaptiveRateLimiter):
+        self._transport = transport
+        self.limiter = limiter
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if not self.limiter.enabled or not _is_rate_limited(request):
+            return self._transport.handle_request(request)
+
+        self.limiter.acquire(estimate_request_tokens(request))
+        try:
+            response = self._transport.handle_request(request)
+        except Exception:
+            self.limiter.release(None)
+            raise
+
+        status, retry_after = response.status_code, _retry_after(response)
+        return release_on_close(response, lambda: self.limiter.release(status, retry_after))
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+class AsyncRateLimitedTransport(httpx.AsyncBaseTransport):
+    """在异步 transport 外层加限流"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, limiter: AdaptiveRateLimiter):
+        self._transport = transport
+        self.limiter = limiter
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if not self.limiter.enabled or not _is_rate_limited(request):
+            return await self._transport.handle_async_request(request)
+
+        await self.limiter.aacquire(estimate_request_tokens(request))
+        try:
+            response = await self._transport.handle_async_request(request)
+        except asyncio.CancelledError:
+            self.limiter.cancel()
+            raise
+        except Exception:
+            self.limiter.release(None)
+            raise
+
+        status, retry_after = response.status_code, _retry_after(response)
+        return release_on_close(response, lambda: self.limiter.release(status, retry_after))
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+_rate_limiter: Optional[AdaptiveRateLimiter] = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> AdaptiveRateLimiter:
+    """获取进程内共享的限流器（配置从环境变量读取）"""
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = AdaptiveRateLimiter(
+                requests_per_minute=float(os.getenv("LLM_RPM_LIMIT", "0")),
+                tokens_per_minute=float(os.getenv("LLM_TPM_LIMIT", "0")),
+                max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "0")),
+            )
+        return _rate_limiter
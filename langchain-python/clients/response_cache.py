@@ -0,0 +1,262 @@
+"""LLM 响应缓存模块
+
+两级精确匹配缓存：内存 LRU + SQLite 持久化。
+基于 LangChain 的 BaseCache 接口实现，通过 ChatOpenAI(cache=...) 接入，
+缓存键由规范化后的消息、工具定义和采样参数共同决定，命中时完全跳过网络请求。
+"""
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import warnings
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+
+load_dotenv(override=True)
+
+
+class TwoTierLLMCache(BaseCache):
+    """内存 LRU + SQLite 两级 LLM 响应缓存"""
+
+    def __init__(
+        self,
+        db_path: Optional[str] = ".cache/llm_cache.sqlite",
+        ttl_seconds: Optional[float] = 24 * 3600,
+        max_entries: int = 1024,
+        max_bytes: int = 64 * 1024 * 1024,
+        disk_max_entries: int = 100_000,
+    ):
+        """
+        Args:
+            db_path: SQLite 文件路径，为 None 时只使用内存缓存
+            ttl_seconds: 过期时间（秒），为 None 时永不过期
+            max_entries: 内存层最大条目数
+            max_bytes: 内存层最大字节数（按序列化后的大小计算）
+            disk_max_entries: 磁盘层最大条目数，超出时淘汰最久未访问的条目
+        """
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_max_entries = disk_max_entries
+
+        self._memory: "OrderedDict[str, Tuple[float, int, RETURN_VAL_TYPE]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "bytes_saved": 0,
+            "evictions": 0,
+        }
+
+        self._conn: Optional[sqlite3.Connection] = None
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )"""
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache (accessed_at)"
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def _make_key(prompt: str, llm_string: str) -> str:
+        """由 prompt 和模型配置生成缓存键"""
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds
+
+    def _memory_put(self, key: str, created_at: float, size: int, value: RETURN_VAL_TYPE) -> None:
+        """写入内存层，并按条目数和字节数淘汰最久未使用的条目"""
+        if key in self._memory:
+            self._memory_bytes -= self._memory.pop(key)[1]
+        self._memory[key] = (created_at, size, value)
+        self._memory_bytes += size
+
+        while self._memory and (
+            len(self._memory) > self.max_entries or self._memory_bytes > self.max_bytes
+        ):
+            _, (_, evicted_size, _) = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted_size
+            self._stats["evictions"] += 1
+
+    def _lookup_memory(self, key: str) -> Optional[RETURN_VAL_TYPE]:
+        """查询内存层（调用方需持有锁）"""
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+
+        created_at, size, value = entry
+        if self._expired(created_at):
+            self._memory.pop(key)
+            self._memory_bytes -= size
+            return None
+
+        self._memory.move_to_end(key)
+        self._stats["memory_hits"] += 1
+        self._stats["bytes_saved"] += size
+        return value
+
+    def _lookup_disk(self, key: str) -> Optional[RETURN_VAL_TYPE]:
+        """查询磁盘层，命中后回填内存层"""
+        if self._conn is None:
+            return None
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, size, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            payload, size, created_at = row
+            if self._expired(created_at):
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+
+            self._conn.execute(
+                "UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+
+        try:
+            with warnings.catch_warnings():
+                # langchain_core.load.loads 仍处于 beta 阶段，这里屏蔽其提示
+                warnings.simplefilter("ignore")
+                value = loads(payload)
+        except Exception:
+            return None
+
+        with self._lock:
+            self._memory_put(key, created_at, size, value)
+            self._stats["disk_hits"] += 1
+            self._stats["bytes_saved"] += size
+        return value
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        """查询缓存：先内存后磁盘"""
+        key = self._make_key(prompt, llm_string)
+        with self._lock:
+            value = self._lookup_memory(key)
+            if value is not None:
+                return value
+
+        value = self._lookup_disk(key)
+        if value is None:
+            with self._lock:
+                self._stats["misses"] += 1
+        return value
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        """写入缓存：同时写入内存层和磁盘层"""
+        key = self._make_key(prompt, llm_string)
+        payload = dumps(list(return_val))
+        size = len(payload.encode("utf-8"))
+        now = time.time()
+
+        with self._lock:
+            self._memory_put(key, now, size, return_val)
+
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?, ?)",
+                    (key, payload, size, now, now),
+                )
+                self._evict_disk()
+                self._conn.commit()
+
+    def _evict_disk(self) -> None:
+        """删除过期条目，并把磁盘层控制在 disk_max_entries 以内（调用方需持有锁）"""
+        if self.ttl_seconds is not None:
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            )
+
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+        overflow = count - self.disk_max_entries
+        if overflow > 0:
+            self._conn.execute(
+                """DELETE FROM llm_cache WHERE key IN (
+                    SELECT key FROM llm_cache ORDER BY accessed_at ASC LIMIT ?
+                )""",
+                (overflow,),
+            )
+            self._stats["evictions"] += overflow
+
+    async def alookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        """异步查询：内存命中直接返回，磁盘查询放到线程池执行"""
+        key = self._make_key(prompt, llm_string)
+        with self._lock:
+            value = self._lookup_memory(key)
+            if value is not None:
+                return value
+
+        value = await asyncio.to_thread(self._lookup_disk, key)
+        if value is None:
+            with self._lock:
+                self._stats["misses"] += 1
+        return value
+
+    async def aupdate(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        """异步写入缓存"""
+        await asyncio.to_thread(self.update, prompt, llm_string, return_val)
+
+    def clear(self, **kwargs: Any) -> None:
+        """清空两级缓存"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM llm_cache")
+                self._conn.commit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存命中统计"""
+        with self._lock:
+            hits = self._stats["memory_hits"] + self._stats["disk_hits"]
+            total = hits + self._stats["misses"]
+            return {
+                **self._stats,
+                "hits": hits,
+                "hit_rate": hits / total if total > 0 else 0,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+            }
+
+
+_response_cache: Optional[TwoTierLLMCache] = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> TwoTierLLMCache:
+    """获取进程内共享的响应缓存（配置从环境变量读取）"""
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            ttl = float(os.getenv("LLM_CACHE_TTL", str(24 * 3600)))
+            _response_cache = TwoTierLLMCache(
+                db_path=os.getenv("LLM_CACHE_PATH", ".cache/llm_cache.sqlite") or None,
+                ttl_seconds=ttl if ttl > 0 else None,
+                max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024")),
+                max_bytes=int(os.getenv("LLM_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+                disk_max_entries=int(os.getenv("LLM_CACHE_DISK_MAX_ENTRIES", "100000")),
+            )
+        return _response_cache
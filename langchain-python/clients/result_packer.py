@@ -0,0 +1,184 @@
+"""搜索结果打包模块
+
+把搜索结果装进固定的 token 预算，替代按固定字符数截断或整段原文返回：
+- 结果按排名依次分配预算，份额与相关度分数成正比，排名靠前的结果拿到更多 token，
+  内容较短的结果用不完的份额留给后面的结果
+- 正文按句子装入，跨结果重复的句子（转载、导航、样板文字）只保留第一次出现
+- 正文被全部去重的结果直接丢弃，预算不足以放下一条有效结果时停止
+
+token 数用 clients.tokenizer 的缓存计数器计算，与请求实际消耗保持一致。
+"""
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+from dotenv import load_dotenv
+
+from .embedding_dedup import normalize_text
+from .tokenizer import count_tokens
+
+load_dotenv(override=True)
+
+_CJK_TERMINATORS = "。！？；"
+
+# 中文句末标点后直接断句，英文句末标点后需跟空白，避免切开小数和缩写
+_SENTENCE_BOUNDARY = re.compile(rf"(?<=[{_CJK_TERMINATORS}])|(?<=[.!?;])\s+|\n+")
+
+# 每条结果的编号、缩进和字段名等格式开销
+_RESULT_OVERHEAD_TOKENS = 8
+
+ELLIPSIS = "…"
+
+
+def split_sentences(text: str) -> List[str]:
+    """按中英文句末标点和换行切分句子"""
+    sentences = (sentence.strip() for sentence in _SENTENCE_BOUNDARY.split(text) if sentence)
+    return [sentence for sentence in sentences if sentence]
+
+
+def join_sentences(sentences: Sequence[str]) -> str:
+    """拼接句子，中文句末标点后不加空格"""
+    parts = []
+    for index, sentence in enumerate(sentences):
+        if index and sentences[index - 1][-1] not in _CJK_TERMINATORS:
+            parts.append(" ")
+        parts.append(sentence)
+    return "".join(parts)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """截断文本使其不超过 max_tokens，被截断时以省略号结尾"""
+    tokens = count_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    if max_tokens <= 1:
+        return ""
+    # 按比例估算截断位置，再逐步收缩直到满足预算
+    end = len(text) * (max_tokens - 1) // tokens
+    while end > 0 and count_tokens(text[:end]) > max_tokens - 1:
+        end = end * 9 // 10
+    return text[:end].rstrip() + ELLIPSIS if end > 0 else ""
+
+
+class ResultPacker:
+    """按 token 预算打包搜索结果，记录输入输出 token 数和去重句子数"""
+
+    def __init__(self, token_budget: int = 1200, min_result_tokens: int = 40):
+        """
+        Args:
+            token_budget: 全部结果（标题、URL、正文）的 token 总预算
+            min_result_tokens: 单条结果的最小份额，剩余预算不足时不再放入新结果
+        """
+        self.token_budget = token_budget
+        self.min_result_tokens = min_result_tokens
+        self._lock = threading.Lock()
+        self._stats = {
+            "calls": 0,
+            "results_in": 0,
+            "results_out": 0,
+            "tokens_in": 0,
+            "tokens_out": 0,
+            "duplicate_sentences": 0,
+        }
+
+    def pack(
+        self, results: Sequence[Dict[str, Any]], token_budget: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """打包按相关度排好序的结果
+
+        Args:
+            results: 搜索结果，包含 title、url、content，可选 fused_score / score
+            token_budget: 本次调用的预算，默认使用实例配置
+
+        Returns:
+            content 被替换为预算内摘要的结果副本
+        """
+        remaining = self.token_budget if token_budget is None else token_budget
+        # 合并结果优先使用融合分数；没有分数时按排名递减
+        weights = [
+            result.get("fused_score") or result.get("score") or 1 / (rank + 1)
+            for rank, result in enumerate(results)
+        ]
+        remaining_weight = sum(weights)
+
+        seen = set()
+        packed: List[Dict[str, Any]] = []
+        tokens_in = tokens_out = duplicates = 0
+
+        for result, weight in zip(results, weights):
+            content = result.get("content") or ""
+            tokens_in += count_tokens(content)
+            share = int(remaining * weight / remaining_weight) if remaining_weight else remaining
+            remaining_weight -= weight
+
+            overhead = (
+                count_tokens(result.get("title") or "")
+                + count_tokens(result.get("url") or "")
+                + _RESULT_OVERHEAD_TOKENS
+            )
+            body_budget = max(share, self.min_result_tokens) - overhead
+            if remaining - overhead < self.min_result_tokens or body_budget <= 0:
+                continue
+
+            body_budget = min(body_budget, remaining - overhead)
+            sentences, used = [], 0
+            for sentence in split_sentences(content):
+                key = normalize_text(sentence).lower()
+                if key in seen:
+                    duplicates += 1
+                    continue
+                size = count_tokens(sentence)
+                if used + size > body_budget:
+                    if not sentences:
+                        # 首句就超出份额时截断首句，保证结果有正文
+                        sentence = truncate_to_tokens(sentence, body_budget)
+                        if sentence:
+                            seen.add(key)
+                            sentences.append(sentence)
+                            used += count_tokens(sentence)
+                    break
+                seen.add(key)
+                sentences.append(sentence)
+                used += size
+
+            if not sentences:
+                continue
+            packed.append({**result, "content": join_sentences(sentences)})
+            remaining -= overhead + used
+            tokens_out += used
+
+        with self._lock:
+            self._stats["calls"] += 1
+            self._stats["results_in"] += len(results)
+            self._stats["results_out"] += len(packed)
+            self._stats["tokens_in"] += tokens_in
+            self._stats["tokens_out"] += tokens_out
+            self._stats["duplicate_sentences"] += duplicates
+        return packed
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取打包前后的正文 token 数和节省比例"""
+        with self._lock:
+            tokens_in = self._stats["tokens_in"]
+            return {
+                **self._stats,
+                "token_budget": self.token_budget,
+                "saved_ratio": 1 - self._stats["tokens_out"] / tokens_in if tokens_in else 0,
+            }
+
+
+_packer: Optional[ResultPacker] = None
+_packer_lock = threading.Lock()
+
+
+def get_result_packer() -> ResultPacker:
+    """获取进程内共享的结果打包器（预算从 SEARCH_RESULT_TOKEN_BUDGET 读取）"""
+    global _packer
+    with _packer_lock:
+        if _packer is None:
+            _packer = ResultPacker(
+                token_budget=int(os.getenv("SEARCH_RESULT_TOKEN_BUDGET", "1200")),
+                min_result_tokens=int(os.getenv("SEARCH_RESULT_MIN_TOKENS", "40")),
+            )
+        return _packer
@@ -0,0 +1,189 @@
+"""语义响应缓存模块
+
+对用户问题做嵌入，用 NumPy 余弦相似度索引查找措辞不同但语义相同的历史问题，
+命中时直接返回已存储的回答。适合在路由层按需开启（例如 06 的 /chat）。
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+
+class SemanticCache:
+    """基于嵌入相似度的有界语义缓存"""
+
+    def __init__(
+        self,
+        embeddings,
+        threshold: float = 0.95,
+        max_entries: int = 512,
+        ttl_seconds: Optional[float] = 600,
+    ):
+        """
+        Args:
+            embeddings: LangChain 嵌入客户端（需实现 embed_query / aembed_query）
+            threshold: 余弦相似度阈值，达到阈值才视为命中
+            max_entries: 最大条目数，满了之后淘汰最久未命中的条目
+            ttl_seconds: 过期时间（秒），为 None 时永不过期
+        """
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        self._vectors: Optional[np.ndarray] = None
+        self._answers: List[Optional[str]] = [None] * max_entries
+        self._created_at = np.zeros(max_entries)
+        self._last_used = np.zeros(max_entries)
+        self._occupied = np.zeros(max_entries, dtype=bool)
+
+        # 最近一次查询的嵌入，避免 lookup 之后 update 时重复计算
+        self._recent_vectors: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm > 0 else array
+
+    def _remember(self, prompt: str, vector: np.ndarray) -> None:
+        self._recent_vectors[prompt] = vector
+        self._recent_vectors.move_to_end(prompt)
+        while len(self._recent_vectors) > 64:
+            self._recent_vectors.popitem(last=False)
+
+    def _search(self, prompt: str, vector: np.ndarray) -> Optional[str]:
+        """在索引中查找最相似的条目"""
+        with self._lock:
+            self._remember(prompt, vector)
+
+            if self._vectors is None or not self._occupied.any():
+                self._stats["misses"] += 1
+                return None
+
+            now = time.time()
+            valid = self._occupied.copy()
+            if self.ttl_seconds is not None:
+                expired = valid & (now - self._created_at > self.ttl_seconds)
+                self._occupied[expired] = False
+                valid &= ~expired
+
+            if not valid.any():
+                self._stats["misses"] += 1
+                return None
+
+            scores = self._vectors @ vector
+            scores[~valid] = -1.0
+            best = int(np.argmax(scores))
+
+            if scores[best] < self.threshold:
+                self._stats["misses"] += 1
+                return None
+
+            self._last_used[best] = now
+            self._stats["hits"] += 1
+            return self._answers[best]
+
+    def _insert(self, vector: np.ndarray, answer: str) -> None:
+        """写入索引：优先使用空槽位，否则淘汰最久未使用的条目"""
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+
+            free = np.flatnonzero(~self._occupied)
+            if free.size > 0:
+                slot = int(free[0])
+            else:
+                slot = int(np.argmin(self._last_used))
+                self._stats["evictions"] += 1
+
+            now = time.time()
+            self._vectors[slot] = vector
+            self._answers[slot] = answer
+            self._created_at[slot] = now
+            self._last_used[slot] = now
+            self._occupied[slot] = True
+
+    def _cached_vector(self, prompt: str) -> Optional[np.ndarray]:
+        with self._lock:
+            return self._recent_vectors.get(prompt)
+
+    def lookup(self, prompt: str) -> Optional[str]:
+        """查找语义相近的历史回答"""
+        vector = self._normalize(self.embeddings.embed_query(prompt))
+        return self._search(prompt, vector)
+
+    def update(self, prompt: str, answer: str) -> None:
+        """存储问题和回答"""
+        vector = self._cached_vector(prompt)
+        if vector is None:
+            vector = self._normalize(self.embeddings.embed_query(prompt))
+        self._insert(vector, answer)
+
+    async def alookup(self, prompt: str) -> Optional[str]:
+        """异步查找语义相近的历史回答"""
+        vector = self._normalize(await self.embeddings.aembed_query(prompt))
+        return self._search(prompt, vector)
+
+    async def aupdate(self, prompt: str, answer: str) -> None:
+        """异步存储问题和回答"""
+        vector = self._cached_vector(prompt)
+        if vector is None:
+            vector = self._normalize(await self.embeddings.aembed_query(prompt))
+        self._insert(vector, answer)
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._occupied[:] = False
+            self._recent_vectors.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存命中统计"""
+        with self._lock:
+            total = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": self._stats["hits"] / total if total > 0 else 0,
+                "entries": int(self._occupied.sum()),
+                "threshold": self.threshold,
+            }
+
+
+def create_semantic_cache(
+    threshold: Optional[float] = None,
+    max_entries: Optional[int] = None,
+    ttl_seconds: Optional[float] = None,
+    **embedding_kwargs,
+) -> SemanticCache:
+    """创建语义缓存，嵌入客户端由 create_embedding_client 提供
+
+    Args:
+        threshold: 相似度阈值，默认读取 SEMANTIC_CACHE_THRESHOLD（0.95）
+        max_entries: 最大条目数，默认读取 SEMANTIC_CACHE_MAX_ENTRIES（512）
+        ttl_seconds: 过期时间，默认读取 SEMANTIC_CACHE_TTL（600 秒）
+        **embedding_kwargs: 透传给 create_embedding_client 的参数
+
+    Returns:
+        SemanticCache 实例
+    """
+    from .embedding_client import create_embedding_client
+
+    ttl = ttl_seconds if ttl_seconds is not None else float(os.getenv("SEMANTIC_CACHE_TTL", "600"))
+    if threshold is None:
+        threshold = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+
+    return SemanticCache(
+        embeddings=create_embedding_client(**embedding_kwargs),
+        threshold=threshold,
+        max_entries=max_entries or int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "512")),
+        ttl_seconds=ttl if ttl > 0 else None,
+    )
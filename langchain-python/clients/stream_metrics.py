@@ -0,0 +1,147 @@
+"""流式输出延迟统计模块
+
+通过 LangChain 回调记录每次流式调用的首 token 时间（TTFT）、token 间隔、
+输出速度和总耗时。create_model_client(streaming=True) 创建的客户端会自动挂载，
+统计结果推送给已注册的监听器（如 utils.monitor.PerformanceMonitor）。
+"""
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+from uuid import UUID
+
+import numpy as np
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+
+@dataclass
+class StreamMetrics:
+    """单次流式调用的延迟指标（时间单位：秒）"""
+    model: str
+    ttft: Optional[float]
+    duration: float
+    tokens: int
+    tokens_per_second: float
+    itl_mean: Optional[float]
+    itl_p50: Optional[float]
+    itl_p95: Optional[float]
+    itl_max: Optional[float]
+    success: bool
+    inter_token_gaps: List[float] = field(default_factory=list, repr=False)
+
+
+@dataclass
+class _RunState:
+    model: str
+    started: float
+    token_times: List[float] = field(default_factory=list)
+
+
+class StreamingMetricsHandler(BaseCallbackHandler):
+    """记录流式调用时间线的回调处理器"""
+
+    # 在事件循环中直接执行，避免线程池调度延迟影响计时
+    run_inline = True
+
+    def __init__(self):
+        self._runs: Dict[UUID, _RunState] = {}
+        self._listeners: List[Callable[[StreamMetrics], None]] = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener: Callable[[StreamMetrics], None]) -> None:
+        """注册监听器，每次流式调用结束时收到一条 StreamMetrics"""
+        with self._lock:
+            if listener not in self._listeners:
+                self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[StreamMetrics], None]) -> None:
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def _start(self, run_id: UUID, serialized: Optional[Dict[str, Any]], **kwargs: Any) -> None:
+        params = kwargs.get("invocation_params") or {}
+        model = (
+            params.get("model")
+            or params.get("model_name")
+            or (kwargs.get("metadata") or {}).get("ls_model_name")
+            or (serialized or {}).get("name", "unknown")
+        )
+        with self._lock:
+            self._runs[run_id] = _RunState(model=model, started=time.perf_counter())
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs: Any) -> None:
+        self._start(run_id, serialized, **kwargs)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs: Any) -> None:
+        self._start(run_id, serialized, **kwargs)
+
+    def on_llm_new_token(self, token: str, *, chunk=None, run_id, **kwargs: Any) -> None:
+        now = time.perf_counter()
+        # 空 chunk（如只带 role 的首个 chunk）不算 token，工具调用参数的增量算
+        message = getattr(chunk, "message", None)
+        if not token and not getattr(message, "tool_call_chunks", None):
+            return
+        state = self._runs.get(run_id)
+        if state is not None:
+            state.token_times.append(now)
+
+    def on_llm_end(self, response: LLMResult, *, run_id, **kwargs: Any) -> None:
+        self._finish(run_id, True, _output_tokens(response))
+
+    def on_llm_error(self, error: BaseException, *, run_id, **kwargs: Any) -> None:
+        self._finish(run_id, False, None)
+
+    def _finish(self, run_id: UUID, success: bool, output_tokens: Optional[int]) -> None:
+        ended = time.perf_counter()
+        with self._lock:
+            state = self._runs.pop(run_id, None)
+            listeners = list(self._listeners)
+        # 没有收到任何 token 的调用（非流式、缓存命中）不计入流式统计
+        if state is None or not state.token_times or not listeners:
+            return
+
+        times = state.token_times
+        gaps = np.diff(times) if len(times) > 1 else np.array([])
+        tokens = output_tokens or len(times)
+        generation_time = ended - times[0]
+
+        metrics = StreamMetrics(
+            model=state.model,
+            ttft=times[0] - state.started,
+            duration=ended - state.started,
+            tokens=tokens,
+            tokens_per_second=(tokens - 1) / generation_time if tokens > 1 and generation_time > 0 else 0.0,
+            itl_mean=float(gaps.mean()) if gaps.size else None,
+            itl_p50=float(np.percentile(gaps, 50)) if gaps.size else None,
+            itl_p95=float(np.percentile(gaps, 95)) if gaps.size else None,
+            itl_max=float(gaps.max()) if gaps.size else None,
+            success=success,
+            inter_token_gaps=gaps.tolist(),
+        )
+        for listener in listeners:
+            listener(metrics)
+
+
+def _output_tokens(response: LLMResult) -> Optional[int]:
+    """从 usage_metadata 读取实际输出 token 数（服务端未返回时为 None）"""
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage and usage.get("output_tokens"):
+                return usage["output_tokens"]
+    return None
+
+
+_handler: Optional[StreamingMetricsHandler] = None
+_handler_lock = threading.Lock()
+
+
+def get_streaming_metrics_handler() -> StreamingMetricsHandler:
+    """获取进程内共享的流式统计回调"""
+    global _handler
+    with _handler_lock:
+        if _handler is None:
+            _handler = StreamingMetricsHandler()
+        return _handler
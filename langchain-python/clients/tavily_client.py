@@ -1,68 +1,517 @@
-"""Tavily 搜索客户端模块"""
+"""Tavily 搜索客户端模块
+
+所有搜索请求通过共享连接池（keep-alive）发出，带超时和重试；结果按规范化后的查询和参数
+缓存在进程内（TTL + LRU），重复的研究查询直接从内存返回。
+"""
+import asyncio
+import json
 import os
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import httpx
 from dotenv import load_dotenv
 from langchain.tools import tool
+from langchain_core.language_models import BaseChatModel
+from langchain_core.tools import StructuredTool
+
+from .http_pool import get_async_http_client, get_http_client
+from .knowledge_base import get_knowledge_base
+from .result_packer import get_result_packer
 
 load_dotenv(override=True)
 
+TAVILY_SEARCH_URL = "https://api.tavily.com/search"
 
-@tool
-def create_tavily_search_tool(api_key: str):
-    """创建 Tavily 搜索工具
+DEFAULT_SEARCH_PARAMS = {
+    "search_depth": "basic",
+    "max_results": 5,
+    "include_answer": True,
+    "include_images": False,
+    "include_image_descriptions": False,
+    "include_raw_content": False,
+}
 
-    Args:
-        api_key: Tavily API 密钥
+# 可重试的 HTTP 状态码
+RETRY_STATUS = {429, 500, 502, 503, 504}
 
-    Returns:
-        Tavily 搜索工具函数
+# 倒数排名融合（RRF）的平滑常数
+RRF_K = 60
+
+QUERY_REWRITE_PROMPT = """为下面的搜索查询写 {count} 个不同角度的改写，用于扩大搜索召回。
+每行一个，不要编号，不要解释。
+
+查询：{query}"""
+
+
+class TavilySearchError(Exception):
+    """Tavily 搜索请求失败"""
+
+
+def normalize_query(query: str) -> str:
+    """规范化查询（NFKC、小写、合并空白），用作缓存键"""
+    return " ".join(unicodedata.normalize("NFKC", query).lower().split())
+
+
+def normalize_url(url: str) -> str:
+    """规范化 URL 用于去重：小写域名、去掉片段、跟踪参数和末尾斜杠"""
+    parts = urlsplit(url.strip())
+    query = urlencode(
+        [(k, v) for k, v in parse_qsl(parts.query) if not k.lower().startswith("utm_")]
+    )
+    return urlunsplit(
+        (parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip("/"), query, "")
+    )
+
+
+def merge_search_results(
+    responses: Sequence[Dict[str, Any]], max_results: int = 8
+) -> Dict[str, Any]:
+    """按 URL 合并多次搜索的结果，用倒数排名融合（RRF）打分
+
+    同一 URL 在多个查询中出现时分数累加，保留 Tavily 相关度最高的那条摘要。
     """
+    merged: Dict[str, Dict[str, Any]] = {}
+    for response in responses:
+        for rank, result in enumerate(response.get("results", [])):
+            key = normalize_url(result["url"])
+            entry = merged.get(key)
+            if entry is None:
+                entry = merged[key] = {**result, "fused_score": 0.0, "hits": 0}
+            elif result.get("score", 0) > entry.get("score", 0):
+                entry.update(result)
+            entry["fused_score"] += 1 / (RRF_K + rank + 1)
+            entry["hits"] += 1
 
-    async def search(query: str) -> str:
-        """使用 Tavily API 进行网络搜索
+    ranked = sorted(
+        merged.values(), key=lambda r: (r["fused_score"], r.get("score", 0)), reverse=True
+    )
+    answer = next((r.get("answer") for r in responses if r.get("answer")), None)
+    return {"results": ranked[:max_results], "answer": answer, "unique_urls": len(merged)}
 
-        Args:
-            query: 搜索查询关键词
 
-        Returns:
-            搜索结果字符串
+class TavilySearchClient:
+    """带结果缓存、超时和重试的 Tavily 搜索客户端"""
+
+    def __init__(
+        self,
+        api_key: str,
+        cache_ttl: float = 3600,
+        cache_max_entries: int = 512,
+        timeout: float = 30.0,
+        max_retries: int = 2,
+        backoff: float = 0.5,
+    ):
         """
-        try:
-            import httpx
-
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    "https://api.tavily.com/search",
-                    json={
-                        "api_key": api_key,
-                        "query": query,
-                        "search_depth": "basic",
-                        "max_results": 5,
-                        "include_answer": True,
-                        "include_images": False,
-                        "include_image_descriptions": False,
-                        "include_raw_content": False,
-                    },
-                    timeout=30.0,
+        Args:
+            api_key: Tavily API 密钥
+            cache_ttl: 结果缓存时间（秒），为 0 时不缓存
+            cache_max_entries: 缓存最大条目数，超出时淘汰最久未使用的条目
+            timeout: 单次请求超时（秒）
+            max_retries: 网络错误、429 和 5xx 时的最大重试次数
+            backoff: 重试的初始退避时间（秒），每次翻倍，响应带 Retry-After 时以其为准
+        """
+        self.api_key = api_key
+        self.cache_ttl = cache_ttl
+        self.cache_max_entries = cache_max_entries
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0, "misses": 0, "coalesced": 0, "requests": 0, "retries": 0, "errors": 0
+        }
+        self._inflight: Dict[str, "asyncio.Task[Dict[str, Any]]"] = {}
+
+    def _params(self, query: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        return {**DEFAULT_SEARCH_PARAMS, **params, "query": query}
+
+    def _cache_key(self, params: Dict[str, Any]) -> str:
+        normalized = {**params, "query": normalize_query(params["query"])}
+        return json.dumps(normalized, sort_keys=True, ensure_ascii=False)
+
+    def _lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and time.monotonic() - entry[0] <= self.cache_ttl:
+                self._cache.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry[1]
+            if entry is not None:
+                del self._cache[key]
+            self._stats["misses"] += 1
+            return None
+
+    def _store(self, key: str, data: Dict[str, Any]) -> None:
+        if self.cache_ttl <= 0:
+            return
+        with self._lock:
+            self._cache[key] = (time.monotonic(), data)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_max_entries:
+                self._cache.popitem(last=False)
+
+    def _retry_delay(self, attempt: int, response: Optional[httpx.Response]) -> Optional[float]:
+        """返回下一次重试前的等待时间，不应重试时返回 None"""
+        if attempt >= self.max_retries:
+            return None
+        if response is not None and response.status_code not in RETRY_STATUS:
+            return None
+        with self._lock:
+            self._stats["retries"] += 1
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after and retry_after.replace(".", "", 1).isdigit():
+            return float(retry_after)
+        return self.backoff * (2 ** attempt)
+
+    def _result(self, response: httpx.Response) -> Dict[str, Any]:
+        if response.status_code != 200:
+            raise TavilySearchError(f"Tavily API error: {response.status_code}")
+        return response.json()
+
+    def _fail(self, error: Exception) -> TavilySearchError:
+        with self._lock:
+            self._stats["errors"] += 1
+        if isinstance(error, TavilySearchError):
+            return error
+        return TavilySearchError(f"Tavily 请求失败: {error}")
+
+    def search(self, query: str, **params: Any) -> Dict[str, Any]:
+        """同步搜索，返回 Tavily 原始响应（dict）"""
+        payload = self._params(query, params)
+        key = self._cache_key(payload)
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+
+        attempt = 0
+        while True:
+            response = None
+            with self._lock:
+                self._stats["requests"] += 1
+            try:
+                response = get_http_client().post(
+                    TAVILY_SEARCH_URL,
+                    json={**payload, "api_key": self.api_key},
+                    timeout=self.timeout,
                 )
+                data = self._result(response)
+                break
+            except (httpx.TransportError, TavilySearchError) as e:
+                delay = self._retry_delay(attempt, response)
+                if delay is None:
+                    raise self._fail(e) from e
+                time.sleep(delay)
+                attempt += 1
+
+        self._store(key, data)
+        return data
+
+    async def asearch(self, query: str, **params: Any) -> Dict[str, Any]:
+        """异步搜索，返回 Tavily 原始响应（dict）；相同查询正在进行时等待同一个请求"""
+        payload = self._params(query, params)
+        key = self._cache_key(payload)
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
 
-                if response.status_code != 200:
-                    raise Exception(f"Tavily API error: {response.status_code}")
+        loop = asyncio.get_running_loop()
+        task = self._inflight.get(key)
+        if task is not None and task.get_loop() is loop:
+            with self._lock:
+                self._stats["coalesced"] += 1
+        else:
+            task = self._inflight[key] = loop.create_task(self._afetch(key, payload))
+            task.add_done_callback(lambda _: self._forget_inflight(key, task))
 
-                data = response.json()
+        # 请求在独立的任务中执行：发起请求的调用方被取消（客户端断开、超时）时，
+        # 请求照常完成，其他等待同一查询的调用方不受影响
+        return await asyncio.shield(task)
 
-                search_results = "\n\n".join(
-                    [
-                        f"{i + 1}. {result['title']}\n   URL: {result['url']}\n   内容: {result['content'][:300]}..."
-                        for i, result in enumerate(data.get("results", []))
-                    ]
+    async def _afetch(self, key: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        data = await self._arequest(payload)
+        self._store(key, data)
+        return data
+
+    def _forget_inflight(self, key: str, task: "asyncio.Task[Dict[str, Any]]") -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 等待方都已取消时标记异常已读取，避免事件循环告警
+        if not task.cancelled():
+            task.exception()
+
+    async def _arequest(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        attempt = 0
+        while True:
+            response = None
+            with self._lock:
+                self._stats["requests"] += 1
+            try:
+                response = await get_async_http_client().post(
+                    TAVILY_SEARCH_URL,
+                    json={**payload, "api_key": self.api_key},
+                    timeout=self.timeout,
                 )
+                data = self._result(response)
+                break
+            except (httpx.TransportError, TavilySearchError) as e:
+                delay = self._retry_delay(attempt, response)
+                if delay is None:
+                    raise self._fail(e) from e
+                await asyncio.sleep(delay)
+                attempt += 1
+        return data
+
+    def multi_search(
+        self, queries: Sequence[str], max_concurrency: int = 4, max_results: int = 8, **params: Any
+    ) -> Dict[str, Any]:
+        """并发执行多个查询并按 URL 合并，部分查询失败时使用其余结果"""
+        queries = _unique_queries(queries)
+
+        def run(query: str) -> Optional[Dict[str, Any]]:
+            try:
+                return self.search(query, **params)
+            except TavilySearchError:
+                return None
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(queries)))) as pool:
+            responses = list(pool.map(run, queries))
+        return self._merge(queries, responses, max_results)
+
+    async def amulti_search(
+        self, queries: Sequence[str], max_concurrency: int = 4, max_results: int = 8, **params: Any
+    ) -> Dict[str, Any]:
+        """异步版本的 multi_search"""
+        queries = _unique_queries(queries)
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def run(query: str) -> Optional[Dict[str, Any]]:
+            async with semaphore:
+                try:
+                    return await self.asearch(query, **params)
+                except TavilySearchError:
+                    return None
+
+        responses = await asyncio.gather(*(run(query) for query in queries))
+        return self._merge(queries, responses, max_results)
+
+    def _merge(
+        self, queries: List[str], responses: List[Optional[Dict[str, Any]]], max_results: int
+    ) -> Dict[str, Any]:
+        succeeded = [response for response in responses if response is not None]
+        if not succeeded:
+            raise TavilySearchError(f"全部 {len(queries)} 个查询均失败")
+        return {
+            **merge_search_results(succeeded, max_results),
+            "queries": queries,
+            "failed": len(responses) - len(succeeded),
+        }
+
+    def clear_cache(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存命中率、请求数、重试和失败次数"""
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": self._stats["hits"] / lookups if lookups else 0,
+                "cache_entries": len(self._cache),
+            }
+
+
+def _unique_queries(queries: Sequence[str]) -> List[str]:
+    """去掉规范化后重复的查询，保持原有顺序"""
+    seen = set()
+    unique = []
+    for query in queries:
+        key = normalize_query(query)
+        if key and key not in seen:
+            seen.add(key)
+            unique.append(query.strip())
+    return unique
+
 
-                return f"搜索结果：\n\n{search_results}\n\nAI 总结：{data.get('answer', '无总结')}"
+def get_tavily_api_key() -> Optional[str]:
+    """读取 TAVILY_API_KEY，未配置或仍是示例值时返回 None"""
+    api_key = os.getenv("TAVILY_API_KEY")
+    if api_key and api_key != "your_tavily_api_key_here" and len(api_key) > 10:
+        return api_key
+    return None
+
+
+_clients: Dict[str, TavilySearchClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_tavily_client(api_key: Optional[str] = None) -> TavilySearchClient:
+    """获取进程内共享的 Tavily 客户端（同一个 API Key 共用连接和结果缓存）"""
+    api_key = api_key or get_tavily_api_key()
+    if not api_key:
+        raise ValueError("请设置 TAVILY_API_KEY 环境变量")
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = _clients[api_key] = TavilySearchClient(
+                api_key,
+                cache_ttl=float(os.getenv("TAVILY_CACHE_TTL", "3600")),
+                cache_max_entries=int(os.getenv("TAVILY_CACHE_MAX_ENTRIES", "512")),
+                timeout=float(os.getenv("TAVILY_TIMEOUT", "30")),
+                max_retries=int(os.getenv("TAVILY_MAX_RETRIES", "2")),
+            )
+        return client
+
+
+def get_search_stats() -> Dict[str, Any]:
+    """获取各 Tavily 客户端和结果打包器的统计信息"""
+    with _clients_lock:
+        clients = list(_clients.values())
+    stats = {f"tavily#{index}": client.get_stats() for index, client in enumerate(clients)}
+    stats["packer"] = get_result_packer().get_stats()
+    return stats
+
+
+def format_search_results(data: Dict[str, Any]) -> str:
+    """把 Tavily 响应格式化为工具输出，正文按 token 预算打包"""
+    search_results = "\n\n".join(
+        [
+            f"{i + 1}. {result['title']}\n   URL: {result['url']}\n   内容: {result['content']}"
+            for i, result in enumerate(get_result_packer().pack(data.get("results", [])))
+        ]
+    )
+    header = "搜索结果："
+    if data.get("queries"):
+        header = f"搜索结果（{len(data['queries'])} 个查询，合并 {data['unique_urls']} 个来源）："
+    return f"{header}\n\n{search_results}\n\nAI 总结：{data.get('answer') or '无总结'}"
+
+
+def create_tavily_search_tool(api_key: Optional[str] = None) -> StructuredTool:
+    """创建 Tavily 搜索工具
+
+    Args:
+        api_key: Tavily API 密钥，默认从环境变量读取
+
+    Returns:
+        同时支持 invoke / ainvoke 的搜索工具
+    """
+    client = get_tavily_client(api_key)
+
+    def search(query: str) -> str:
+        try:
+            return format_search_results(client.search(query))
+        except TavilySearchError as e:
+            print(f"Tavily search error: {e}")
+            return f"搜索失败：{str(e)}"
+
+    async def asearch(query: str) -> str:
+        try:
+            return format_search_results(await client.asearch(query))
+        except TavilySearchError as e:
+            print(f"Tavily search error: {e}")
+            return f"搜索失败：{str(e)}"
+
+    return StructuredTool.from_function(
+        func=search,
+        coroutine=asearch,
+        name="tavily_search",
+        description="使用 Tavily API 进行网络搜索，输入搜索查询关键词，返回搜索结果和总结",
+    )
+
+
+def _parse_rewrites(text: str, count: int) -> List[str]:
+    rewrites = []
+    for line in text.splitlines():
+        line = line.strip().lstrip("-*•0123456789.、） )").strip()
+        # 跳过"以下是改写："这类引导语
+        if line and not line.endswith(("：", ":")):
+            rewrites.append(line)
+    return rewrites[:count]
+
+
+def create_multi_query_search_tool(
+    api_key: Optional[str] = None,
+    llm: Optional[BaseChatModel] = None,
+    rewrites: int = 2,
+    max_concurrency: int = 4,
+    max_results: int = 8,
+) -> StructuredTool:
+    """创建多查询并发搜索工具
+
+    原始查询、调用方给出的查询变体以及 LLM 生成的改写并发搜索，结果按 URL 去重并用 RRF 融合，
+    输出一个紧凑的结果块。原始查询与改写生成同时进行，总耗时接近一次搜索加一次短生成。
+
+    Args:
+        api_key: Tavily API 密钥，默认从环境变量读取
+        llm: 用于生成查询改写的模型，为 None 时只搜索原始查询和给定变体
+        rewrites: LLM 生成的改写数量
+        max_concurrency: 同时进行的搜索请求数上限
+        max_results: 合并后保留的结果数
+    """
+    client = get_tavily_client(api_key)
+
+    def rewrite(query: str) -> List[str]:
+        if llm is None or rewrites <= 0:
+            return []
+        try:
+            message = llm.invoke(QUERY_REWRITE_PROMPT.format(count=rewrites, query=query))
+            return _parse_rewrites(message.text, rewrites)
+        except Exception as e:
+            print(f"Query rewrite error: {e}")
+            return []
+
+    async def arewrite(query: str) -> List[str]:
+        if llm is None or rewrites <= 0:
+            return []
+        try:
+            message = await llm.ainvoke(QUERY_REWRITE_PROMPT.format(count=rewrites, query=query))
+            return _parse_rewrites(message.text, rewrites)
         except Exception as e:
+            print(f"Query rewrite error: {e}")
+            return []
+
+    def search(query: str, variants: Optional[List[str]] = None) -> str:
+        try:
+            queries = [query, *(variants or []), *rewrite(query)]
+            return format_search_results(
+                client.multi_search(queries, max_concurrency, max_results)
+            )
+        except TavilySearchError as e:
+            print(f"Tavily search error: {e}")
+            return f"搜索失败：{str(e)}"
+
+    async def asearch(query: str, variants: Optional[List[str]] = None) -> str:
+        try:
+            # 原始查询和给定变体不等改写结果，先发出；合并搜索时等待同一个请求或直接命中缓存
+            initial = _unique_queries([query, *(variants or [])])[:max_concurrency]
+            early = [asyncio.ensure_future(client.asearch(q)) for q in initial]
+            generated = await arewrite(query)
+            try:
+                return format_search_results(await client.amulti_search(
+                    [query, *(variants or []), *generated], max_concurrency, max_results
+                ))
+            finally:
+                await asyncio.gather(*early, return_exceptions=True)
+        except TavilySearchError as e:
             print(f"Tavily search error: {e}")
             return f"搜索失败：{str(e)}"
 
-    return search
+    return StructuredTool.from_function(
+        func=search,
+        coroutine=asearch,
+        name="tavily_multi_search",
+        description=(
+            "使用 Tavily API 从多个角度并发搜索并合并去重结果。"
+            "query 为搜索关键词，variants 为可选的其他查询写法"
+        ),
+    )
 
 
 def create_mock_search_tool():
@@ -78,37 +527,27 @@ def create_mock_search_tool():
         Returns:
             搜索结果
         """
-        knowledge_base = {
-            "快速排序": "快速排序是一种分治算法，平均时间复杂度 O(n log n)，通过选择基准元素分区实现。",
-            "Python": "Python 是一种高级编程语言，语法简洁，适合快速开发。",
-            "算法": "算法是解决特定问题的一系列明确步骤。",
-            "代码优化": "代码优化包括时间复杂度优化、空间复杂度优化、代码可读性提升等。",
-            "JavaScript": "JavaScript 是一种动态编程语言，主要用于 Web 开发，支持事件驱动和函数式编程。",
-            "React": "React 是一个用于构建用户界面的 JavaScript 库，由 Facebook 开发，采用组件化架构。",
-            "Vue": "Vue.js 是一个渐进式 JavaScript 框架，易于上手，支持双向数据绑定和组件化开发。",
-            "Node.js": "Node.js 是一个基于 Chrome V8 引擎的 JavaScript 运行时，用于构建服务器端应用。",
-            "TypeScript": "TypeScript 是 JavaScript 的超集，添加了静态类型检查，提高代码可维护性。",
-        }
-
-        for key, value in knowledge_base.items():
-            if key in query:
-                return f"找到：{value}"
-
-        return f"关于 '{query}' 的搜索结果：建议查阅官方文档和技术博客。"
+        return get_knowledge_base().format_results(query)
 
     return search_database
 
 
-def create_search_tool():
+def create_search_tool(multi_query: bool = False, llm: Optional[BaseChatModel] = None):
     """创建搜索工具，自动选择 Tavily 或模拟工具
 
+    Args:
+        multi_query: 是否使用多查询并发搜索（Tavily 可用时生效）
+        llm: 多查询模式下用于生成查询改写的模型
+
     Returns:
         搜索工具
     """
-    tavily_api_key = os.getenv("TAVILY_API_KEY")
+    tavily_api_key = get_tavily_api_key()
 
-    if tavily_api_key and tavily_api_key != "your_tavily_api_key_here" and len(tavily_api_key) > 10:
+    if tavily_api_key:
         print("✓ 使用 Tavily 搜索 API")
+        if multi_query:
+            return create_multi_query_search_tool(tavily_api_key, llm=llm)
         return create_tavily_search_tool(tavily_api_key)
     else:
         print("⚠ Tavily API Key 未配置，使用模拟搜索工具")
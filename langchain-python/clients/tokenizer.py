@@ -0,0 +1,47 @@
+"""token 计数模块
+
+tiktoken 编码器按模型缓存，重复出现的文本（系统提示词、模板）的计数结果也会缓存。
+tiktoken 未安装或词表无法下载（离线环境）时退化为按字符估算。
+"""
+from functools import lru_cache
+from typing import Any, Optional
+
+DEFAULT_ENCODING_MODEL = "gpt-3.5-turbo"
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str = DEFAULT_ENCODING_MODEL) -> Optional[Any]:
+    """获取模型对应的 tiktoken 编码器，非 OpenAI 模型使用 cl100k_base，不可用时返回 None"""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        pass
+    except Exception:
+        return None
+
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    """按字符估算 token 数：中日韩字符约 1 个 token，其他字符约 4 个一组"""
+    wide = sum(1 for char in text if ord(char) > 0x2E80)
+    return wide + (len(text) - wide + 3) // 4
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text: str, model: str = DEFAULT_ENCODING_MODEL) -> int:
+    """计算文本的 token 数"""
+    if not text:
+        return 0
+    encoding = get_encoding(model)
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
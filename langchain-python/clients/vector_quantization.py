@@ -0,0 +1,244 @@
+"""向量压缩模块
+
+降低嵌入索引的内存占用，并度量压缩对检索召回率的影响：
+- 降维：PCA（用文档向量拟合）或前缀截断（适合 Matryoshka 训练的嵌入模型）
+- 存储精度：float32、float16、int8 标量量化（按维度 min/max 线性映射到 0-255）
+- recall_report：在一组查询上比较各压缩配置的 recall@k 和内存占用
+
+压缩配置用字符串描述，如 "float16"、"int8"、"pca:384"、"prefix:256+int8"。
+Chroma 等外部向量库只能存 float32，可用 ReducedEmbeddings 把降维接入，
+量化部分由 CompressedVectorIndex 在内存中实现。
+"""
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+STORAGE_TYPES = ("float32", "float16", "int8")
+
+DEFAULT_REPORT_SPECS = (
+    "float16",
+    "int8",
+    "pca:384",
+    "pca:384+int8",
+    "prefix:256",
+    "prefix:256+int8",
+)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+
+class PrefixTruncation:
+    """保留向量的前 dims 维"""
+
+    def __init__(self, dims: int):
+        self.dims = dims
+
+    def fit(self, vectors: Sequence[Sequence[float]]) -> "PrefixTruncation":
+        return self
+
+    def transform(self, vectors: np.ndarray) -> np.ndarray:
+        return vectors[..., :self.dims]
+
+    @property
+    def nbytes(self) -> int:
+        return 0
+
+
+class PCAReduction:
+    """PCA 降维，主成分数不超过样本数和原始维度"""
+
+    def __init__(self, dims: int):
+        self.dims = dims
+        self.mean: Optional[np.ndarray] = None
+        self.components: Optional[np.ndarray] = None
+
+    def fit(self, vectors: Sequence[Sequence[float]]) -> "PCAReduction":
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.mean = vectors.mean(axis=0)
+        centered = vectors - self.mean
+        if len(vectors) > vectors.shape[1]:
+            # 样本多于维度时分解协方差矩阵，比对整个样本矩阵做 SVD 快得多
+            _, eigenvectors = np.linalg.eigh(centered.T @ centered)
+            components = eigenvectors[:, ::-1].T
+        else:
+            _, _, components = np.linalg.svd(centered, full_matrices=False)
+        self.components = components[:self.dims].astype(np.float32)
+        return self
+
+    def transform(self, vectors: np.ndarray) -> np.ndarray:
+        if self.components is None:
+            raise RuntimeError("PCAReduction 需要先调用 fit")
+        return (vectors - self.mean) @ self.components.T
+
+    @property
+    def nbytes(self) -> int:
+        if self.components is None:
+            return 0
+        return self.components.nbytes + self.mean.astype(np.float32).nbytes
+
+
+class ScalarQuantizer:
+    """int8 标量量化：每个维度按 min/max 线性映射到 0-255"""
+
+    def fit(self, vectors: np.ndarray) -> "ScalarQuantizer":
+        self.minimum = vectors.min(axis=0).astype(np.float32)
+        span = vectors.max(axis=0) - self.minimum
+        self.scale = (np.where(span > 0, span, 1) / 255).astype(np.float32)
+        return self
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.rint((vectors - self.minimum) / self.scale)
+        return np.clip(codes, 0, 255).astype(np.uint8)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return codes.astype(np.float32) * self.scale + self.minimum
+
+    @property
+    def nbytes(self) -> int:
+        return self.minimum.nbytes + self.scale.nbytes
+
+
+def parse_compression(spec: str) -> Tuple[Optional[Any], str]:
+    """解析压缩配置字符串，返回 (降维器, 存储精度)"""
+    reducer, storage = None, "float32"
+    for part in spec.lower().replace(" ", "").split("+"):
+        if part in ("", "none"):
+            continue
+        if part in STORAGE_TYPES:
+            storage = part
+        elif part.startswith("pca:"):
+            reducer = PCAReduction(int(part[4:]))
+        elif part.startswith("prefix:"):
+            reducer = PrefixTruncation(int(part[7:]))
+        else:
+            raise ValueError(f"不支持的压缩配置: {spec}")
+    return reducer, storage
+
+
+class CompressedVectorIndex:
+    """内存中的压缩向量索引（余弦相似度检索）"""
+
+    def __init__(self, vectors: Sequence[Sequence[float]], compression: str = "float32"):
+        """
+        Args:
+            vectors: 文档向量，降维器和量化参数都用它拟合
+            compression: 压缩配置，如 "pca:384+int8"
+        """
+        self.compression = compression
+        self.reducer, self.storage = parse_compression(compression)
+        self.quantizer: Optional[ScalarQuantizer] = None
+
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if self.reducer is not None:
+            matrix = self.reducer.fit(matrix).transform(matrix)
+        matrix = _normalize(matrix)
+
+        if self.storage == "int8":
+            self.quantizer = ScalarQuantizer().fit(matrix)
+            self._data = self.quantizer.encode(matrix)
+        else:
+            self._data = matrix.astype(self.storage)
+
+    def _prepare_query(self, query: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(query, dtype=np.float32)
+        if self.reducer is not None:
+            vector = self.reducer.transform(vector)
+        return _normalize(vector)
+
+    def search(self, query: Sequence[float], k: int = 4) -> Tuple[np.ndarray, np.ndarray]:
+        """返回相似度最高的 k 个文档下标及其相似度"""
+        vector = self._prepare_query(query)
+        if self.quantizer is not None:
+            # q·(min + code * scale) = q·min + (q * scale)·code，无需解码整张表
+            scores = self._data @ (vector * self.quantizer.scale) + vector @ self.quantizer.minimum
+        else:
+            scores = self._data.astype(np.float32) @ vector
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return top, scores[top]
+
+    @property
+    def nbytes(self) -> int:
+        """向量数据加上降维矩阵、量化参数的总字节数"""
+        total = self._data.nbytes
+        if self.reducer is not None:
+            total += self.reducer.nbytes
+        if self.quantizer is not None:
+            total += self.quantizer.nbytes
+        return total
+
+
+class ReducedEmbeddings(Embeddings):
+    """对上游嵌入结果降维并重新归一化，使外部向量库保存更小的向量"""
+
+    def __init__(self, embeddings: Embeddings, reducer: Any):
+        """
+        Args:
+            embeddings: 上游嵌入客户端
+            reducer: 已拟合的降维器（PCAReduction / PrefixTruncation）
+        """
+        self.embeddings = embeddings
+        self.reducer = reducer
+
+    def _reduce(self, vectors: List[List[float]]) -> List[List[float]]:
+        matrix = self.reducer.transform(np.asarray(vectors, dtype=np.float32))
+        return _normalize(matrix).astype(np.float32).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._reduce(self.embeddings.embed_documents(texts))
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._reduce(await self.embeddings.aembed_documents(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._reduce([self.embeddings.embed_query(text)])[0]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return self._reduce([await self.embeddings.aembed_query(text)])[0]
+
+
+def recall_report(
+    document_vectors: Sequence[Sequence[float]],
+    query_vectors: Sequence[Sequence[float]],
+    k: int = 5,
+    specs: Sequence[str] = DEFAULT_REPORT_SPECS,
+) -> List[Dict[str, Any]]:
+    """以 float32 精确检索为基准，计算各压缩配置的 recall@k 和内存占用
+
+    压缩参数只用文档向量拟合，查询向量不参与拟合（held-out）。
+    """
+    exact = CompressedVectorIndex(document_vectors, "float32")
+    truth = [set(exact.search(query, k)[0].tolist()) for query in query_vectors]
+    baseline = np.asarray(document_vectors, dtype=np.float32).nbytes
+
+    rows = [{"compression": "float32", "bytes": baseline, "ratio": 1.0, "recall": 1.0}]
+    for spec in specs:
+        index = CompressedVectorIndex(document_vectors, spec)
+        hits = [
+            len(expected & set(index.search(query, k)[0].tolist())) / len(expected)
+            for query, expected in zip(query_vectors, truth)
+        ]
+        rows.append({
+            "compression": spec,
+            "bytes": index.nbytes,
+            "ratio": baseline / index.nbytes,
+            "recall": float(np.mean(hits)) if hits else 0.0,
+        })
+    return rows
+
+
+def format_recall_report(rows: List[Dict[str, Any]], k: int = 5) -> str:
+    """把 recall_report 的结果格式化为表格"""
+    # 中文表头按两列宽度对齐
+    lines = ["压缩配置" + " " * 14 + " " * 8 + "内存" + " " * 3 + "压缩比" + f"{f'recall@{k}':>10}"]
+    for row in rows:
+        lines.append(
+            f"{row['compression']:<22}{row['bytes'] / 1024:>10.1f}KB"
+            f"{row['ratio']:>8.1f}x{row['recall']:>10.3f}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+公共模块回归测试
+不依赖网络和 API Key，可直接用 pytest 运行
+"""
+
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from clients.prompt_minifier import minify_text
+
+
+def test_minify_keeps_code_indentation():
+    """未加代码块标记的代码：整段共用一个缩进量，相对缩进不变"""
+    code = "def f(x):\n    if x:\n        y = 1\n\n        return y\n    return 0\n"
+    assert minify_text(code) == code.strip()
+
+    indented = "\n".join("    " + line if line else "" for line in code.split("\n"))
+    assert minify_text(indented) == code.strip()
+
+
+def test_minify_keeps_unclosed_code_fence():
+    """被截断、没有闭合的结尾代码块按代码原样保留"""
+    text = "  说明：\n\n  结果如下\n```python\ndef g():\n        pass\n\n\n\n    return 1"
+    assert minify_text(text) == (
+        "说明：\n\n结果如下\n```python\ndef g():\n        pass\n\n\n\n    return 1"
+    )
+
+
+def test_coalesced_calls_billed_once():
+    """合并的并发请求只按一次上游调用计费"""
+    import asyncio
+
+    import httpx
+
+    from clients.chat_model import ManagedChatOpenAI
+    from clients.coalescing import RequestCoalescer
+    from utils.monitor import UsageCallbackHandler
+
+    requests = []
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, json={
+            "id": "chatcmpl-1",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "gpt-4o-mini",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "ok"},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 2, "total_tokens": 12},
+        })
+
+    llm = ManagedChatOpenAI(
+        model="gpt-4o-mini",
+        api_key="test",
+        base_url="http://mock/v1",
+        http_async_client=httpx.AsyncClient(transport=httpx.MockTransport(handle)),
+        coalescer=RequestCoalescer(),
+    )
+    handler = UsageCallbackHandler()
+
+    async def run():
+        return await asyncio.gather(*[
+            llm.ainvoke("same", config={"callbacks": [handler]}) for _ in range(5)
+        ])
+
+    replies = asyncio.run(run())
+    usage = handler.get_usage()["gpt-4o-mini"]
+
+    assert len(requests) == 1
+    assert [reply.content for reply in replies] == ["ok"] * 5
+    assert usage["llm_calls"] == 1
+    assert usage["input_tokens"] == 10
+    assert usage["cached_calls"] == 4
+
+
+def test_monitor_caps_span_names():
+    """span 名称超出上限后合并统计，内存不随名称数增长"""
+    from utils.monitor import OTHER_SPAN_NAME, PerformanceMonitor
+
+    monitor = PerformanceMonitor(history_size=10, max_span_names=2)
+    for index in range(5):
+        with monitor.span(f"GET /nope{index}"):
+            pass
+
+    summary = monitor.get_span_summary()
+    assert list(summary) == ["GET /nope0", "GET /nope1", OTHER_SPAN_NAME]
+    assert summary[OTHER_SPAN_NAME]["count"] == 3
+
+
+def test_search_waiters_survive_leader_cancel():
+    """发起搜索的调用方被取消时，等待同一查询的其他调用方仍拿到结果"""
+    import asyncio
+
+    from clients.tavily_client import TavilySearchClient
+
+    client = TavilySearchClient(api_key="test")
+    calls = []
+
+    async def fake_request(payload):
+        calls.append(payload)
+        await asyncio.sleep(0.05)
+        return {"results": [{"title": "t", "url": "u", "content": payload["query"]}]}
+
+    client._arequest = fake_request
+
+    async def run():
+        leader = asyncio.create_task(client.asearch("same"))
+        await asyncio.sleep(0)
+        waiters = [asyncio.create_task(client.asearch("same")) for _ in range(3)]
+        await asyncio.sleep(0)
+        leader.cancel()
+        results = await asyncio.gather(*waiters)
+        return leader, results
+
+    leader, results = asyncio.run(run())
+    assert leader.cancelled()
+    assert len(calls) == 1
+    assert [result["results"][0]["content"] for result in results] == ["same"] * 3
+
+
+def test_unique_texts_keeps_original_chunks():
+    """按规范化内容去重，写入向量库的仍是第一次出现的原文"""
+    from clients.embedding_dedup import unique_texts
+
+    chunks = ["第一段\n  正文", "第一段 正文", "ＡＢＣ  页脚", "ABC 页脚", "第二段"]
+    assert unique_texts(chunks) == ["第一段\n  正文", "ＡＢＣ  页脚", "第二段"]
+
+
+def test_output_budgets_env_carries_stops():
+    """OUTPUT_BUDGETS 规则可以带停止序列，不带时沿用代码中的停止序列"""
+    from clients.output_governor import OutputBudget, OutputGovernor, _parse_budgets
+
+    governor = OutputGovernor(_parse_budgets(r"*/summary=300,*/query_rewrite=100|\n\n|END"))
+    default = OutputBudget(400, ("[报告结束]",))
+    assert governor.resolve("09-multi-agent/summary", default) == OutputBudget(300, ("[报告结束]",))
+    assert governor.resolve("09-multi-agent/query_rewrite", 150) == OutputBudget(100, ("\n\n", "END"))
+
+
+def test_cascade_escalation_raises_output_budget(monkeypatch):
+    """便宜模型被截断后升级，主模型的输出上限按 CASCADE_BUDGET_RATIO 放大"""
+    from clients import OutputBudget, create_model_client
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("CASCADE_MODEL_NAME", "cheap-model")
+    monkeypatch.setenv("CASCADE_BUDGET_RATIO", "2")
+    llm = create_model_client(
+        "main-model",
+        temperature=0,
+        shared=False,
+        cascade=True,
+        call_site="test/summary",
+        output_budget=OutputBudget(400, ("[报告结束]",)),
+    )
+    cheap, main = llm.tiers
+    assert (cheap.max_tokens, cheap.stop) == (400, ["[报告结束]"])
+    assert (main.max_tokens, main.stop) == (800, ["[报告结束]"])
+    assert main.call_site == "test/summary/escalated"
+
+
+def test_knowledge_base_keeps_keys_differing_in_case():
+    """只差大小写的关键词各自都能命中"""
+    from clients.knowledge_base import KnowledgeBase
+
+    kb = KnowledgeBase({"Python": "语言", "python": "蛇", "py": "缩写"})
+    assert kb.search("learn PYTHON") == [("Python", "语言"), ("python", "蛇"), ("py", "缩写")]
+
+
+def test_semantic_cache_explicit_zero_threshold(monkeypatch):
+    """显式传入 threshold=0.0 时不被环境变量的默认值覆盖"""
+    from clients.semantic_cache import create_semantic_cache
+
+    monkeypatch.setenv("SEMANTIC_CACHE_THRESHOLD", "0.95")
+    cache = create_semantic_cache(threshold=0.0, use_fake=True)
+    assert cache.threshold == 0.0
+
+
+def test_cascade_usage_counted_once():
+    """级联调用的用量只按各级模型的实际调用计费，外层级联运行不重复计入"""
+    import httpx
+
+    from clients.cascade import CascadeChatModel
+    from clients.chat_model import ManagedChatOpenAI
+    from utils.monitor import PerformanceMonitor, UsageCallbackHandler
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        model = json.loads(request.content)["model"]
+        return httpx.Response(200, json={
+            "id": "chatcmpl-1",
+            "object": "chat.completion",
+            "created": 0,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": model},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 2, "total_tokens": 12},
+        })
+
+    def tier(model: str) -> ManagedChatOpenAI:
+        return ManagedChatOpenAI(
+            model=model,
+            api_key="test",
+            base_url="http://mock/v1",
+            http_client=httpx.Client(transport=httpx.MockTransport(handle)),
+        )
+
+    llm = CascadeChatModel(
+        tiers=[tier("gpt-4o-mini"), tier("gpt-4o")],
+        validator=lambda message: False,
+    )
+    monitor = PerformanceMonitor(history_size=10)
+    handler = UsageCallbackHandler()
+    with monitor.span("cascade"):
+        reply = llm.invoke("hi", config={"callbacks": [handler]})
+
+    usage = handler.get_usage()
+    assert reply.content == "gpt-4o"
+    assert reply.usage_metadata["input_tokens"] == 10
+    assert {model: stats["llm_calls"] for model, stats in usage.items()} == {
+        "gpt-4o-mini": 1, "gpt-4o": 1,
+    }
+    assert usage["gpt-4o"]["input_tokens"] == 10
+    summary = monitor.get_span_summary()["cascade"]["usage"]
+    assert (summary["llm_calls"], summary["total_tokens"]) == (2, 24)
+
+
+def test_cascade_clients_reused_across_calls(monkeypatch):
+    """每次调用都新建同配置的解析器时，级联客户端仍从注册表复用"""
+    from langchain_core.output_parsers import PydanticOutputParser
+    from pydantic import BaseModel
+
+    from clients import contains_sections, create_model_client, parses_with
+
+    class UserInfo(BaseModel):
+        name: str
+
+    class Company(BaseModel):
+        name: str
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("CASCADE_MODEL_NAME", "cheap-model")
+
+    def extractor(model):
+        parser = PydanticOutputParser(pydantic_object=model)
+        return create_model_client("main-model", temperature=0, cascade=parses_with(parser))
+
+    assert extractor(UserInfo) is extractor(UserInfo)
+    assert extractor(UserInfo) is not extractor(Company)
+
+    summary = lambda: create_model_client(
+        "main-model", temperature=0, cascade=contains_sections(["建议", "下一步行动"])
+    )
+    assert summary() is summary()
+
+
+def test_query_rewrites_skip_preamble():
+    """查询改写跳过"以下是改写："这类引导语，不把它当作搜索查询"""
+    from clients.tavily_client import _parse_rewrites
+
+    text = "以下是改写：\n\n1. Python 性能优化技巧\n2. 提升 Python 运行速度"
+    assert _parse_rewrites(text, 2) == ["Python 性能优化技巧", "提升 Python 运行速度"]
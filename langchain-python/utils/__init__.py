@@ -1,9 +1,24 @@
 """LangChain Python 工具模块"""
-from .monitor import PerformanceMonitor, CustomCallbackHandler, setup_langsmith, with_tracking
+from .monitor import (
+    PerformanceMonitor,
+    CustomCallbackHandler,
+    UsageCallbackHandler,
+    current_span,
+    setup_langsmith,
+    with_tracking,
+)
+from .histogram import LatencyHistogram, SlidingWindowHistogram
+from .pricing import estimate_cost, get_model_price
 
 __all__ = [
     "PerformanceMonitor",
     "CustomCallbackHandler",
+    "UsageCallbackHandler",
+    "current_span",
     "setup_langsmith",
     "with_tracking",
+    "LatencyHistogram",
+    "SlidingWindowHistogram",
+    "estimate_cost",
+    "get_model_price",
 ]
@@ -0,0 +1,170 @@
+"""延迟直方图模块
+
+HDR 风格的对数分桶直方图：数值按 2 的幂分段，每段再线性细分，
+任意量级下的相对误差都不超过 10^-significant_digits，桶的总数固定，
+记录任意多次耗时都只占用固定内存。SlidingWindowHistogram 按时间片轮转，
+统计最近一段时间内的分位数和吞吐量。
+"""
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Sequence, Tuple
+
+# 汇总时报告的分位数
+PERCENTILES = (("p50", 50.0), ("p90", 90.0), ("p99", 99.0), ("p999", 99.9))
+
+DEFAULT_WINDOWS = (60, 300, 900)
+
+
+class LatencyHistogram:
+    """对数分桶的延迟直方图（单位：秒，内部以微秒整数分桶）"""
+
+    def __init__(self, significant_digits: int = 2, max_seconds: float = 3600.0):
+        """
+        Args:
+            significant_digits: 有效数字位数，2 表示相对误差不超过 1%
+            max_seconds: 可区分的最大耗时，更大的值计入最高的桶（max 仍记录真实值）
+        """
+        self.significant_digits = significant_digits
+        self.max_seconds = max_seconds
+        # 每段细分为 2^sub_bits 个桶，保证段内精度满足有效数字要求
+        self._sub_bits = math.ceil(math.log2(2 * 10 ** significant_digits))
+        self._sub_count = 1 << self._sub_bits
+        self._half = self._sub_count >> 1
+        self._max_index = self._index(int(max_seconds * 1_000_000))
+        # 稀疏存储：只有出现过的桶占用内存，上限为 _max_index + 1 个
+        self._counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def _index(self, micros: int) -> int:
+        if micros < self._sub_count:
+            return micros
+        shift = micros.bit_length() - self._sub_bits
+        return self._sub_count + (shift - 1) * self._half + (micros >> shift) - self._half
+
+    def _value(self, index: int) -> int:
+        """桶内的最大值（微秒）"""
+        if index < self._sub_count:
+            return index
+        shift, offset = divmod(index - self._sub_count, self._half)
+        shift += 1
+        return ((offset + self._half) << shift) + (1 << shift) - 1
+
+    def record(self, seconds: float) -> None:
+        """记录一次耗时"""
+        seconds = max(seconds, 0.0)
+        index = min(self._index(int(seconds * 1_000_000)), self._max_index)
+        self._counts[index] = self._counts.get(index, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+
+    def merge(self, other: "LatencyHistogram") -> "LatencyHistogram":
+        """把另一个同精度直方图的计数合并进来"""
+        for index, count in other._counts.items():
+            self._counts[index] = self._counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """返回分位数（秒），取所在桶的上界，不超过记录到的最大值"""
+        if not self.count:
+            return None
+        target = max(1, math.ceil(self.count * percentile / 100))
+        seen = 0
+        for index in sorted(self._counts):
+            seen += self._counts[index]
+            if seen >= target:
+                return min(self._value(index) / 1_000_000, self.max)
+        return self.max
+
+    def summary(self, percentiles: Sequence[Tuple[str, float]] = PERCENTILES) -> Dict[str, Any]:
+        """次数、均值、分位数和最大值"""
+        return {
+            "count": self.count,
+            "avg": self.total / self.count if self.count else None,
+            **{name: self.percentile(value) for name, value in percentiles},
+            "max": self.max,
+        }
+
+    @property
+    def buckets(self) -> int:
+        """已占用的桶数"""
+        return len(self._counts)
+
+
+class SlidingWindowHistogram:
+    """按时间片轮转的直方图，统计最近若干秒的分位数和吞吐量"""
+
+    def __init__(
+        self,
+        windows: Sequence[int] = DEFAULT_WINDOWS,
+        slot_seconds: int = 10,
+        significant_digits: int = 2,
+    ):
+        """
+        Args:
+            windows: 需要统计的窗口长度（秒）
+            slot_seconds: 时间片长度，窗口按整数个时间片近似
+            significant_digits: 直方图有效数字位数
+        """
+        self.windows = tuple(windows)
+        self.slot_seconds = slot_seconds
+        self.significant_digits = significant_digits
+        self._slots: Deque[Tuple[int, LatencyHistogram]] = deque(
+            maxlen=math.ceil(max(self.windows) / slot_seconds)
+        )
+        self._started: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        slot = int(now // self.slot_seconds)
+        with self._lock:
+            if self._started is None:
+                self._started = now
+            if not self._slots or self._slots[-1][0] != slot:
+                self._slots.append((slot, LatencyHistogram(self.significant_digits)))
+            self._slots[-1][1].record(seconds)
+
+    def snapshot(self, window: int, now: Optional[float] = None) -> LatencyHistogram:
+        """合并最近 window 秒内各时间片的直方图"""
+        now = time.monotonic() if now is None else now
+        oldest = int(now // self.slot_seconds) - math.ceil(window / self.slot_seconds) + 1
+        merged = LatencyHistogram(self.significant_digits)
+        with self._lock:
+            for slot, histogram in self._slots:
+                if slot >= oldest:
+                    merged.merge(histogram)
+        return merged
+
+    def summary(self, now: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """各窗口的分位数和每秒次数（运行时间不足一个窗口时按实际时长计算）"""
+        now = time.monotonic() if now is None else now
+        result = {}
+        for window in self.windows:
+            histogram = self.snapshot(window, now)
+            started = now if self._started is None else self._started
+            elapsed = min(window, max(now - started, self.slot_seconds))
+            result[_window_label(window)] = {
+                **histogram.summary(),
+                "throughput": histogram.count / elapsed,
+            }
+        return result
+
+
+def _window_label(seconds: int) -> str:
+    if seconds % 3600 == 0:
+        return f"{seconds // 3600}h"
+    if seconds % 60 == 0:
+        return f"{seconds // 60}m"
+    return f"{seconds}s"
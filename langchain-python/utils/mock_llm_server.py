@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+本地 OpenAI 兼容模拟服务
+
+实现 /v1/chat/completions（含 SSE 流式输出和工具调用）、/v1/embeddings 和 /v1/models，
+用于在没有网络、不产生费用的情况下压测和基准测试 06、10、13 等示例。
+
+可配置首 token 延迟、每秒 token 数、错误注入比例，以及按关键词匹配的脚本化回答 / 工具调用。
+所有随机行为由 MOCK_LLM_SEED 决定，相同配置下多次运行结果可复现。
+
+启动：
+    python -m utils.mock_llm_server
+然后设置：
+    OPENAI_BASE_URL=http://127.0.0.1:8900/v1
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import numpy as np
+import uvicorn
+from dotenv import load_dotenv
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+load_dotenv(override=True)
+
+# 默认回答的词表，每个词计为一个 token
+_VOCABULARY = (
+    "这是 一个 来自 本地 模拟 服务 的 回答 ， 用于 压测 和 基准 测试 。 "
+    "内容 不 具有 实际 含义 ， 但 长度 和 节奏 与 真实 模型 的 流式 输出 相近 。"
+).split()
+
+
+@dataclass
+class MockConfig:
+    """模拟服务配置"""
+
+    ttft: float = 0.2
+    """首 token 延迟（秒）"""
+
+    tokens_per_second: float = 50
+    """输出速度，0 表示不限速"""
+
+    output_tokens: int = 64
+    """默认回答的 token 数（受请求中 max_tokens 限制）"""
+
+    error_rate: float = 0
+    """返回 500 的请求比例"""
+
+    rate_limit_rate: float = 0
+    """返回 429 的请求比例"""
+
+    jitter: float = 0
+    """延迟抖动比例，如 0.2 表示在 ±20% 范围内随机"""
+
+    embedding_dimensions: int = 1536
+    """默认嵌入维度"""
+
+    script: List[Dict[str, Any]] = field(default_factory=list)
+    """脚本化规则，按顺序匹配最后一条用户消息"""
+
+    seed: int = 0
+    """随机种子"""
+
+    @classmethod
+    def from_env(cls) -> "MockConfig":
+        """从环境变量读取配置"""
+        script_path = os.getenv("MOCK_LLM_SCRIPT")
+        script = []
+        if script_path:
+            with open(script_path, "r", encoding="utf-8") as f:
+                script = json.load(f)
+
+        return cls(
+            ttft=float(os.getenv("MOCK_LLM_TTFT", "0.2")),
+            tokens_per_second=float(os.getenv("MOCK_LLM_TOKENS_PER_SECOND", "50")),
+            output_tokens=int(os.getenv("MOCK_LLM_OUTPUT_TOKENS", "64")),
+            error_rate=float(os.getenv("MOCK_LLM_ERROR_RATE", "0")),
+            rate_limit_rate=float(os.getenv("MOCK_LLM_RATE_LIMIT_RATE", "0")),
+            jitter=float(os.getenv("MOCK_LLM_JITTER", "0")),
+            embedding_dimensions=int(os.getenv("MOCK_LLM_EMBEDDING_DIMENSIONS", "1536")),
+            script=script,
+            seed=int(os.getenv("MOCK_LLM_SEED", "0")),
+        )
+
+
+def _message_text(message: Dict[str, Any]) -> str:
+    """提取消息文本（兼容多模态内容数组）"""
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return str(content)
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _split_tokens(text: str) -> List[str]:
+    """把脚本化回答切成流式输出的 token（中文按字，英文按 4 个字符）"""
+    tokens: List[str] = []
+    buffer = ""
+    for char in text:
+        if ord(char) > 0x2E80:
+            if buffer:
+                tokens.append(buffer)
+                buffer = ""
+            tokens.append(char)
+            continue
+        buffer += char
+        if len(buffer) >= 4 or char in " \n":
+            tokens.append(buffer)
+            buffer = ""
+    if buffer:
+        tokens.append(buffer)
+    return tokens
+
+
+class MockLLM:
+    """生成模拟回答并控制节奏"""
+
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self._random = random.Random(config.seed)
+        self._counter = 0
+        self.stats = {"chat_requests": 0, "embedding_requests": 0, "errors_injected": 0}
+
+    def _delay(self, seconds: float) -> float:
+        if self.config.jitter:
+            seconds *= 1 + self._random.uniform(-self.config.jitter, self.config.jitter)
+        return max(0.0, seconds)
+
+    def _token_interval(self) -> float:
+        if not self.config.tokens_per_second:
+            return 0.0
+        return self._delay(1 / self.config.tokens_per_second)
+
+    def next_id(self) -> str:
+        self._counter += 1
+        return f"chatcmpl-mock-{self._counter}"
+
+    def injected_error(self) -> Optional[JSONResponse]:
+        """按配置的比例注入 429 / 500 错误"""
+        roll = self._random.random()
+        if roll < self.config.rate_limit_rate:
+            self.stats["errors_injected"] += 1
+            return JSONResponse(
+                status_code=429,
+                headers={"retry-after": "1"},
+                content={"error": {"message": "模拟限流", "type": "rate_limit_error"}},
+            )
+        if roll < self.config.rate_limit_rate + self.config.error_rate:
+            self.stats["errors_injected"] += 1
+            return JSONResponse(
+                status_code=500,
+                content={"error": {"message": "模拟服务错误", "type": "server_error"}},
+            )
+        return None
+
+    def plan(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """决定本次回答：脚本化的文本 / 工具调用，或默认文本"""
+        messages = body.get("messages", [])
+        last = messages[-1] if messages else {}
+        max_tokens = body.get("max_completion_tokens") or body.get("max_tokens")
+
+        # 只在最后一条是用户消息时匹配脚本；工具结果返回后给出最终回答
+        if last.get("role") == "user":
+            text = _message_text(last)
+            tool_names = {tool.get("function", {}).get("name") for tool in body.get("tools", [])}
+            for rule in self.config.script:
+                if rule.get("match", "") not in text:
+                    continue
+                calls = [call for call in rule.get("tool_calls", []) if call["name"] in tool_names]
+                if calls:
+                    return {"tool_calls": calls}
+                if "content" in rule:
+                    return self._truncate(_split_tokens(rule["content"]), max_tokens)
+        elif last.get("role") == "tool":
+            return self._truncate(_split_tokens(f"根据工具结果：{_message_text(last)[:200]}"), max_tokens)
+
+        tokens = [
+            _VOCABULARY[i % len(_VOCABULARY)] for i in range(self.config.output_tokens)
+        ]
+        return self._truncate(tokens, max_tokens)
+
+    @staticmethod
+    def _truncate(tokens: List[str], max_tokens: Optional[int]) -> Dict[str, Any]:
+        if max_tokens and len(tokens) > max_tokens:
+            return {"tokens": tokens[:max_tokens], "finish_reason": "length"}
+        return {"tokens": tokens, "finish_reason": "stop"}
+
+    def tool_call_payloads(self, calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [
+            {
+                "id": f"call_mock_{self._counter}_{index}",
+                "type": "function",
+                "function": {
+                    "name": call["name"],
+                    "arguments": json.dumps(call.get("arguments", {}), ensure_ascii=False),
+                },
+            }
+            for index, call in enumerate(calls)
+        ]
+
+    async def complete(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """非流式回答：等待首 token 延迟加上全部 token 的生成时间"""
+        completion_id = self.next_id()
+        plan = self.plan(body)
+        prompt_tokens = _estimate_tokens(json.dumps(body.get("messages", []), ensure_ascii=False))
+
+        if "tool_calls" in plan:
+            await asyncio.sleep(self._delay(self.config.ttft))
+            message = {"role": "assistant", "content": None,
+                       "tool_calls": self.tool_call_payloads(plan["tool_calls"])}
+            finish_reason, completion_tokens = "tool_calls", 16
+        else:
+            tokens = plan["tokens"]
+            await asyncio.sleep(self._delay(self.config.ttft) + self._token_interval() * len(tokens))
+            message = {"role": "assistant", "content": "".join(tokens)}
+            finish_reason, completion_tokens = plan["finish_reason"], len(tokens)
+
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    async def stream(self, body: Dict[str, Any]) -> AsyncIterator[str]:
+        """SSE 流式回答"""
+        completion_id = self.next_id()
+        plan = self.plan(body)
+        model = body.get("model", "mock")
+        prompt_tokens = _estimate_tokens(json.dumps(body.get("messages", []), ensure_ascii=False))
+        include_usage = (body.get("stream_options") or {}).get("include_usage")
+
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+        await asyncio.sleep(self._delay(self.config.ttft))
+        yield chunk({"role": "assistant", "content": ""})
+
+        if "tool_calls" in plan:
+            for index, call in enumerate(self.tool_call_payloads(plan["tool_calls"])):
+                yield chunk({"tool_calls": [{"index": index, **call}]})
+            finish_reason, completion_tokens = "tool_calls", 16
+        else:
+            for token in plan["tokens"]:
+                yield chunk({"content": token})
+                await asyncio.sleep(self._token_interval())
+            finish_reason, completion_tokens = plan["finish_reason"], len(plan["tokens"])
+
+        yield chunk({}, finish_reason)
+
+        if include_usage:
+            usage = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            }
+            yield f"data: {json.dumps(usage)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    def embed(self, item: Any, dimensions: int) -> np.ndarray:
+        """由输入内容确定性地生成单位向量（相同输入总是得到相同向量）"""
+        raw = item if isinstance(item, str) else json.dumps(item)
+        seed = int.from_bytes(hashlib.sha256(raw.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+
+def create_app(config: Optional[MockConfig] = None) -> FastAPI:
+    """创建模拟服务应用"""
+    mock = MockLLM(config or MockConfig.from_env())
+    app = FastAPI(title="Mock OpenAI-compatible LLM", version="1.0.0")
+    app.state.mock = mock
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        mock.stats["chat_requests"] += 1
+
+        error = mock.injected_error()
+        if error is not None:
+            return error
+
+        if body.get("stream"):
+            return StreamingResponse(mock.stream(body), media_type="text/event-stream")
+        return await mock.complete(body)
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        mock.stats["embedding_requests"] += 1
+
+        error = mock.injected_error()
+        if error is not None:
+            return error
+
+        inputs = body.get("input", [])
+        # 输入可以是字符串、字符串列表、token 列表或 token 列表的列表
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        dimensions = body.get("dimensions") or mock.config.embedding_dimensions
+
+        data = []
+        for index, item in enumerate(inputs):
+            vector = mock.embed(item, dimensions)
+            if body.get("encoding_format") == "base64":
+                embedding: Any = base64.b64encode(vector.tobytes()).decode("ascii")
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+
+        tokens = sum(len(item) if isinstance(item, list) else _estimate_tokens(item) for item in inputs)
+        return {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "mock-embedding"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "mock", "object": "model", "owned_by": "mock"}]}
+
+    @app.get("/stats")
+    async def stats():
+        return mock.stats
+
+    return app
+
+
+app = create_app()
+
+
+def main():
+    port = int(os.getenv("MOCK_LLM_PORT", "8900"))
+    config = app.state.mock.config
+
+    print("\n🧪 Mock OpenAI-compatible LLM Server")
+    print("=" * 50)
+    print(f"服务器运行在 http://127.0.0.1:{port}/v1")
+    print(f"首 token 延迟: {config.ttft}s, 输出速度: {config.tokens_per_second} tokens/s")
+    print(f"错误注入: 500={config.error_rate:.0%}, 429={config.rate_limit_rate:.0%}")
+    print(f"脚本规则: {len(config.script)} 条")
+    print("\n使用方式:")
+    print(f"  OPENAI_BASE_URL=http://127.0.0.1:{port}/v1 python 06-api-deployment/main.py")
+    print("=" * 50)
+
+    uvicorn.run(app, host="0.0.0.0", port=port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,33 @@
-"""性能监控和追踪模块"""
+"""性能监控和追踪模块
+
+追踪以 span 为单位：每个 span 记录名称、耗时、成功与否以及父 span。
+当前 span 保存在 contextvars 中，asyncio 的每个任务、每个线程各自独立，
+一个 PerformanceMonitor 可以在服务的所有并发请求间共享，span 也可以任意嵌套。
+
+耗时按 span 名称记入固定内存的对数分桶直方图（utils.histogram），
+明细只保留最近 MONITOR_HISTORY_SIZE 条，长期运行的服务内存不会增长。
+span 名称最多统计 MONITOR_MAX_SPAN_NAMES 个，超出的名称合并到 OTHER_SPAN_NAME。
+
+UsageCallbackHandler 从 LLM 响应的 usage_metadata 读取实际 token 数，按 utils.pricing
+的价格表计费，计入当前 span 及其全部祖先 span，从而得到每个链、每个接口、每个会话的用量和费用。
+"""
 import os
 import time
 import json
-from typing import Dict, Any
+import itertools
+import threading
+from collections import OrderedDict, defaultdict, deque
+from contextvars import ContextVar, Token
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 from datetime import datetime
-from dataclasses import dataclass, asdict
-from contextlib import contextmanager
+from dataclasses import dataclass, asdict, field
+import numpy as np
 from dotenv import load_dotenv
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from .histogram import LatencyHistogram, SlidingWindowHistogram
+from .pricing import estimate_cost
 
 load_dotenv(override=True)
 
@@ -21,52 +42,329 @@ class PerformanceMetrics:
     total_tokens: int
     success: bool
     error_message: str = ""
+    span_id: int = 0
+    parent_id: Optional[int] = None
+    trace_id: int = 0
+    cost: float = 0.0
+    llm_calls: int = 0
+
+
+def _percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    """计算均值和常用分位数"""
+    if not values:
+        return {"avg": None, "p50": None, "p95": None, "p99": None, "max": None}
+    array = np.asarray(values)
+    p50, p95, p99 = np.percentile(array, [50, 95, 99])
+    return {
+        "avg": float(array.mean()),
+        "p50": float(p50),
+        "p95": float(p95),
+        "p99": float(p99),
+        "max": float(array.max()),
+    }
 
 
-class PerformanceMonitor:
-    """性能监控器"""
+@dataclass
+class Span:
+    """一次被追踪的执行区间"""
+    name: str
+    span_id: int
+    parent_id: Optional[int]
+    trace_id: int
+    start_time: float
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    parent: Optional["Span"] = field(default=None, repr=False)
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cost: float = 0.0
+    llm_calls: int = 0
+
+
+_span_ids = itertools.count(1)
+
+# span 名称超出上限后，新名称的统计合并到这里
+OTHER_SPAN_NAME = "(other)"
+_usage_lock = threading.Lock()
+
+# 当前执行上下文中最内层的 span；asyncio 任务创建时复制上下文，并发请求互不干扰
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    """获取当前上下文中最内层的 span"""
+    return _current_span.get()
+
+
+def record_llm_usage(input_tokens: int, output_tokens: int, cost: float = 0.0) -> bool:
+    """把一次 LLM 调用的用量计入当前 span 及其全部祖先 span，没有活动 span 时返回 False"""
+    span = _current_span.get()
+    if span is None:
+        return False
+    with _usage_lock:
+        while span is not None:
+            span.input_tokens += input_tokens
+            span.output_tokens += output_tokens
+            span.cost += cost
+            span.llm_calls += 1
+            span = span.parent
+    return True
+
+
+class SpanContext:
+    """span 的上下文管理器，同时支持 with 和 async with"""
+
+    def __init__(self, monitor: "PerformanceMonitor", name: str, attributes: Dict[str, Any]):
+        self.monitor = monitor
+        self.name = name
+        self.attributes = attributes
+        self.span: Optional[Span] = None
+        self._token = None
+
+    def __enter__(self) -> Span:
+        self.span, self._token = self.monitor._open_span(self.name, self.attributes)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.monitor._close_span(self.span, self._token, exc is None, "" if exc is None else str(exc))
+        return False
+
+    async def __aenter__(self) -> Span:
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb) -> bool:
+        return self.__exit__(exc_type, exc, tb)
+
+
+def _empty_usage() -> Dict[str, Any]:
+    return {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0, "cost": 0.0, "llm_calls": 0}
+
+
+def _add_usage(usage: Dict[str, Any], metrics: PerformanceMetrics) -> None:
+    usage["input_tokens"] += metrics.input_tokens
+    usage["output_tokens"] += metrics.output_tokens
+    usage["total_tokens"] += metrics.total_tokens
+    usage["cost"] += metrics.cost
+    usage["llm_calls"] += metrics.llm_calls
+
+
+class SpanStats:
+    """单个 span 名称的累计耗时直方图、滑动窗口直方图、失败次数和用量"""
 
     def __init__(self):
-        self.metrics_history = []
-        self.start_time = None
+        self.histogram = LatencyHistogram()
+        self.window = SlidingWindowHistogram()
+        self.errors = 0
+        self.usage = _empty_usage()
+
+    def record(self, metrics: PerformanceMetrics) -> None:
+        self.histogram.record(metrics.execution_time)
+        self.window.record(metrics.execution_time)
+        if not metrics.success:
+            self.errors += 1
+        _add_usage(self.usage, metrics)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "count": self.histogram.count,
+            "errors": self.errors,
+            "latency": self.histogram.summary(),
+            "windows": self.window.summary(),
+            "usage": dict(self.usage),
+        }
 
-    def start_tracking(self):
-        """开始追踪"""
-        self.start_time = time.time()
 
-    def end_tracking(self, chain_name: str, success: bool, error: str = "") -> PerformanceMetrics:
-        """结束追踪并记录指标"""
-        if not self.start_time:
-            raise ValueError("必须先调用 start_tracking()")
+class PerformanceMonitor:
+    """性能监控器（可在并发请求间共享，内存占用固定）"""
+
+    def __init__(self, history_size: Optional[int] = None, max_span_names: Optional[int] = None):
+        """
+        Args:
+            history_size: 保留的 span 和流式调用明细条数，默认读取 MONITOR_HISTORY_SIZE
+            max_span_names: 分别统计的 span 名称数上限，默认读取 MONITOR_MAX_SPAN_NAMES
+        """
+        if history_size is None:
+            history_size = int(os.getenv("MONITOR_HISTORY_SIZE", "1000"))
+        if max_span_names is None:
+            max_span_names = int(os.getenv("MONITOR_MAX_SPAN_NAMES", "200"))
+        self.metrics_history = deque(maxlen=history_size)
+        self.stream_metrics = deque(maxlen=history_size)
+        self._span_stats: Dict[str, SpanStats] = {}
+        self._max_span_names = max_span_names
+        # 顶层 span 的累计计数，不依赖明细
+        self._runs = {"total": 0, "successful": 0, "time": 0.0, **_empty_usage()}
+        # 按会话累计用量，只保留最近活跃的 history_size 个会话
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._max_sessions = history_size
+        self._manual_tokens: Dict[int, Token] = {}
+        self._lock = threading.Lock()
+
+    def span(self, name: str, **attributes) -> SpanContext:
+        """追踪一段代码，嵌套使用时自动记录父子关系
+
+        with monitor.span("chat", session_id=sid):
+            async with monitor.span("agent"):
+                ...
+        """
+        return SpanContext(self, name, attributes)
+
+    def _open_span(self, name: str, attributes: Dict[str, Any]):
+        parent = _current_span.get()
+        span_id = next(_span_ids)
+        span = Span(
+            name=name,
+            span_id=span_id,
+            parent_id=parent.span_id if parent else None,
+            trace_id=parent.trace_id if parent else span_id,
+            start_time=time.perf_counter(),
+            attributes=dict(attributes),
+            parent=parent,
+        )
+        return span, _current_span.set(span)
 
-        execution_time = time.time() - self.start_time
+    def _close_span(self, span: Span, token, success: bool, error: str = "") -> PerformanceMetrics:
+        execution_time = time.perf_counter() - span.start_time
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # 在另一个上下文中结束（如跨任务迭代的异步生成器），当前 span 仍是它时恢复为父 span
+            if _current_span.get() is span:
+                _current_span.set(None if token.old_value is Token.MISSING else token.old_value)
 
         metrics = PerformanceMetrics(
-            chain_name=chain_name,
+            chain_name=span.name,
             execution_time=execution_time,
-            input_tokens=0,
-            output_tokens=0,
-            total_tokens=0,
+            input_tokens=span.input_tokens,
+            output_tokens=span.output_tokens,
+            total_tokens=span.input_tokens + span.output_tokens,
             success=success,
-            error_message=error
+            error_message=error,
+            span_id=span.span_id,
+            parent_id=span.parent_id,
+            trace_id=span.trace_id,
+            cost=span.cost,
+            llm_calls=span.llm_calls,
         )
+        session_id = self._session_of(span)
+        with self._lock:
+            self.metrics_history.append(metrics)
+            name = span.name
+            if name not in self._span_stats and len(self._span_stats) >= self._max_span_names:
+                name = OTHER_SPAN_NAME
+            stats = self._span_stats.get(name)
+            if stats is None:
+                stats = self._span_stats[name] = SpanStats()
+            stats.record(metrics)
+            if span.parent_id is None:
+                self._runs["total"] += 1
+                self._runs["successful"] += success
+                self._runs["time"] += execution_time
+                _add_usage(self._runs, metrics)
+            if session_id is not None:
+                self._record_session(session_id, metrics)
+        return metrics
 
-        self.metrics_history.append(metrics)
-        self.start_time = None
+    @staticmethod
+    def _session_of(span: Span) -> Optional[str]:
+        """span 带 session_id 且祖先都不带时返回会话 id（同一会话的用量只计一次）"""
+        session_id = span.attributes.get("session_id")
+        if session_id is None:
+            return None
+        parent = span.parent
+        while parent is not None:
+            if parent.attributes.get("session_id") is not None:
+                return None
+            parent = parent.parent
+        return str(session_id)
+
+    def _record_session(self, session_id: str, metrics: PerformanceMetrics) -> None:
+        """累计会话用量（调用方需持有锁）"""
+        usage = self._sessions.pop(session_id, None) or {**_empty_usage(), "requests": 0}
+        usage["requests"] += 1
+        _add_usage(usage, metrics)
+        self._sessions[session_id] = usage
+        while len(self._sessions) > self._max_sessions:
+            self._sessions.popitem(last=False)
+
+    def get_session_usage(self) -> Dict[str, Dict[str, Any]]:
+        """获取最近活跃会话的请求数、token 数和费用"""
+        with self._lock:
+            return {session_id: dict(usage) for session_id, usage in self._sessions.items()}
+
+    def start_tracking(self) -> Span:
+        """开始追踪（与 end_tracking 配对，推荐使用 span()）"""
+        span, token = self._open_span("", {})
+        with self._lock:
+            self._manual_tokens[span.span_id] = token
+        return span
 
-        return metrics
+    def end_tracking(self, chain_name: str, success: bool, error: str = "") -> PerformanceMetrics:
+        """结束当前上下文中由 start_tracking 开始的追踪并记录指标"""
+        span = _current_span.get()
+        with self._lock:
+            token = self._manual_tokens.pop(span.span_id, None) if span else None
+        if token is None:
+            raise ValueError("必须先调用 start_tracking()")
+
+        span.name = chain_name
+        return self._close_span(span, token, success, error)
+
+    def get_spans(self, trace_id: Optional[int] = None) -> List[PerformanceMetrics]:
+        """获取最近结束的 span，可按 trace_id 过滤出一次请求内的全部 span"""
+        with self._lock:
+            metrics = list(self.metrics_history)
+        if trace_id is None:
+            return metrics
+        return [m for m in metrics if m.trace_id == trace_id]
+
+    def get_span_summary(self) -> Dict[str, Any]:
+        """按 span 名称汇总调用次数、失败次数、累计耗时分位数和各滑动窗口的分位数与吞吐量"""
+        with self._lock:
+            return {name: stats.summary() for name, stats in self._span_stats.items()}
+
+    def record_stream(self, metrics) -> None:
+        """记录一次流式调用的延迟指标（clients.stream_metrics.StreamMetrics）"""
+        with self._lock:
+            self.stream_metrics.append(metrics)
+
+    def track_streaming(self) -> None:
+        """订阅 create_model_client(streaming=True) 客户端的流式延迟统计"""
+        from clients.stream_metrics import get_streaming_metrics_handler
+
+        get_streaming_metrics_handler().add_listener(self.record_stream)
+
+    def get_streaming_summary(self) -> Dict[str, Any]:
+        """获取最近流式调用的摘要：首 token 时间、token 间隔分布、输出速度和总耗时"""
+        with self._lock:
+            streams = list(self.stream_metrics)
+        if not streams:
+            return {"message": "没有记录的流式调用"}
+
+        gaps = [gap for m in streams for gap in m.inter_token_gaps]
+        speeds = [m.tokens_per_second for m in streams if m.tokens_per_second]
+
+        return {
+            "streams": len(streams),
+            "failed_streams": sum(1 for m in streams if not m.success),
+            "ttft": _percentiles([m.ttft for m in streams if m.ttft is not None]),
+            "inter_token_latency": _percentiles(gaps),
+            "duration": _percentiles([m.duration for m in streams]),
+            "tokens_per_second": sum(speeds) / len(speeds) if speeds else 0,
+        }
 
     def get_summary(self) -> Dict[str, Any]:
-        """获取性能摘要"""
-        if not self.metrics_history:
+        """获取性能摘要（运行次数只统计顶层 span，chains 中按名称给出全部 span 的耗时分布）"""
+        with self._lock:
+            runs = dict(self._runs)
+        if not runs["total"]:
+            if self.stream_metrics:
+                return {"streaming": self.get_streaming_summary()}
             return {"message": "没有记录的指标"}
 
-        total_runs = len(self.metrics_history)
-        successful_runs = sum(1 for m in self.metrics_history if m.success)
+        total_runs = runs["total"]
+        successful_runs = runs["successful"]
         failed_runs = total_runs - successful_runs
 
-        avg_time = sum(m.execution_time for m in self.metrics_history) / total_runs
-        total_tokens = sum(m.total_tokens for m in self.metrics_history)
+        avg_time = runs["time"] / total_runs
 
         return {
             "total_runs": total_runs,
@@ -74,8 +372,14 @@ class PerformanceMonitor:
             "failed_runs": failed_runs,
             "success_rate": successful_runs / total_runs if total_runs > 0 else 0,
             "average_time": avg_time,
-            "total_tokens": total_tokens,
-            "estimated_cost": total_tokens * 0.00002,
+            "input_tokens": runs["input_tokens"],
+            "output_tokens": runs["output_tokens"],
+            "total_tokens": runs["total_tokens"],
+            "llm_calls": runs["llm_calls"],
+            # 按价格表计算的实际费用（美元），未知价格的模型不计费
+            "estimated_cost": runs["cost"],
+            "chains": self.get_span_summary(),
+            **({"streaming": self.get_streaming_summary()} if self.stream_metrics else {}),
         }
 
     def save_metrics(self, filename: str = "reports/performance_metrics.json"):
@@ -85,7 +389,11 @@ class PerformanceMonitor:
         data = {
             "timestamp": datetime.now().isoformat(),
             "summary": self.get_summary(),
-            "metrics": [asdict(m) for m in self.metrics_history]
+            "metrics": [asdict(m) for m in self.get_spans()],
+            "stream_metrics": [
+                {k: v for k, v in asdict(m).items() if k != "inter_token_gaps"}
+                for m in self.stream_metrics
+            ],
         }
 
         with open(filename, "w", encoding="utf-8") as f:
@@ -94,10 +402,79 @@ class PerformanceMonitor:
         print(f"✓ 指标已保存到 {filename}")
 
 
-class CustomCallbackHandler:
-    """自定义回调处理器"""
+def _iter_usage(response: LLMResult) -> Iterator[Tuple[str, int, int, bool]]:
+    """逐个产出 (模型名, 输入 token, 输出 token, 是否缓存命中)
+
+    优先读取消息的 usage_metadata，没有时退回 llm_output 中的 token_usage。
+    """
+    llm_output = response.llm_output or {}
+    default_model = llm_output.get("model_name") or llm_output.get("model") or "unknown"
+    found = False
+    for generations in response.generations:
+        for generation in generations:
+            message = getattr(generation, "message", None)
+            usage = getattr(message, "usage_metadata", None)
+            if not usage:
+                continue
+            found = True
+            model = (message.response_metadata or {}).get("model_name") or default_model
+            # LangChain 命中响应缓存时把 total_cost 置 0，这类调用没有实际消耗
+            cached = usage.get("total_cost") == 0
+            yield model, usage.get("input_tokens", 0), usage.get("output_tokens", 0), cached
+    token_usage = llm_output.get("token_usage")
+    if not found and token_usage:
+        yield (
+            default_model,
+            token_usage.get("prompt_tokens", 0),
+            token_usage.get("completion_tokens", 0),
+            False,
+        )
+
+
+class UsageCallbackHandler(BaseCallbackHandler):
+    """读取 LLM 响应的实际 token 用量，按模型价格计费并计入当前 span"""
+
+    # 在调用方的上下文中同步执行，保证用量在 span 结束前计入
+    run_inline = True
 
     def __init__(self):
+        self._usage_lock = threading.Lock()
+        self._by_model: Dict[str, Dict[str, Any]] = defaultdict(
+            lambda: {**_empty_usage(), "cached_calls": 0, "unpriced_tokens": 0}
+        )
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        # 级联模型（clients.cascade）返回的是某一级模型的回答，用量已在该级的子运行中计入
+        if "cascade_tier" in (response.llm_output or {}):
+            return
+        for model, input_tokens, output_tokens, cached in _iter_usage(response):
+            with self._usage_lock:
+                usage = self._by_model[model]
+                if cached:
+                    usage["cached_calls"] += 1
+                    continue
+                cost = estimate_cost(model, input_tokens, output_tokens)
+                usage["input_tokens"] += input_tokens
+                usage["output_tokens"] += output_tokens
+                usage["total_tokens"] += input_tokens + output_tokens
+                usage["llm_calls"] += 1
+                if cost is None:
+                    usage["unpriced_tokens"] += input_tokens + output_tokens
+                else:
+                    usage["cost"] += cost
+            record_llm_usage(input_tokens, output_tokens, cost or 0.0)
+
+    def get_usage(self) -> Dict[str, Dict[str, Any]]:
+        """按模型汇总 token 数、费用、缓存命中次数和无价格的 token 数"""
+        with self._usage_lock:
+            return {model: dict(usage) for model, usage in self._by_model.items()}
+
+
+class CustomCallbackHandler(UsageCallbackHandler):
+    """自定义回调处理器：记录执行日志，并统计实际 token 用量和费用"""
+
+    def __init__(self):
+        super().__init__()
         self.logs = []
 
     def on_llm_start(self, serialized, prompts, **kwargs):
@@ -106,7 +483,9 @@ class CustomCallbackHandler:
 
     def on_llm_end(self, response, **kwargs):
         """LLM 调用结束"""
-        self.log("INFO", "LLM 调用完成")
+        super().on_llm_end(response, **kwargs)
+        usage = [f"{model} 输入 {i} / 输出 {o}" for model, i, o, _ in _iter_usage(response)]
+        self.log("INFO", f"LLM 调用完成{'（' + '，'.join(usage) + '）' if usage else ''}")
 
     def on_llm_error(self, error, **kwargs):
         """LLM 调用错误"""
@@ -114,7 +493,7 @@ class CustomCallbackHandler:
 
     def on_chain_start(self, serialized, inputs, **kwargs):
         """Chain 调用开始"""
-        chain_name = serialized.get("name", "unknown")
+        chain_name = (serialized or {}).get("name") or kwargs.get("name", "unknown")
         self.log("INFO", f"Chain '{chain_name}' 开始执行")
 
     def on_chain_end(self, outputs, **kwargs):
@@ -127,12 +506,12 @@ class CustomCallbackHandler:
 
     def on_tool_start(self, serialized, input_str, **kwargs):
         """Tool 调用开始"""
-        tool_name = serialized.get("name", "unknown")
-        self.log("INFO", f"Tool '{tool_name}' 开始执行: {input_str[:30]}...")
+        tool_name = (serialized or {}).get("name") or kwargs.get("name", "unknown")
+        self.log("INFO", f"Tool '{tool_name}' 开始执行: {str(input_str)[:30]}...")
 
     def on_tool_end(self, output, **kwargs):
         """Tool 调用结束"""
-        self.log("INFO", f"Tool 执行完成: {output[:50]}...")
+        self.log("INFO", f"Tool 执行完成: {str(getattr(output, 'content', output))[:50]}...")
 
     def on_tool_error(self, error, **kwargs):
         """Tool 调用错误"""
@@ -172,14 +551,21 @@ def setup_langsmith():
     return True
 
 
-@contextmanager
-def with_tracking(chain_name: str, monitor: PerformanceMonitor, logger: CustomCallbackHandler):
-    """追踪上下文管理器，自动处理性能监控和错误记录"""
-    monitor.start_tracking()
-    try:
-        yield
-        monitor.end_tracking(chain_name, True)
-    except Exception as e:
-        monitor.end_tracking(chain_name, False, str(e))
-        logger.log("ERROR", f"{chain_name} 错误: {e}")
-        raise
+class _TrackingContext(SpanContext):
+    """带错误日志的 span 上下文"""
+
+    def __init__(self, monitor: PerformanceMonitor, name: str, logger: CustomCallbackHandler):
+        super().__init__(monitor, name, {})
+        self.logger = logger
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if exc is not None:
+            self.logger.log("ERROR", f"{self.name} 错误: {exc}")
+        return super().__exit__(exc_type, exc, tb)
+
+
+def with_tracking(
+    chain_name: str, monitor: PerformanceMonitor, logger: CustomCallbackHandler
+) -> SpanContext:
+    """追踪上下文管理器，自动处理性能监控和错误记录（支持 with 和 async with）"""
+    return _TrackingContext(monitor, chain_name, logger)
@@ -0,0 +1,78 @@
+"""模型价格表模块
+
+按模型名查找每百万 token 的输入、输出价格（美元），用于把 usage_metadata 换算成费用。
+内置价格为各提供方公开的参考价，可用 MODEL_PRICES 覆盖或补充：
+
+    MODEL_PRICES=qwen3-max=1.2/6,my-finetune-*=0.3/1.2
+
+模型名先精确匹配，再按通配符匹配，最后取最长的前缀匹配
+（gpt-4o-mini-2024-07-18 匹配 gpt-4o-mini）。
+"""
+import fnmatch
+import os
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+
+@dataclass(frozen=True)
+class ModelPrice:
+    """每百万 token 的价格（美元）"""
+    input: float
+    output: float
+
+
+MODEL_PRICES: Dict[str, ModelPrice] = {
+    "gpt-4o": ModelPrice(2.50, 10.00),
+    "gpt-4o-mini": ModelPrice(0.15, 0.60),
+    "gpt-4.1": ModelPrice(2.00, 8.00),
+    "gpt-4.1-mini": ModelPrice(0.40, 1.60),
+    "gpt-4.1-nano": ModelPrice(0.10, 0.40),
+    "gpt-3.5-turbo": ModelPrice(0.50, 1.50),
+    "qwen3-max": ModelPrice(1.20, 6.00),
+    "qwen-max": ModelPrice(1.60, 6.40),
+    "qwen-plus": ModelPrice(0.40, 1.20),
+    "qwen-turbo": ModelPrice(0.05, 0.20),
+    "deepseek-chat": ModelPrice(0.27, 1.10),
+}
+
+
+def _parse_prices(spec: str) -> Dict[str, ModelPrice]:
+    """解析 "模型=输入价/输出价" 列表，逗号分隔"""
+    prices = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        pattern, _, value = item.strip().rpartition("=")
+        input_price, _, output_price = value.partition("/")
+        prices[pattern.strip()] = ModelPrice(float(input_price), float(output_price or input_price))
+    return prices
+
+
+_price_overrides = _parse_prices(os.getenv("MODEL_PRICES", ""))
+
+
+def get_model_price(model: str) -> Optional[ModelPrice]:
+    """查找模型价格，未知模型返回 None"""
+    for table in (_price_overrides, MODEL_PRICES):
+        if model in table:
+            return table[model]
+        for pattern, price in table.items():
+            if any(char in pattern for char in "*?[") and fnmatch.fnmatch(model, pattern):
+                return price
+    prefixes = [name for name in {**MODEL_PRICES, **_price_overrides} if model.startswith(name)]
+    if prefixes:
+        name = max(prefixes, key=len)
+        return _price_overrides.get(name) or MODEL_PRICES[name]
+    return None
+
+
+def estimate_cost(model: str, input_tokens: int, output_tokens: int) -> Optional[float]:
+    """按价格表计算一次调用的费用（美元），未知模型返回 None"""
+    price = get_model_price(model)
+    if price is None:
+        return None
+    return (input_tokens * price.input + output_tokens * price.output) / 1_000_000